@@ -1,146 +1,47 @@
 import streamlit as st
-import pandas as pd
-import sklearn.tree  # Importar explícitamente para que joblib reconozca las clases
-import joblib
-import numpy as np
 import os
-
-# Forma del sombrero
-map_cap_shape = {
-    "Campana": "b",
-    "Cónica": "c",
-    "Convexa": "x",
-    "Plana": "f",
-    "Nudosa": "k",
-    "Hundida": "s"
-}
-
-# Superficie del sombrero
-map_cap_surface = {
-    "Fibrosa": "f",
-    "Con ranuras": "g",
-    "Escamosa": "y",
-    "Lisa": "s"
-}
-
-# Color del sombrero
-map_cap_color = {
-    "Marrón": "n",
-    "Beige": "b",
-    "Canela": "c",
-    "Gris": "g",
-    "Verde": "r",
-    "Rosa": "p",
-    "Púrpura": "u",
-    "Rojo": "e",
-    "Blanco": "w",
-    "Amarillo": "y"
-}
-
-# Magulladuras
-map_bruises = {
-    "Con magulladuras": "t",
-    "Sin magulladuras": "f"
-}
-
-# Color de las láminas
-map_gill_color = {
-    "Negro": "k",
-    "Marrón": "n",
-    "Beige": "b",
-    "Chocolate": "h",
-    "Gris": "g",
-    "Verde": "r",
-    "Naranja": "o",
-    "Rosa": "p",
-    "Púrpura": "u",
-    "Rojo": "e",
-    "Blanco": "w",
-    "Amarillo": "y"
-}
-
-# Forma del tallo
-map_stalk_shape = {
-    "Ensanchado hacia la base": "e",
-    "Afilándose hacia la base": "t"
-}
-
-# Superficie del tallo por encima del anillo
-map_stalk_surface_above_ring = {
-    "Fibrosa": "f",
-    "Escamosa": "y",
-    "Sedosa": "k",
-    "Lisa": "s"
-}
-
-# Superficie del tallo por debajo del anillo
-map_stalk_surface_below_ring = {
-    "Fibrosa": "f",
-    "Escamosa": "y",
-    "Sedosa": "k",
-    "Lisa": "s"
-}
-
-# Color del tallo por encima del anillo (coincide con el de abajo, así que creamos uno genérico)
-map_stalk_color = { # Usamos un mapa genérico si las opciones son las mismas para "above" y "below"
-    "Marrón": "n",
-    "Beige": "b",
-    "Canela": "c",
-    "Gris": "g",
-    "Naranja": "o",
-    "Rosa": "p",
-    "Rojo": "e",
-    "Blanco": "w",
-    "Amarillo": "y"
-}
-
-# Color del velo
-map_veil_color = {
-    "Marrón": "n",
-    "Naranja": "o",
-    "Blanco": "w",
-    "Amarillo": "y"
-}
-
-# Número de anillos
-map_ring_number = {
-    "Ninguno": "n",
-    "Uno": "o",
-    "Dos": "t"
-}
-
-# Tipo de anillo
-map_ring_type = {
-    "Telaraña": "c",
-    "Evanescente": "e",
-    "Acampanado": "f",
-    "Grande": "l",
-    "Ninguno": "n",
-    "Colgante": "p",
-    "Enfundado": "s",
-    "Zonal": "z"
-}
-
-# Población
-map_population = {
-    "Abundante": "a",
-    "Agrupado": "c",
-    "Numeroso": "n",
-    "Disperso": "s",
-    "Varios": "v",
-    "Solitario": "y"
-}
-
-# Hábitat
-map_habitat = {
-    "Pastizales": "g",
-    "Hojas": "l",
-    "Prados": "m",
-    "Senderos": "p",
-    "Urbano": "u",
-    "Desechos": "w",
-    "Bosques": "d"
-}
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from batch_prediction import MissingColumnsError, ScoringStats, get_prediction_cache, iter_predictions
+from batch_results import RESULT_FORMATS, SUMMARY_COLUMNS, ResultSummary, ResultWriter
+from feedback_store import get_feedback_store
+from ingest import LabelTranslator, ValidationReport
+from drift_monitor import PSI_ALERT, PSI_WARNING, get_drift_monitor
+from explanations import format_points, get_explainer
+from metrics import get_metrics
+from model_registry import get_registry
+from shadow_scoring import get_shadow_scorer
+from mushroom_schema import (
+    map_cap_shape, map_cap_surface, map_cap_color,
+    map_bruises, map_gill_color, map_stalk_shape,
+    map_stalk_surface_above_ring, map_stalk_surface_below_ring, map_stalk_color,
+    map_veil_color, map_ring_number, map_ring_type,
+    map_population, map_habitat,
+    POISONOUS_LABEL, UNKNOWN_OPTION, feature_alphabets,
+)
+
+# Solo se importa lo necesario para dibujar y predecir una seta (NumPy y los
+# artefactos sin pickle de models/); pandas se carga al subir un archivo.
+COMENTARIOS_POR_PAGINA = 10
+
+# Vista previa de los resultados en lote: filas guardadas en la sesión y filas por página
+FILAS_VISTA_PREVIA = 1000
+FILAS_POR_PAGINA = 50
+
+# Tiempos por etapa (carga, mapeo, codificación, predicción, inverse_transform y
+# renderizado). Se desactivan con FUNGISCAN_METRICS=0.
+metrics = get_metrics()
+
+# Deriva de las entradas frente a los datos de entrenamiento: cada predicción (del
+# formulario o de un archivo) se suma a sus contadores. Se desactiva con FUNGISCAN_DRIFT=0.
+drift = get_drift_monitor()
+
+# Modelos retadores en modo sombra (FUNGISCAN_SHADOW): predicen en segundo plano una
+# muestra de lo mismo que el modelo de la app, para compararlos con tráfico real
+shadow = get_shadow_scorer()
 
 # --- Carga del modelo y utilidades ---
 # Definimos la ruta a la carpeta 'models'.
@@ -150,10 +51,12 @@ models_folder = os.path.join(os.path.dirname(__file__), '..', 'models')
 # print("Ruta models_folder:", models_folder)
 # print("Archivos en models_folder:", os.listdir(models_folder))
 
+# Los artefactos se cargan una vez por proceso en el registro de modelos; en cada
+# recarga de Streamlit solo se comprueba si los archivos han cambiado.
+registry = get_registry()
 try:
-    model = joblib.load(os.path.join(models_folder, 'best_decision_tree_model_streamlit.pkl'))
-    label_encoder = joblib.load(os.path.join(models_folder, 'label_encoder_y.pkl'))
-    ohe_columns = joblib.load(os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl'))
+    with metrics.stage('artifact_load'):
+        (label_encoder, encoder, predictor), load_stats = registry.get_with_stats()
 except FileNotFoundError:
     st.error(f"Error al cargar los archivos del modelo. Asegúrate de que los archivos .pkl estén en la carpeta '{models_folder}'.")
     st.stop()
@@ -171,6 +74,10 @@ streamlit_features = [
     'ring-type', 'population', 'habitat'
 ]
 
+st.sidebar.caption(
+    f"Carga de artefactos: {load_stats.seconds * 1000:.2f} ms "
+    f"({'leídos de disco: ' + ', '.join(load_stats.reloaded) if load_stats.reloaded else 'en caché'})"
+)
 
 # --- Menú lateral ---
 tabs = st.tabs([
@@ -369,84 +276,113 @@ with tabs[0]:
 # --- PÁGINA 2: Predicción Interactiva ---
 with tabs[1]:
     st.header("🔍 Predicción por características observadas")
-    st.markdown("Selecciona las características de la seta que deseas clasificar:")
+    st.markdown("Selecciona las características de la seta que deseas clasificar. "
+                f"Si no puedes observar alguna, elige **{UNKNOWN_OPTION}**.")
 
     # Diccionario para almacenar las selecciones del usuario
     user_selections = {}
 
     # Campos del formulario usando los mapeos definidos
-    user_selections['cap-shape'] = st.selectbox("Forma del sombrero", list(map_cap_shape.keys()))
-    user_selections['cap-surface'] = st.selectbox("Superficie del sombrero", list(map_cap_surface.keys()))
-    user_selections['cap-color'] = st.selectbox("Color del sombrero", list(map_cap_color.keys()))
-    user_selections['bruises'] = st.selectbox("¿Se forman magulladuras al tocarla?", list(map_bruises.keys()))
-    user_selections['gill-color'] = st.selectbox("Color de las láminas", list(map_gill_color.keys()))
-    user_selections['stalk-shape'] = st.selectbox("Forma del tallo", list(map_stalk_shape.keys()))
-    user_selections['stalk-surface-above-ring'] = st.selectbox("Superficie del tallo arriba del anillo", list(map_stalk_surface_above_ring.keys()))
-    user_selections['stalk-surface-below-ring'] = st.selectbox("Superficie del tallo debajo del anillo", list(map_stalk_surface_below_ring.keys()))
-    user_selections['stalk-color-above-ring'] = st.selectbox("Color del tallo arriba del anillo", list(map_stalk_color.keys())) # Usamos map_stalk_color genérico
-    user_selections['stalk-color-below-ring'] = st.selectbox("Color del tallo debajo del anillo", list(map_stalk_color.keys())) # Usamos map_stalk_color genérico
-    user_selections['veil-color'] = st.selectbox("Color del velo", list(map_veil_color.keys()))
-    user_selections['ring-number'] = st.selectbox("Número de anillos", list(map_ring_number.keys()))
-    user_selections['ring-type'] = st.selectbox("Tipo de anillo", list(map_ring_type.keys()))
-    user_selections['population'] = st.selectbox("Población", list(map_population.keys()))
-    user_selections['habitat'] = st.selectbox("Hábitat", list(map_habitat.keys()))
+    user_selections['cap-shape'] = st.selectbox("Forma del sombrero", list(map_cap_shape.keys()) + [UNKNOWN_OPTION])
+    user_selections['cap-surface'] = st.selectbox("Superficie del sombrero", list(map_cap_surface.keys()) + [UNKNOWN_OPTION])
+    user_selections['cap-color'] = st.selectbox("Color del sombrero", list(map_cap_color.keys()) + [UNKNOWN_OPTION])
+    user_selections['bruises'] = st.selectbox("¿Se forman magulladuras al tocarla?", list(map_bruises.keys()) + [UNKNOWN_OPTION])
+    user_selections['gill-color'] = st.selectbox("Color de las láminas", list(map_gill_color.keys()) + [UNKNOWN_OPTION])
+    user_selections['stalk-shape'] = st.selectbox("Forma del tallo", list(map_stalk_shape.keys()) + [UNKNOWN_OPTION])
+    user_selections['stalk-surface-above-ring'] = st.selectbox("Superficie del tallo arriba del anillo", list(map_stalk_surface_above_ring.keys()) + [UNKNOWN_OPTION])
+    user_selections['stalk-surface-below-ring'] = st.selectbox("Superficie del tallo debajo del anillo", list(map_stalk_surface_below_ring.keys()) + [UNKNOWN_OPTION])
+    user_selections['stalk-color-above-ring'] = st.selectbox("Color del tallo arriba del anillo", list(map_stalk_color.keys()) + [UNKNOWN_OPTION]) # Usamos map_stalk_color genérico
+    user_selections['stalk-color-below-ring'] = st.selectbox("Color del tallo debajo del anillo", list(map_stalk_color.keys()) + [UNKNOWN_OPTION]) # Usamos map_stalk_color genérico
+    user_selections['veil-color'] = st.selectbox("Color del velo", list(map_veil_color.keys()) + [UNKNOWN_OPTION])
+    user_selections['ring-number'] = st.selectbox("Número de anillos", list(map_ring_number.keys()) + [UNKNOWN_OPTION])
+    user_selections['ring-type'] = st.selectbox("Tipo de anillo", list(map_ring_type.keys()) + [UNKNOWN_OPTION])
+    user_selections['population'] = st.selectbox("Población", list(map_population.keys()) + [UNKNOWN_OPTION])
+    user_selections['habitat'] = st.selectbox("Hábitat", list(map_habitat.keys()) + [UNKNOWN_OPTION])
 
     if st.button("Clasificar Seta"):
-        # Convertimos la selección del usuario (descripciones) a los valores codificados (letras)
-        input_data_codes = {}
-        input_data_codes['cap-shape'] = map_cap_shape[user_selections['cap-shape']]
-        input_data_codes['cap-surface'] = map_cap_surface[user_selections['cap-surface']]
-        input_data_codes['cap-color'] = map_cap_color[user_selections['cap-color']]
-        input_data_codes['bruises'] = map_bruises[user_selections['bruises']]
-        input_data_codes['gill-color'] = map_gill_color[user_selections['gill-color']]
-        input_data_codes['stalk-shape'] = map_stalk_shape[user_selections['stalk-shape']]
-        input_data_codes['stalk-surface-above-ring'] = map_stalk_surface_above_ring[user_selections['stalk-surface-above-ring']]
-        input_data_codes['stalk-surface-below-ring'] = map_stalk_surface_below_ring[user_selections['stalk-surface-below-ring']]
-        input_data_codes['stalk-color-above-ring'] = map_stalk_color[user_selections['stalk-color-above-ring']]
-        input_data_codes['stalk-color-below-ring'] = map_stalk_color[user_selections['stalk-color-below-ring']]
-        input_data_codes['veil-color'] = map_veil_color[user_selections['veil-color']]
-        input_data_codes['ring-number'] = map_ring_number[user_selections['ring-number']]
-        input_data_codes['ring-type'] = map_ring_type[user_selections['ring-type']]
-        input_data_codes['population'] = map_population[user_selections['population']]
-        input_data_codes['habitat'] = map_habitat[user_selections['habitat']]
-
-        print("DEBUG: Contenido de input_data_codes justo antes de crear el DataFrame:", input_data_codes) 
-
-        # Crear un DataFrame con la entrada del usuario (usando los códigos)
-        input_df = pd.DataFrame([input_data_codes])
-
-        # Aplicar One-Hot Encoding a la entrada del usuario.
-        # drop_first=True debe coincidir con cómo se entrenó el modelo.
-        input_encoded = pd.get_dummies(input_df, columns=streamlit_features)
-
-        # Crear un DataFrame final con todas las columnas OHE esperadas por el modelo,
-        # y rellenar con los valores de la entrada del usuario.
-        final_input_df = pd.DataFrame(0, index=[0], columns=ohe_columns)
-
-        for col in input_encoded.columns:
-            if col in final_input_df.columns:
-                final_input_df[col] = input_encoded[col].iloc[0]
-
-        # Asegurarse de que el orden de las columnas sea el que el modelo espera
-        final_input_df = final_input_df[ohe_columns]
+        # Convertimos la selección del usuario (descripciones) a los valores codificados (letras).
+        # Las características marcadas como desconocidas quedan a None.
+        with metrics.stage('label_mapping'):
+            input_data_codes = {}
+            input_data_codes['cap-shape'] = map_cap_shape.get(user_selections['cap-shape'])
+            input_data_codes['cap-surface'] = map_cap_surface.get(user_selections['cap-surface'])
+            input_data_codes['cap-color'] = map_cap_color.get(user_selections['cap-color'])
+            input_data_codes['bruises'] = map_bruises.get(user_selections['bruises'])
+            input_data_codes['gill-color'] = map_gill_color.get(user_selections['gill-color'])
+            input_data_codes['stalk-shape'] = map_stalk_shape.get(user_selections['stalk-shape'])
+            input_data_codes['stalk-surface-above-ring'] = map_stalk_surface_above_ring.get(user_selections['stalk-surface-above-ring'])
+            input_data_codes['stalk-surface-below-ring'] = map_stalk_surface_below_ring.get(user_selections['stalk-surface-below-ring'])
+            input_data_codes['stalk-color-above-ring'] = map_stalk_color.get(user_selections['stalk-color-above-ring'])
+            input_data_codes['stalk-color-below-ring'] = map_stalk_color.get(user_selections['stalk-color-below-ring'])
+            input_data_codes['veil-color'] = map_veil_color.get(user_selections['veil-color'])
+            input_data_codes['ring-number'] = map_ring_number.get(user_selections['ring-number'])
+            input_data_codes['ring-type'] = map_ring_type.get(user_selections['ring-type'])
+            input_data_codes['population'] = map_population.get(user_selections['population'])
+            input_data_codes['habitat'] = map_habitat.get(user_selections['habitat'])
 
         # --- Realizar la Predicción ---
         try:
-            prediction_encoded = model.predict(final_input_df)
-            prediction_label = label_encoder.inverse_transform(prediction_encoded)
+            desconocidas = [f for f, code in input_data_codes.items() if code is None]
+            parcial = None
+            with metrics.stage('predict'):
+                if desconocidas:
+                    # Se recorre el árbol siguiendo las dos ramas en las divisiones sobre las
+                    # características desconocidas; nos quedamos con el peor caso
+                    parcial = predictor.predict_partial_record(
+                        input_data_codes, feature_alphabets(streamlit_features),
+                        label_encoder.transform([POISONOUS_LABEL])[0])
+                    prediction_encoded = [parcial.worst_case]
+                else:
+                    prediction_encoded = predictor.predict_record(input_data_codes)
+            with metrics.stage('inverse_transform'):
+                prediction_label = label_encoder.inverse_transform(prediction_encoded)
+            codigos = encoder.codes_from_records(input_data_codes)
+            with metrics.stage('drift'):
+                combinacion_nueva = drift.observe(codigos)[0]
+            if shadow.enabled:
+                with metrics.stage('shadow'):
+                    shadow.submit(codigos, prediction_label)
+            # Condiciones que siguió el árbol (hasta la primera característica desconocida
+            # que evalúa); si el modelo no es un árbol no hay pasos que mostrar
+            try:
+                with metrics.stage('explain'):
+                    explicador = get_explainer(predictor, label_encoder)
+                    nodo = explicador.final_nodes(codigos)[0]
+                    pasos = explicador.steps(nodo, prediction_encoded[0])
+            except ValueError:
+                explicador = pasos = None
 
             # --- Mostrar el Resultado ---
-            st.subheader("Resultado de la Clasificación:")
-            if prediction_label[0] == 'p':
-                st.error("¡CUIDADO! Esta seta es muy probablemente **VENENOSA**.")
-            else:
-                st.success("¡Buenas noticias! Esta seta es muy probablemente **COMESTIBLE**.")
+            with metrics.stage('render'):
+                st.subheader("Resultado de la Clasificación:")
+                if parcial is not None and not parcial.determined:
+                    st.error("¡CUIDADO! Con las características que no conoces no se puede descartar que sea **VENENOSA**: "
+                             f"el {parcial.poisonous_fraction:.1%} de las combinaciones posibles de "
+                             f"{', '.join(desconocidas)} dan venenosa.")
+                elif prediction_label[0] == POISONOUS_LABEL:
+                    st.error("¡CUIDADO! Esta seta es muy probablemente **VENENOSA**.")
+                else:
+                    st.success("¡Buenas noticias! Esta seta es muy probablemente **COMESTIBLE**.")
+                if parcial is not None and parcial.determined:
+                    st.info(f"El resultado es el mismo sea cual sea el valor de: {', '.join(desconocidas)}.")
+                if combinacion_nueva:
+                    st.warning("Esta combinación de características no aparece en los datos con los que se entrenó "
+                               "el modelo: la predicción es menos fiable.")
 
             st.markdown("---")
             st.subheader("Más Información:")
+            if pasos:
+                st.markdown("Nuestro modelo de Árbol de Decisión analizó las características que proporcionaste y "
+                            "siguió estos pasos para llegar a esta predicción (en negrita, los que más pesaron; "
+                            "entre paréntesis, cuántos puntos cambia en cada paso el porcentaje de setas "
+                            "venenosas con las que se entrenó):\n\n" + "\n".join(
+                                f"{i}. {'**' + condicion + '**' if decisiva else condicion} ({format_points(cambio)})"
+                                for i, (condicion, cambio, decisiva) in enumerate(pasos, 1)))
+            desconocida = explicador.unknown_feature(nodo) if explicador is not None else None
+            if desconocida:
+                st.markdown(f"{'Después' if pasos else 'Primero'}, el árbol pregunta por **{desconocida}**, que no "
+                            "conoces: a partir de ahí se consideran todas las ramas posibles.")
             st.markdown("""
-            Nuestro modelo de Árbol de Decisión analizó las características que proporcionaste y siguió una serie de pasos lógicos para llegar a esta predicción. Está diseñado para ser transparente y seguro.
-
             **¡Recuerda siempre!** La identificación de setas silvestres para consumo debe ser realizada **SIEMPRE por un experto micólogo**. Esta aplicación es una herramienta educativa y de apoyo, no una sustitución del juicio profesional.
             """)
             st.info("Para cualquier duda, no consumas la seta.")
@@ -463,8 +399,13 @@ with tabs[2]:
             "`stalk-shape`, `stalk-surface-above-ring`, `stalk-surface-below-ring`, "
             "`stalk-color-above-ring`, `stalk-color-below-ring`, `veil-color`, "
             "`ring-number`, `ring-type`, `population`, `habitat`."
-            "\n\nAdemás, recuerda que los valores dentro de estas columnas deben ser los códigos de una sola letra "
-            "(como `x`, `s`, `n`, `t`, `k`, etc.), no las descripciones largas (como 'Convexo', 'Liso', 'Marrón').")
+            "\n\nLos valores pueden ser los códigos de una sola letra (como `x`, `s`, `n`, `t`, `k`, etc.) o las "
+            "mismas descripciones del formulario (como 'Convexa', 'Lisa', 'Marrón'), sin importar mayúsculas ni tildes."
+            "\n\nPuedes dejar vacías las celdas que no conozcas: esa fila se clasifica con el peor caso y las "
+            "columnas `fracción_venenosa` y `determinada` indican si el resultado depende de ellas. La columna "
+            "`combinación_nueva` marca las filas cuya combinación no aparece en los datos de entrenamiento y, si lo "
+            "pides, la columna `explicación` resume las condiciones del árbol que más pesaron en cada predicción. Los valores "
+            "que no se reconozcan se tratan igual y aparecen en un informe de errores con su fila y columna.")
 
     # Definir las columnas esperadas para el CSV de entrada
     expected_csv_columns = [
@@ -474,72 +415,127 @@ with tabs[2]:
         'ring-number', 'ring-type', 'population', 'habitat'
     ]
 
-    example = pd.DataFrame(columns=expected_csv_columns)
-    st.download_button("Descargar plantilla CSV", example.to_csv(index=False).encode('utf-8'), "plantilla_setas.csv", mime="text/csv")
+    example = ",".join(expected_csv_columns) + "\n"
+    st.download_button("Descargar plantilla CSV", example.encode('utf-8'), "plantilla_setas.csv", mime="text/csv")
 
+    formato = st.radio("Formato de los resultados", list(RESULT_FORMATS), horizontal=True,
+                       format_func={'csv.gz': "CSV comprimido (.csv.gz)", 'parquet': "Parquet"}.get)
+    explicar = st.checkbox("Añadir la columna `explicación` (condiciones decisivas del árbol en cada fila)")
     file = st.file_uploader("Carga tu archivo CSV", type=["csv"])
     if file:
-        df = pd.read_csv(file)
-
-        # Verificar que las columnas del CSV subido coincidan con las esperadas
-        if not all(col in df.columns for col in expected_csv_columns):
-            st.error("El archivo CSV subido no contiene todas las columnas esperadas o sus nombres no coinciden. Por favor, usa la plantilla.")
-            st.stop()
-
-        # Asegurarse de que el DataFrame de entrada solo contenga las columnas relevantes y en el orden correcto
-        df_input = df[expected_csv_columns].copy()
-
-        # Aplicar los mapeos a las columnas categóricas
-        for col, map_dict in {
-            'cap-shape': map_cap_shape,
-            'cap-surface': map_cap_surface,
-            'cap-color': map_cap_color,
-            'bruises': map_bruises,
-            'gill-color': map_gill_color,
-            'stalk-shape': map_stalk_shape,
-            'stalk-surface-above-ring': map_stalk_surface_above_ring,
-            'stalk-surface-below-ring': map_stalk_surface_below_ring,
-            'stalk-color-above-ring': map_stalk_color, # Usamos map_stalk_color genérico
-            'stalk-color-below-ring': map_stalk_color, # Usamos map_stalk_color genérico
-            'veil-color': map_veil_color,
-            'ring-number': map_ring_number,
-            'ring-type': map_ring_type,
-            'population': map_population,
-            'habitat': map_habitat
-        }.items():
-            # Invertir el mapeo para ir de descripción a código
-            reversed_map = {v: k for k, v in map_dict.items()}
-            # Verificar si los valores en el CSV subido son descripciones completas
-            # y mapearlos a los códigos si es necesario.
-            # Asumimos que el CSV de entrada podría tener los códigos directamente o las descripciones.
-            # Para mayor robustez, se recomienda que el CSV use los códigos directamente.
-            # Si el CSV usa descripciones completas, necesitaríamos un paso extra de mapeo.
-            # Por simplicidad aquí, asumimos que el CSV de plantilla se llenará con los códigos.
-            # Si el usuario introduce las descripciones completas en la plantilla,
-            # esta parte necesitaría un mapeo inverso antes del get_dummies.
-            # Por ahora, la plantilla invita a usar los códigos directamente si el modelo los espera.
-            # Nota: La plantilla que descargas genera headers pero no los valores,
-            # así que el usuario debería saber qué códigos usar.
-            # Para hacerlo más fácil, podríamos pedir que la plantilla se llene con descripciones y hacer el mapeo inverso.
-            pass # No necesitamos mapeo aquí si pd.get_dummies trabaja directamente con las columnas.
-
-
-        df_encoded = pd.get_dummies(df_input, columns=expected_csv_columns, drop_first=True)
-
-        # Alinear las columnas con las que el modelo fue entrenado
-        for col in ohe_columns:
-            if col not in df_encoded.columns:
-                df_encoded[col] = 0
-        df_encoded = df_encoded[ohe_columns] # ordenar columnas
-
-        # Predicción
-        predicciones = model.predict(df_encoded)
-        resultados = label_encoder.inverse_transform(predicciones)
-        df['predicción'] = resultados # Añadir la columna de predicción al DataFrame original
-        st.success("Predicciones realizadas:")
-        st.dataframe(df)
-
-        st.download_button("Descargar resultados", df.to_csv(index=False).encode('utf-8'), "setas_con_predicciones.csv", mime="text/csv")
+        # El archivo se procesa por bloques: cada bloque se codifica, se predice, se
+        # comprime en un fichero temporal y se suma al resumen por hábitat y población,
+        # así la memoria no crece con el tamaño del CSV. Solo se guardan las primeras
+        # FILAS_VISTA_PREVIA filas para la vista previa. Cada combinación distinta se
+        # predice una vez, y las ya vistas en subidas anteriores salen de la caché del
+        # proceso. El resultado queda en la sesión: pasar de página o descargar no
+        # vuelve a procesar el archivo.
+        lote = st.session_state.get('lote')
+        if lote is None or lote['archivo'] != (file.file_id, formato, explicar):
+            if lote is not None:
+                lote['resultados'].discard()
+                del st.session_state['lote']
+            resultados = ResultWriter(formato)
+            resumen = ResultSummary(translator=LabelTranslator(SUMMARY_COLUMNS))
+            vista_previa = []
+            n_vista_previa = 0
+            n_nuevas = 0
+            estadisticas = ScoringStats()
+            informe = ValidationReport(encoder.features)
+            try:
+                explicador = get_explainer(predictor, label_encoder) if explicar else None
+            except ValueError as e:
+                st.warning(f"{e}: los resultados no llevarán la columna `explicación`.")
+                explicador = None
+            inicio = time.perf_counter()
+            try:
+                for chunk in iter_predictions(file, predictor, label_encoder, encoder, uncertainty_columns=True,
+                                              cache=get_prediction_cache(), stats=estadisticas,
+                                              translator=LabelTranslator(encoder.features), report=informe,
+                                              monitor=drift if drift.enabled else None,
+                                              shadow=shadow if shadow.enabled else None,
+                                              explainer=explicador):
+                    try:
+                        resultados.write(chunk)
+                    except Exception as e:
+                        resultados.discard()
+                        st.error(f"No se pudieron guardar los resultados en formato {formato}: {e}")
+                        st.stop()
+                    resumen.add(chunk)
+                    if 'combinación_nueva' in chunk:
+                        n_nuevas += int(chunk['combinación_nueva'].sum())
+                    if n_vista_previa < FILAS_VISTA_PREVIA:
+                        vista_previa.append(chunk.head(FILAS_VISTA_PREVIA - n_vista_previa).copy())
+                        n_vista_previa += len(vista_previa[-1])
+            except MissingColumnsError as e:
+                resultados.discard()
+                st.error("El archivo CSV subido no contiene todas las columnas esperadas o sus nombres no coinciden "
+                         f"(faltan: {', '.join(e.missing)}). Por favor, usa la plantilla.")
+                st.stop()
+            except Exception as e:
+                resultados.discard()
+                st.error(f"No se pudo procesar el archivo CSV: {e}")
+                st.stop()
+            resultados.close()
+            import pandas as pd  # ya cargado por iter_predictions
+            lote = st.session_state['lote'] = {
+                'archivo': (file.file_id, formato, explicar),
+                'resultados': resultados,
+                'resumen': resumen,
+                'vista_previa': pd.concat(vista_previa) if vista_previa else None,
+                'estadisticas': estadisticas,
+                'informe': informe,
+                'nuevas': n_nuevas,
+                'segundos': time.perf_counter() - inicio,
+            }
+
+        with metrics.stage('render'):
+            resultados, resumen, informe = lote['resultados'], lote['resumen'], lote['informe']
+            estadisticas = lote['estadisticas']
+            n_filas = resultados.rows
+            st.success(f"Predicciones realizadas: {n_filas} filas "
+                       f"({n_filas / max(lote['segundos'], 1e-9):,.0f} filas/s).")
+            if n_filas:
+                st.caption(f"{estadisticas.unique:,} combinaciones distintas; el modelo solo evaluó "
+                           f"{estadisticas.evaluated:,} (el resto salió de la caché de subidas anteriores): "
+                           + (f"{estadisticas.reduction:,.1f}× menos evaluaciones que filas."
+                              if estadisticas.evaluated else "ninguna evaluación nueva."))
+            if lote['nuevas']:
+                st.warning(f"{lote['nuevas']:,} filas ({lote['nuevas'] / n_filas:.1%}) tienen una combinación de "
+                           "características que no aparece en los datos de entrenamiento (columna "
+                           "`combinación_nueva`): sus predicciones son menos fiables.")
+            if len(informe):
+                st.warning(f"{len(informe):,} valores no reconocidos en {informe.rows_with_errors():,} filas "
+                           f"(por columna: {', '.join(f'{col} {n:,}' for col, n in informe.counts().items())}). "
+                           "Esas características se trataron como desconocidas.")
+                st.caption(f"Informe de errores, con hasta {informe.max_examples} ejemplos por columna (la fila es "
+                           "la fila de datos del archivo, empezando en 0 y sin contar la cabecera):")
+                st.dataframe(informe.to_frame())
+                st.download_button("Descargar informe de errores",
+                                   lambda: informe.to_frame().to_csv(index=False).encode('utf-8'),
+                                   "errores_setas.csv", mime="text/csv", on_click="ignore")
+
+            if n_filas:
+                st.subheader("Resumen")
+                for columna, titulo in zip(SUMMARY_COLUMNS, ("Por hábitat", "Por población")):
+                    st.markdown(f"**{titulo}**")
+                    st.dataframe(resumen.to_frame(columna))
+
+                st.subheader("Vista previa")
+                n_vista_previa = len(lote['vista_previa'])
+                n_paginas = -(-n_vista_previa // FILAS_POR_PAGINA)
+                pagina = st.number_input("Página", min_value=1, max_value=n_paginas, value=1, step=1) \
+                    if n_paginas > 1 else 1
+                desde = (pagina - 1) * FILAS_POR_PAGINA
+                hasta = min(desde + FILAS_POR_PAGINA, n_vista_previa)
+                st.caption(f"Filas {desde + 1}–{hasta} de las primeras {n_vista_previa:,} "
+                           f"(el archivo tiene {n_filas:,}).")
+                st.dataframe(lote['vista_previa'].iloc[desde:hasta])
+
+        # El archivo comprimido se lee solo al pulsar el botón (Streamlit llama a la
+        # función en otro hilo y sin volver a ejecutar la página)
+        st.download_button(f"Descargar resultados ({resultados.size / 1e6:,.1f} MB)", resultados.read,
+                           resultados.file_name, mime=resultados.mime, on_click="ignore")
 
 # --- PÁGINA 4: Contenido Descargable ---
 with tabs[3]:
@@ -600,38 +596,85 @@ No nos limitaremos a decirte si una seta es comestible o venenosa. En futuras ve
     if st.button("Enviar comentario"):
         if feedback.strip():
             try:
-                data_folder = os.path.join(os.path.dirname(__file__), '..', 'data')
-                if not os.path.exists(data_folder):
-                    os.makedirs(data_folder)
-
-                feedback_file_path = os.path.join(data_folder, "comentarios.txt")
-                with open(feedback_file_path, "a", encoding="utf-8") as f:
-                    # Añade el separador "---" más explícitamente y con saltos de línea para facilitar la lectura
-                    f.write(feedback.strip() + "\n\n---\n\n") # Añadir saltos de línea extra
+                # Los comentarios se guardan en data/comentarios.db (SQLite); varias
+                # sesiones pueden escribir a la vez sin mezclarse
+                get_feedback_store().add(feedback)
                 st.success("¡Gracias por tu sugerencia! 🍄 La tendremos muy en cuenta.")
-            except PermissionError:
+            except (PermissionError, sqlite3.OperationalError):
+                # Sin permisos, SQLite no lanza PermissionError sino OperationalError
+                # ('attempt to write a readonly database', 'unable to open database file')
                 st.error("No tengo permiso para guardar los comentarios. Revisa los permisos de la carpeta 'data'.")
             except Exception as e:
                 st.error(f"Ocurrió un error al guardar el comentario: {e}")
         else:
             st.warning("Por favor, escribe algo antes de enviar.")
 
-    comentarios_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'comentarios.txt')
-    if os.path.exists(comentarios_path):
-        st.write("### 📬 Comentarios recibidos:")
-        try:
-            with open(comentarios_path, "r", encoding="utf-8") as f:
-                comentarios_raw = f.read()
-
-            comentarios_list = [c.strip() for c in comentarios_raw.split("---") if c.strip()]
-
-            if comentarios_list:
-                for i, comentario in enumerate(comentarios_list):
-                    # Usamos st.info para cada comentario para un estilo más agradable
-                    st.info(f"**Comentario {i+1}:**\n\n{comentario}")
-            else:
-                st.info("Aún no hay comentarios. ¡Sé el primero en dejar una sugerencia!")
-            
-
-        except Exception as e:
-            st.error(f"No se pudieron cargar los comentarios: {e}")
+    st.write("### 📬 Comentarios recibidos:")
+    try:
+        # Se muestra una página cada vez (los más recientes primero) y solo se leen sus
+        # comentarios: la sesión guarda el id del último de la página anterior y la
+        # consulta empieza ahí (paginación por clave), así que cualquier página tarda lo
+        # mismo haya pocos o muchos comentarios
+        antes_de = st.session_state.get('comentarios_antes_de')
+        comentarios_list = get_feedback_store().latest(COMENTARIOS_POR_PAGINA + 1, before_id=antes_de)
+        hay_mas = len(comentarios_list) > COMENTARIOS_POR_PAGINA
+        comentarios_list = comentarios_list[:COMENTARIOS_POR_PAGINA]
+
+        if comentarios_list:
+            for comentario_id, _, comentario in comentarios_list:
+                # Usamos st.info para cada comentario para un estilo más agradable
+                st.info(f"**Comentario {comentario_id}:**\n\n{comentario}")
+            if hay_mas and st.button("Ver más comentarios"):
+                st.session_state['comentarios_antes_de'] = comentarios_list[-1][0]
+                st.rerun()
+            if antes_de is not None and st.button("Volver a los más recientes"):
+                del st.session_state['comentarios_antes_de']
+                st.rerun()
+        else:
+            st.info("Aún no hay comentarios. ¡Sé el primero en dejar una sugerencia!")
+
+    except Exception as e:
+        st.error(f"No se pudieron cargar los comentarios: {e}")
+
+# --- Métricas de rendimiento ---
+# Al final del script, para que incluyan las etapas de esta misma ejecución
+if metrics.enabled:
+    with st.sidebar.expander("⏱️ Métricas de rendimiento"):
+        snapshot = metrics.snapshot()
+        # Tabla en Markdown: st.dataframe cargaría pandas en cada ejecución
+        st.markdown("| etapa | n | media (ms) | p50 (ms) | p99 (ms) |\n|---|---:|---:|---:|---:|\n" + "\n".join(
+            f"| {etapa} | {h['count']} | {h['mean'] * 1000:.3f} | {h['p50'] * 1000:.3f} | {h['p99'] * 1000:.3f} |"
+            for etapa, h in snapshot['stages'].items()))
+        if snapshot['rows_total']:
+            st.caption(f"Lotes: {snapshot['batch_rows']['count']} ({snapshot['rows_total']:,} filas), "
+                       f"último a {snapshot['last_rows_per_second']:,.0f} filas/s")
+        st.download_button("Descargar métricas (Prometheus)",
+                           metrics.to_prometheus() + (drift.to_prometheus() if drift.enabled else "")
+                           + (shadow.to_prometheus() if shadow.enabled else ""),
+                           "metricas.prom", mime="text/plain")
+
+# --- Deriva de las entradas ---
+if drift.enabled and drift.rows:
+    with st.sidebar.expander("📈 Deriva frente al entrenamiento"):
+        informe_deriva = drift.report()
+        st.caption(f"{informe_deriva.rows:,} setas observadas; {informe_deriva.unseen:,} completas con una "
+                   f"combinación que no está en el entrenamiento y {informe_deriva.incomplete:,} con "
+                   "características desconocidas.")
+        # • PSI por encima de PSI_WARNING (cambio moderado); ⚠️ por encima de PSI_ALERT (deriva)
+        st.markdown("| característica | n | PSI | chi² (gl) | letras nuevas |\n|---|---:|---:|---:|---|\n" + "\n".join(
+            f"| {f.feature} | {f.rows:,} | {f.psi:.3f}"
+            f"{' ⚠️' if f.psi > PSI_ALERT else ' •' if f.psi > PSI_WARNING else ''} | "
+            f"{f.chi_square:,.1f} ({f.dof}) | {f.new_values} |"
+            for f in informe_deriva.features if f.psi is not None))
+
+# --- Modo sombra ---
+if shadow.enabled:
+    with st.sidebar.expander("🥊 Modelos retadores (sombra)"):
+        sombra = shadow.snapshot()
+        st.caption(f"{sombra['sampled_rows']:,} de {sombra['offered_rows']:,} filas enviadas a los retadores; "
+                   f"{sombra['dropped_rows']:,} descartadas por carga.")
+        st.markdown("| retador | filas | acuerdo | µs/fila | errores |\n|---|---:|---:|---:|---:|\n" + "\n".join(
+            f"| {nombre} | {r['rows']:,} | "
+            + (f"{r['agreement_rate']:.2%} | {r['microseconds_per_row']:.1f}" if r['rows'] else "– | –")
+            + f" | {r['errors']} |"
+            for nombre, r in sombra['challengers'].items()))
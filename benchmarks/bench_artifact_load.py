@@ -0,0 +1,97 @@
+# Tiempo de carga del modelo: los tres .pkl con joblib (importa sklearn) frente al
+# artefacto .fsm (model_artifact.py, solo NumPy). Cada carga en frío se mide en un
+# proceso nuevo, importaciones incluidas; la carga en caliente repite load_artifact
+# en el mismo proceso. Después arranca varios procesos que cargan el mismo .fsm y
+# leen toda la tabla, y muestra en /proc/<pid>/smaps cuánta memoria del archivo es
+# compartida (Pss = Rss / número de procesos si las páginas son las mismas).
+#
+#   python benchmarks/bench_artifact_load.py [--runs 5] [--workers 4]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from common import MODELS_FOLDER, ROOT, microseconds_per_call
+from model_artifact import ARTIFACT_FILE, load_artifact
+
+ARTIFACT_PATH = os.path.join(MODELS_FOLDER, ARTIFACT_FILE)
+
+COLD_LOADS = {
+    'pickles (joblib + sklearn)': f"""
+import joblib
+from feature_encoder import FeatureEncoder
+joblib.load({os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl')!r})
+joblib.load({os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl')!r})
+FeatureEncoder.from_file({os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl')!r})
+""",
+    'artefacto .fsm': f"""
+from model_artifact import load_artifact
+load_artifact({ARTIFACT_PATH!r})
+""",
+}
+
+
+def cold_load_seconds(code):
+    # Tiempo de 'code' en un intérprete nuevo, sin contar el arranque de Python
+    script = (f"import sys, time\nsys.path.append({os.path.join(ROOT, 'src')!r})\n"
+              f"start = time.perf_counter()\n{code}\nprint(time.perf_counter() - start)")
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', script], capture_output=True, text=True,
+                            check=True).stdout
+    return float(output.split()[-1])
+
+
+def shared_mapping(_):
+    # Se ejecuta en cada proceso: carga el artefacto, predice todas las claves de la
+    # tabla (así se leen todas sus páginas) y devuelve Rss y Pss de la proyección del .fsm
+    bundle = load_artifact(ARTIFACT_PATH).bundle
+    int(bundle.predictor.table.sum())
+    time.sleep(1.0)  # todos los procesos tienen el archivo proyectado a la vez
+    rss = pss = 0
+    with open('/proc/self/smaps') as f:
+        inside = False
+        for line in f:
+            if not line[0].isupper():
+                inside = line.rstrip().endswith(ARTIFACT_FILE)
+            elif inside and line.startswith('Rss:'):
+                rss += int(line.split()[1])
+            elif inside and line.startswith('Pss:'):
+                pss += int(line.split()[1])
+    return rss, pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga del modelo")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    if not os.path.exists(ARTIFACT_PATH):
+        # El .fsm no está en el repositorio: se genera a partir de models/lookup_table
+        subprocess.run([sys.executable, '-W', 'ignore', os.path.join(ROOT, 'src', 'model_artifact.py')],
+                       check=True)
+    load_artifact(ARTIFACT_PATH, verify=True)
+    print(f"OK: {ARTIFACT_FILE} ({os.path.getsize(ARTIFACT_PATH):,} bytes) con todas las sumas SHA-256 correctas")
+
+    print(f"\n{'Carga en frío (proceso nuevo)':<40}{'mediana, ms':>14}")
+    for label, code in COLD_LOADS.items():
+        seconds = statistics.median(cold_load_seconds(code) for _ in range(args.runs))
+        print(f"{label:<40}{seconds * 1e3:>14.1f}")
+
+    print(f"\n{'Carga en caliente (mismo proceso)':<40}{'µs':>14}")
+    print(f"{'load_artifact':<40}{microseconds_per_call(lambda: load_artifact(ARTIFACT_PATH), 500):>14.1f}")
+    print(f"{'load_artifact(verify=True)':<40}"
+          f"{microseconds_per_call(lambda: load_artifact(ARTIFACT_PATH, verify=True), 200):>14.1f}")
+
+    if os.path.exists('/proc/self/smaps'):
+        with ProcessPoolExecutor(args.workers, mp_context=get_context('spawn')) as executor:
+            usage = list(executor.map(shared_mapping, range(args.workers)))
+        print(f"\n{args.workers} procesos con el artefacto proyectado: Rss {usage[0][0]} KB por proceso, "
+              f"Pss {statistics.mean(p for _, p in usage):.0f} KB (páginas compartidas)")
+
+
+if __name__ == '__main__':
+    main()
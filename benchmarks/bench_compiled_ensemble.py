@@ -0,0 +1,82 @@
+# Benchmark de CompiledEnsemble frente a predict/predict_proba de sklearn con los
+# conjuntos del notebook: Bagging de 200 árboles (parámetros del árbol de la app) y
+# AdaBoost de 200 tocones. Antes de medir comprueba que las predicciones son
+# idénticas y las probabilidades iguales (bit a bit con --jobs 1) en el dataset
+# completo y en combinaciones aleatorias de códigos. La referencia de latencia es
+# el árbol único de la app con sklearn.
+#
+#   python benchmarks/bench_compiled_ensemble.py [--rows 100000] [--trees 200] [--jobs 1]
+import argparse
+import os
+
+import joblib
+import numpy as np
+
+from common import MODELS_FOLDER, load_agaricus, microseconds_per_call, rows_per_second
+from bench_compiled_tree import random_codes
+from compiled_ensemble import CompiledEnsemble
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del conjunto de árboles compilado")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--trees', type=int, default=200)
+    parser.add_argument('--jobs', type=int, default=1, help="Hilos de CompiledEnsemble")
+    args = parser.parse_args()
+
+    from sklearn.ensemble import AdaBoostClassifier, BaggingClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    data = load_agaricus()
+    X = data[STREAMLIT_FEATURES]
+    tree = joblib.load(os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+    label_encoder = joblib.load(os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl'))
+    encoder = FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+    X_train = encoder.to_frame(encoder.transform(X))
+    y_train = label_encoder.transform(data['class'])
+
+    ensembles = {
+        'Bagging': BaggingClassifier(estimator=DecisionTreeClassifier(**tree.get_params()), n_estimators=args.trees,
+                                     max_samples=0.8, max_features=0.8, random_state=42),
+        'AdaBoost': AdaBoostClassifier(estimator=DecisionTreeClassifier(max_depth=1, random_state=42),
+                                       n_estimators=args.trees, random_state=42),
+    }
+    compiled = {}
+    for name, model in ensembles.items():
+        model.fit(X_train, y_train)
+        compiled[name] = CompiledEnsemble.from_sklearn(model, encoder, n_jobs=args.jobs)
+        for codes in (encoder.to_codes(X), random_codes(X, 20_000)):
+            X_encoded = encoder.to_frame(encoder.transform_codes(codes))
+            assert np.array_equal(model.predict(X_encoded), compiled[name].predict_codes(codes))
+            expected, proba = model.predict_proba(X_encoded), compiled[name].predict_proba_codes(codes)
+            assert np.array_equal(expected, proba) if args.jobs == 1 else np.allclose(expected, proba, rtol=0, atol=1e-12)
+        print(f"OK: {name} ({compiled[name].n_trees} árboles, {len(compiled[name].feature):,} nodos) "
+              f"predice igual que sklearn")
+
+    one_row = encoder.to_codes(X.iloc[:1])
+    one_row_frame = encoder.to_frame(encoder.transform_codes(one_row))
+    reference = microseconds_per_call(lambda: tree.predict(one_row_frame), 300)
+    print(f"\n{'Una fila':<44}{'µs/predicción':>16}{'x árbol único':>16}")
+    print(f"{'árbol único, sklearn predict(DataFrame)':<44}{reference:>16.1f}{1:>16.2f}")
+    for name, model in ensembles.items():
+        for label, func, number in ((f"{name}, sklearn predict(DataFrame)", lambda: model.predict(one_row_frame), 10),
+                                    (f"{name}, CompiledEnsemble.predict_codes",
+                                     lambda: compiled[name].predict_codes(one_row), 2000)):
+            us = microseconds_per_call(func, number)
+            print(f"{label:<44}{us:>16.1f}{us / reference:>16.2f}")
+
+    codes = random_codes(X, args.rows)
+    X_encoded = encoder.to_frame(encoder.transform_codes(codes))
+    print(f"\n{'Lote de ' + format(args.rows, ','):<44}{'filas/s':>16}")
+    print(f"{'árbol único, sklearn predict(DataFrame)':<44}"
+          f"{rows_per_second(lambda: tree.predict(X_encoded), args.rows):>16,.0f}")
+    for name, model in ensembles.items():
+        print(f"{name + ', sklearn predict(DataFrame)':<44}"
+              f"{rows_per_second(lambda: model.predict(X_encoded), args.rows, repeat=1):>16,.0f}")
+        print(f"{name + ', CompiledEnsemble.predict_codes':<44}"
+              f"{rows_per_second(lambda: compiled[name].predict_codes(codes), args.rows):>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
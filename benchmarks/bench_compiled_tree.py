@@ -0,0 +1,62 @@
+# Benchmark del árbol compilado frente a model.predict(DataFrame) de sklearn.
+# Antes de medir comprueba que las predicciones y probabilidades son idénticas
+# en el dataset completo y en combinaciones aleatorias de códigos.
+#
+#   python benchmarks/bench_compiled_tree.py [--rows 1000000]
+import argparse
+import os
+
+import joblib
+import numpy as np
+
+from common import MODELS_FOLDER, load_agaricus, microseconds_per_call, rows_per_second
+from compiled_tree import CompiledTree
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+
+def random_codes(X, n_rows, seed=42):
+    # Combinaciones aleatorias de los códigos vistos en cada columna, más códigos
+    # desconocidos para cubrir también las ramas "ninguna columna OHE activa".
+    rng = np.random.default_rng(seed)
+    codes = np.empty((n_rows, len(STREAMLIT_FEATURES)), dtype=np.uint8)
+    for j, feature in enumerate(STREAMLIT_FEATURES):
+        alphabet = np.array([ord(c) for c in sorted(set(X[feature]))] + [0], dtype=np.uint8)
+        codes[:, j] = rng.choice(alphabet, size=n_rows)
+    return codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del árbol compilado")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    X = load_agaricus()[STREAMLIT_FEATURES]
+    model = joblib.load(os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+    encoder = FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+    compiled_tree = CompiledTree.from_sklearn(model, encoder)
+
+    for codes in (encoder.to_codes(X), random_codes(X, 100_000)):
+        X_encoded = encoder.to_frame(encoder.transform_codes(codes))
+        assert np.array_equal(model.predict(X_encoded), compiled_tree.predict_codes(codes))
+        assert np.array_equal(model.predict_proba(X_encoded), compiled_tree.predict_proba_codes(codes))
+    print("OK: predicciones y probabilidades idénticas a sklearn")
+
+    record = dict(zip(STREAMLIT_FEATURES, X.iloc[0]))
+    one_row = encoder.to_codes(X.iloc[:1])
+    one_row_frame = encoder.to_frame(encoder.transform_codes(one_row))
+    print(f"\n{'Una fila':<40}{'µs/predicción':>16}")
+    print(f"{'sklearn predict(DataFrame)':<40}{microseconds_per_call(lambda: model.predict(one_row_frame), 1000):>16.1f}")
+    print(f"{'CompiledTree.predict_record':<40}{microseconds_per_call(lambda: compiled_tree.predict_record(record)):>16.1f}")
+    print(f"{'CompiledTree.predict_codes':<40}{microseconds_per_call(lambda: compiled_tree.predict_codes(one_row)):>16.1f}")
+
+    codes = random_codes(X, args.rows)
+    X_encoded = encoder.to_frame(encoder.transform_codes(codes))
+    print(f"\n{'Lote de ' + format(args.rows, ','):<40}{'filas/s':>16}")
+    print(f"{'sklearn predict(DataFrame)':<40}{rows_per_second(lambda: model.predict(X_encoded), args.rows):>16,.0f}")
+    print(f"{'sklearn codificar + predict':<40}"
+          f"{rows_per_second(lambda: model.predict(encoder.to_frame(encoder.transform_codes(codes))), args.rows):>16,.0f}")
+    print(f"{'CompiledTree.predict_codes':<40}{rows_per_second(lambda: compiled_tree.predict_codes(codes), args.rows):>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
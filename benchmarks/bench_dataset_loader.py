@@ -0,0 +1,58 @@
+# Benchmark de la carga del dataset: pd.read_csv + replace('?') frente a la caché
+# binaria de dataset_loader. Antes de medir comprueba que las dos dan lo mismo y que
+# el streaming de expanded.Z coincide con la caché.
+#
+#   python benchmarks/bench_dataset_loader.py
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import COLUMN_NAMES, ROOT, microseconds_per_call
+from dataset_loader import (DATA_FILE, EXPANDED_FILE, build_cache, decompress_lzw, iter_expanded_codes,
+                            load_dataset)
+from feature_encoder import STREAMLIT_FEATURES
+
+
+def read_csv_path():
+    # Camino del notebook
+    df = pd.read_csv(os.path.join(ROOT, 'data', 'agaricus-lepiota.data'), header=None, names=COLUMN_NAMES)
+    return df.replace('?', np.nan)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_folder:
+        reference = read_csv_path()
+        dataset = load_dataset(DATA_FILE, cache_folder)
+        assert dataset.to_frame(categorical=False).equals(reference), "La caché no coincide con read_csv"
+        expanded = load_dataset(EXPANDED_FILE, cache_folder)
+        streamed = np.concatenate(list(iter_expanded_codes(chunk_rows=1000)), axis=1)
+        assert (streamed == expanded.codes).all(), "El streaming de expanded.Z no coincide con la caché"
+        print(f"OK: la caché coincide con read_csv ({len(dataset)} filas) y expanded.Z ({len(expanded)} filas)")
+
+        start = time.perf_counter()
+        build_cache(DATA_FILE, os.path.join(cache_folder, 'tmp'))
+        build_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n{'Camino':<45}{'ms':>12}")
+        results = [
+            ('read_csv + replace', microseconds_per_call(read_csv_path, 20) / 1000),
+            ('conversión a la caché (una vez)', build_ms),
+            ('load_dataset (memmap)', microseconds_per_call(lambda: load_dataset(DATA_FILE, cache_folder), 200) / 1000),
+            ('load_dataset + to_frame()', microseconds_per_call(
+                lambda: load_dataset(DATA_FILE, cache_folder).to_frame(), 50) / 1000),
+            ('load_dataset + to_ascii_codes()', microseconds_per_call(
+                lambda: load_dataset(DATA_FILE, cache_folder).to_ascii_codes(STREAMLIT_FEATURES), 200) / 1000),
+            ('expanded.Z: descompresión LZW', microseconds_per_call(
+                lambda: sum(len(block) for block in decompress_lzw(EXPANDED_FILE)), 5) / 1000),
+            ('expanded.Z: load_dataset (memmap)', microseconds_per_call(
+                lambda: load_dataset(EXPANDED_FILE, cache_folder), 200) / 1000),
+        ]
+        for name, ms in results:
+            print(f"{name:<45}{ms:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Benchmark de la predicción deduplicada (score_codes): cada combinación distinta se
+# evalúa una vez y el resultado se reparte a sus filas. Simula una subida de
+# --rows filas muestreadas del dataset (con un --unknown de celdas vacías) y compara,
+# para el árbol de sklearn y la tabla de consulta, evaluar fila a fila, deduplicar y
+# deduplicar con la caché ya caliente (segunda subida). Antes de medir comprueba que
+# las tres variantes dan exactamente lo mismo.
+#
+#   python benchmarks/bench_dedup.py [--rows 200000] [--unknown 0.02]
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+from common import MODELS_FOLDER, load_agaricus
+from batch_prediction import PredictionCache, ScoringStats, score_codes
+from inference import load_bundle
+
+
+def best_seconds(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la predicción deduplicada")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--unknown', type=float, default=0.02, help="Fracción de celdas vacías")
+    args = parser.parse_args()
+
+    bundle = load_bundle()
+    encoder = bundle.encoder
+    codes = encoder.to_codes(load_agaricus()[encoder.features])
+    rng = np.random.default_rng(0)
+    upload = codes[rng.integers(len(codes), size=args.rows)].copy()
+    upload[rng.random(upload.shape) < args.unknown] = 0
+
+    sklearn_model = joblib.load(os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+    sklearn_labels = joblib.load(os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl'))
+    models = {
+        'árbol de sklearn': (sklearn_model, sklearn_labels),
+        'tabla de consulta': (bundle.predictor, bundle.label_encoder),
+    }
+
+    for name, (model, label_encoder) in models.items():
+        reference = score_codes(model, upload, label_encoder, encoder, dedup=False)
+        cache = PredictionCache()
+        stats = ScoringStats()
+        for result in (score_codes(model, upload, label_encoder, encoder, stats=stats),
+                       score_codes(model, upload, label_encoder, encoder, cache=cache),
+                       score_codes(model, upload, label_encoder, encoder, cache=cache)):
+            for column, expected in zip(result, reference):
+                assert np.array_equal(column, expected), name
+
+        row_by_row = best_seconds(lambda: score_codes(model, upload, label_encoder, encoder, dedup=False))
+        dedup = best_seconds(lambda: score_codes(model, upload, label_encoder, encoder))
+        warm = best_seconds(lambda: score_codes(model, upload, label_encoder, encoder, cache=cache))
+        print(f"\n== {name}: {args.rows:,} filas, {stats.unique:,} combinaciones distintas "
+              f"({stats.reduction:.0f}× menos evaluaciones)")
+        print(f"   fila a fila:            {args.rows / row_by_row:12,.0f} filas/s")
+        print(f"   deduplicado:            {args.rows / dedup:12,.0f} filas/s")
+        print(f"   deduplicado con caché:  {args.rows / warm:12,.0f} filas/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Benchmark del codificador One-Hot: FeatureEncoder frente al camino con pd.get_dummies.
+# Antes de medir comprueba que la predicción interactiva, la de archivo y el
+# entrenamiento producen exactamente los mismos bytes.
+#
+#   python benchmarks/bench_encoding.py [--rows 1000000]
+import argparse
+import io
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from common import MODELS_FOLDER, load_agaricus, rows_per_second
+from batch_prediction import DEFAULT_CHUNK_SIZE
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+
+def get_dummies_interactive(record, ohe_columns):
+    # Camino anterior del formulario interactivo
+    input_encoded = pd.get_dummies(pd.DataFrame([record]), columns=STREAMLIT_FEATURES)
+    final_input_df = pd.DataFrame(0, index=[0], columns=ohe_columns)
+    for col in input_encoded.columns:
+        if col in final_input_df.columns:
+            final_input_df[col] = input_encoded[col].iloc[0]
+    return final_input_df[ohe_columns]
+
+
+def get_dummies_batch(df, ohe_columns):
+    # Camino anterior de la predicción por archivo
+    df_encoded = pd.get_dummies(df, columns=STREAMLIT_FEATURES, drop_first=True)
+    for col in ohe_columns:
+        if col not in df_encoded.columns:
+            df_encoded[col] = 0
+    return df_encoded[ohe_columns]
+
+
+def check_same_bytes(X, encoder):
+    # Entrenamiento: el notebook ajusta el codificador con los datos de entrenamiento
+    training = FeatureEncoder.fit(X).transform(X)
+    assert FeatureEncoder.fit(X).ohe_columns == encoder.ohe_columns, "columnas OHE distintas"
+
+    # Archivo: el CSV se lee por bloques como en la app
+    buffer = io.StringIO()
+    X.to_csv(buffer, index=False)
+    buffer.seek(0)
+    batch = np.vstack([encoder.transform(chunk) for chunk in pd.read_csv(buffer, chunksize=1000)])
+
+    # Interactivo: una fila cada vez
+    interactive = np.vstack([encoder.transform_record(tuple(row)) for row in X.itertuples(index=False)])
+
+    reference = pd.get_dummies(X, columns=STREAMLIT_FEATURES, drop_first=True)
+    reference = reference.reindex(columns=encoder.ohe_columns, fill_value=0).to_numpy(dtype=np.uint8)
+
+    for name, matrix in [('entrenamiento', training), ('archivo', batch), ('interactivo', interactive)]:
+        assert matrix.tobytes() == reference.tobytes(), f"El camino '{name}' no coincide con get_dummies"
+    assert (encoder.transform(X, sparse=True).toarray() == reference).all()
+    print(f"OK: los tres caminos producen los mismos bytes ({reference.shape[0]} filas)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del codificador One-Hot")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    X = load_agaricus()[STREAMLIT_FEATURES]
+    ohe_columns = joblib.load(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+    encoder = FeatureEncoder(ohe_columns)
+
+    check_same_bytes(X, encoder)
+
+    big = X.sample(args.rows, replace=True, random_state=42).reset_index(drop=True)
+    # La predicción por archivo lee las características como 'category'
+    big_category = big.astype('category')
+    big_codes = encoder.to_codes(big_category)
+    record = tuple(X.iloc[0])
+    out = np.zeros((DEFAULT_CHUNK_SIZE, encoder.n_columns), dtype=np.uint8)
+
+    print(f"\n{'Camino':<40}{'filas/s':>16}")
+    results = [
+        ('interactivo get_dummies', rows_per_second(
+            lambda: get_dummies_interactive(dict(zip(STREAMLIT_FEATURES, record)), ohe_columns), 1)),
+        ('interactivo FeatureEncoder', rows_per_second(lambda: encoder.transform_record(record), 1)),
+        ('archivo get_dummies', rows_per_second(lambda: get_dummies_batch(big, ohe_columns), len(big))),
+        ('archivo FeatureEncoder (str)', rows_per_second(lambda: encoder.transform(big), len(big))),
+        ('archivo FeatureEncoder (category)', rows_per_second(
+            lambda: [encoder.transform(big_category.iloc[i:i + DEFAULT_CHUNK_SIZE], out=out)
+                     for i in range(0, len(big), DEFAULT_CHUNK_SIZE)], len(big))),
+        ('códigos uint8 -> matriz densa', rows_per_second(lambda: encoder.transform_codes(big_codes), len(big))),
+        ('códigos uint8 -> CSR', rows_per_second(lambda: encoder.transform_codes(big_codes, sparse=True), len(big))),
+    ]
+    for name, rate in results:
+        print(f"{name:<40}{rate:>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
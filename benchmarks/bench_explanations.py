@@ -0,0 +1,90 @@
+# Benchmark de las explicaciones por lotes (src/explanations.py) frente a la predicción
+# sola. Antes de medir comprueba que:
+#   - la hoja de la tabla de consulta (LookupTable.apply_codes) es la del árbol
+#   - la matriz indicadora de nodos coincide con decision_path del modelo de sklearn
+#     en las filas completas
+#   - con desconocidas, el camino termina en una hoja o en la primera división sobre
+#     una característica desconocida, y coincide con el de sklearn hasta ahí
+#   - las condiciones decisivas están en el camino y empujan hacia la clase predicha
+#
+#   python benchmarks/bench_explanations.py [--rows 1000000] [--unknown 0.02]
+import argparse
+import os
+import time
+
+import numpy as np
+
+from common import MODELS_FOLDER, rows_per_second, synthetic_dataset
+from batch_prediction import score_codes
+from explanations import DecisionPathExplainer, get_explainer
+from model_registry import get_registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las explicaciones por lotes")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--unknown', type=float, default=0.02, help="Fracción de celdas desconocidas")
+    parser.add_argument('--checks', type=int, default=20_000)
+    args = parser.parse_args()
+
+    import joblib
+    bundle = get_registry().get()
+    explainer = get_explainer(bundle.predictor, bundle.label_encoder)
+    tree = explainer.tree
+    walker = DecisionPathExplainer(tree, explainer.poisonous_class)
+    model = joblib.load(os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+
+    X, _ = synthetic_dataset(max(args.rows, args.checks), bundle.encoder.features, noise=0.2)
+    codes = bundle.encoder.to_codes(X)
+    rng = np.random.default_rng(0)
+    with_unknowns = codes.copy()
+    with_unknowns[rng.random(codes.shape) < args.unknown] = 0
+
+    sample = codes[:args.checks]
+    assert np.array_equal(bundle.predictor.apply_codes(sample), tree.apply_codes(sample))
+    nodes = explainer.final_nodes(sample)
+    assert np.array_equal(nodes, walker.final_nodes(sample))
+    expected = model.decision_path(bundle.encoder.to_frame(bundle.encoder.transform_codes(sample)))
+    assert (explainer.decision_path(nodes) != expected).nnz == 0
+    print(f"OK: {len(sample):,} filas completas con el mismo camino que sklearn")
+
+    sample = with_unknowns[:args.checks]
+    scored = score_codes(bundle.predictor, sample, bundle.label_encoder, bundle.encoder)
+    explanation = explainer.explain(sample, scored.predictions, path=True)
+    assert np.array_equal(explanation.node, walker.final_nodes(sample))
+    stopped = ~tree.is_leaf[explanation.node]
+    assert (sample[stopped, tree.feature[explanation.node[stopped]]] == 0).all()
+    # Hasta el nodo final, el camino es el de sklearn con las desconocidas en 0 (a la
+    # izquierda): el explicador no sigue ninguna rama que dependa de ellas
+    full_path = model.decision_path(bundle.encoder.to_frame(bundle.encoder.transform_codes(sample)))
+    assert (explanation.path.multiply(full_path) != explanation.path).nnz == 0
+    direction = np.where(scored.predictions == explainer.poisonous_class, 1.0, -1.0)[:, None]
+    present = explanation.conditions >= 0
+    assert (direction * explanation.contributions > 0)[present].all()
+    assert explanation.path[np.nonzero(present)[0], explanation.conditions[present]].all()
+    print(f"OK: {len(sample):,} filas con {args.unknown:.0%} de celdas desconocidas "
+          f"({stopped.mean():.1%} se detienen en una división sobre una desconocida)")
+
+    print(f"\n{'Lote':<12}{'caso':<44}{'filas/s':>14}{'vs. predecir':>14}")
+    for n in (1_000, 100_000, args.rows):
+        for label, batch in (('completas', codes[:n]), ('con desconocidas', with_unknowns[:n])):
+            predict = rows_per_second(lambda: score_codes(bundle.predictor, batch, bundle.label_encoder,
+                                                          bundle.encoder), n)
+            cases = {
+                f'predecir ({label})': predict,
+                'predecir + explicar': rows_per_second(lambda: explainer.explain(
+                    batch, score_codes(bundle.predictor, batch, bundle.label_encoder, bundle.encoder).predictions), n),
+                'explicar (hojas de la tabla de consulta)': rows_per_second(lambda: explainer.explain(batch), n),
+                'explicar (recorriendo el árbol)': rows_per_second(lambda: walker.explain(batch), n),
+                'explicar + matriz dispersa': rows_per_second(lambda: explainer.explain(batch, path=True), n),
+            }
+            for case, rate in cases.items():
+                print(f"{n:<12,}{case:<44}{rate:>14,.0f}{rate / predict:>13.2f}×")
+
+    start = time.perf_counter()
+    DecisionPathExplainer.from_bundle(bundle)
+    print(f"\nCrear el explicador ({len(tree.feature)} nodos): {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
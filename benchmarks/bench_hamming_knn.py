@@ -0,0 +1,75 @@
+# Benchmark del KNN de Hamming (src/hamming_knn.py) frente a KNeighborsClassifier sobre
+# la matriz One-Hot del notebook, para k = 1..30. Antes de medir comprueba que las
+# distancias a los vecinos coinciden con las de sklearn y cuántas predicciones
+# coinciden (solo pueden diferir si hay empates de distancia en el k-ésimo vecino).
+#
+#   python benchmarks/bench_hamming_knn.py [--expanded]
+import argparse
+import time
+import warnings
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from common import load_agaricus
+from data_processing import optimize_model_with_gridsearch
+from dataset_loader import EXPANDED_FILE, load_dataset
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+from hamming_knn import HammingKNNClassifier
+
+KS = list(range(1, 31))
+
+
+def load_split(expanded):
+    df = load_dataset(EXPANDED_FILE).to_frame(categorical=False) if expanded else load_agaricus()
+    X = df[STREAMLIT_FEATURES]
+    y = LabelEncoder().fit_transform(df['class'])
+    encoder = FeatureEncoder.fit(X)
+    X_encoded = encoder.to_frame(encoder.transform(X))
+    return train_test_split(X_encoded, y, test_size=0.2, random_state=42, stratify=y)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del KNN de Hamming")
+    parser.add_argument('--expanded', action='store_true', help="Usar expanded.Z en lugar del .data")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    X_train, X_test, y_train, y_test = load_split(args.expanded)
+    hamming = HammingKNNClassifier(n_neighbors=max(KS)).fit(X_train, y_train)
+    sklearn_knn = KNeighborsClassifier(n_neighbors=max(KS)).fit(X_train, y_train)
+
+    hamming_distances, _ = hamming.kneighbors(X_test)
+    sklearn_distances, _ = sklearn_knn.kneighbors(X_test)
+    assert np.allclose(hamming_distances, sklearn_distances), "Las distancias no coinciden con sklearn"
+    print(f"OK: distancias idénticas a sklearn ({len(X_test)} consultas x {max(KS)} vecinos)")
+
+    # Todos los k: sklearn predice una vez por k; Hamming ordena una vez
+    sklearn_predictions, sklearn_seconds = timed(
+        lambda: {k: KNeighborsClassifier(n_neighbors=k).fit(X_train, y_train).predict(X_test) for k in KS})
+    hamming_predictions, hamming_seconds = timed(
+        lambda: HammingKNNClassifier().fit(X_train, y_train).predict_for_ks(X_test, KS))
+    agreement = np.mean([(sklearn_predictions[k] == hamming_predictions[k]).mean() for k in KS])
+    print(f"Predicciones iguales a sklearn: {agreement:.4%} (media sobre k=1..{max(KS)})")
+
+    print(f"\n{'Camino':<45}{'segundos':>12}")
+    print(f"{'sklearn, k=1..30 (30 predicciones)':<45}{sklearn_seconds:>12.3f}")
+    print(f"{'Hamming, k=1..30 (una ordenación)':<45}{hamming_seconds:>12.3f}")
+
+    # Búsqueda completa con validación cruzada, como en el notebook
+    for name, model in [('sklearn', KNeighborsClassifier()), ('Hamming', HammingKNNClassifier())]:
+        (_, best_params), seconds = timed(lambda: optimize_model_with_gridsearch(
+            model, {'n_neighbors': KS}, X_train, y_train, model_name=f"KNN {name}", n_jobs=1, verbose=0))
+        print(f"{'optimize_model_with_gridsearch ' + name:<45}{seconds:>12.3f}   {best_params}")
+
+
+if __name__ == '__main__':
+    main()
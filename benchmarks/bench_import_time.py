@@ -0,0 +1,111 @@
+# Benchmark del arranque en frío: cada escenario se ejecuta en un proceso nuevo con
+# python -X importtime y se muestra el tiempo total hasta tener la primera predicción
+# y qué paquetes cuestan más de importar (tiempo propio de sus módulos).
+#
+#   'antes'  reproduce el arranque anterior de la app: pandas, sklearn.tree, joblib y
+#            numpy al principio y etiquetas/columnas OHE leídas de los .pkl.
+#   'ahora'  es el arranque actual: registro de modelos con encoding.json y la tabla
+#            de consulta, solo NumPy.
+#
+# Antes de medir comprueba que LabelDecoder y las columnas de encoding.json dan las
+# mismas predicciones que los .pkl en todo el dataset.
+#
+#   python benchmarks/bench_import_time.py [--repeat 5] [--top 8]
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from common import MODELS_FOLDER, ROOT, load_agaricus
+from feature_encoder import FeatureEncoder
+from inference import load_bundle
+from lookup_table import generate_lookup_table
+
+SRC = os.path.join(ROOT, 'src')
+RECORD = "dict(zip(bundle.encoder.features, 'xsntkeswwwwopsu'))"
+
+SCENARIOS = {
+    'antes': f"""
+import pandas, sklearn.tree, joblib, numpy, sys
+sys.path.append({SRC!r})
+from model_registry import ModelBundle
+from feature_encoder import FeatureEncoder
+from lookup_table import LookupTable
+bundle = ModelBundle(joblib.load({os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl')!r}),
+                     FeatureEncoder.from_file({os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl')!r}),
+                     LookupTable.load({os.path.join(MODELS_FOLDER, 'lookup_table')!r}))
+bundle.label_encoder.inverse_transform(bundle.predictor.predict_record({RECORD}))
+""",
+    'ahora': f"""
+import sys
+sys.path.append({SRC!r})
+from model_registry import get_registry
+bundle = get_registry().get()
+bundle.label_encoder.inverse_transform(bundle.predictor.predict_record({RECORD}))
+""",
+    'data_processing': f"""
+import sys
+sys.path.append({SRC!r})
+import data_processing
+""",
+}
+HEAVY = ('pandas', 'sklearn', 'joblib', 'scipy', 'matplotlib', 'seaborn')
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+\d+ \| +(\S+)')
+
+
+def check_equivalence():
+    import joblib
+    slim = load_bundle()
+    label_encoder = joblib.load(os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl'))
+    encoder = FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+    assert slim.encoder.ohe_columns == encoder.ohe_columns
+    assert (slim.label_encoder.classes_ == label_encoder.classes_).all()
+    codes = encoder.to_codes(load_agaricus()[encoder.features])
+    predictions = slim.predictor.predict_codes(codes)
+    assert np.array_equal(slim.label_encoder.inverse_transform(predictions),
+                          label_encoder.inverse_transform(predictions))
+    assert np.array_equal(slim.label_encoder.transform(['e', 'p']), label_encoder.transform(['e', 'p']))
+    print(f"encoding.json y LabelDecoder equivalen a los .pkl en {len(codes):,} filas: OK")
+
+
+def run(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=ROOT)
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    # Tiempo propio (sin submódulos) sumado por paquete raíz, en µs
+    packages = {}
+    for match in IMPORT_LINE.finditer(result.stderr):
+        name = match.group(2).split('.')[0]
+        packages[name] = packages.get(name, 0) + int(match.group(1))
+    return seconds, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del arranque en frío (python -X importtime)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+
+    # models/lookup_table no está en el repositorio: se genera antes de medir
+    generate_lookup_table()
+    check_equivalence()
+    for name, code in SCENARIOS.items():
+        runs = [run(code) for _ in range(args.repeat)]
+        seconds, packages = min(runs, key=lambda r: r[0])
+        heavy = [p for p in HEAVY if p in packages]
+        print(f"\n== {name}: {seconds * 1000:.0f} ms hasta terminar (mejor de {args.repeat}), "
+              f"importaciones {sum(packages.values()) / 1000:.0f} ms; "
+              f"paquetes pesados: {', '.join(heavy) or 'ninguno'}")
+        for package, microseconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"   {package:<24} {microseconds / 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Benchmark de la entrada de archivos (ingest.LabelTranslator) frente a
+# FeatureEncoder.codes_from_frame. Antes de medir comprueba que un archivo con
+# códigos, el mismo con etiquetas en español (en mayúsculas y sin tildes en parte de
+# las filas) y codes_from_frame dan la misma matriz de códigos, y que los valores
+# inválidos añadidos se cuentan todos en el ValidationReport.
+#
+#   python benchmarks/bench_ingest.py [--rows 2000000] [--invalid 0.001]
+import argparse
+import os
+
+import numpy as np
+
+from common import MODELS_FOLDER, rows_per_second, synthetic_dataset
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+from ingest import LabelTranslator, ValidationReport
+from mushroom_schema import FEATURE_MAPS
+
+
+def as_labels(df, rng):
+    # Mismo DataFrame con la etiqueta en lugar del código; un tercio de las filas en
+    # mayúsculas y sin tildes, como llegan de hojas de cálculo
+    labels = df.copy()
+    variants = rng.integers(3, size=len(df))
+    for feature in STREAMLIT_FEATURES:
+        code_to_label = {code: label for label, code in FEATURE_MAPS[feature].items()}
+        values = labels[feature].map(code_to_label).to_numpy(dtype=object, copy=True)
+        upper = variants == 0
+        values[upper] = [v.upper().replace('Ó', 'O').replace('Í', 'I').replace('Á', 'A').replace('É', 'E')
+                         for v in values[upper]]
+        labels[feature] = values
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la traducción de etiquetas de los archivos subidos")
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--invalid', type=float, default=0.001, help="Fracción de celdas con un valor inválido")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    encoder = FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+    translator = LabelTranslator(STREAMLIT_FEATURES)
+    codes_df = synthetic_dataset(args.rows, STREAMLIT_FEATURES)[0]
+    labels_df = as_labels(codes_df, rng)
+    expected = encoder.codes_from_frame(codes_df)
+    for name, df in (('códigos', codes_df), ('etiquetas', labels_df)):
+        assert np.array_equal(translator.translate_frame(df), expected), name
+    print(f"OK: códigos y etiquetas dan la misma matriz que codes_from_frame ({args.rows:,} filas)")
+
+    bad_df = labels_df.copy()
+    bad = rng.random(bad_df.shape) < args.invalid
+    for j, feature in enumerate(STREAMLIT_FEATURES):
+        bad_df.loc[bad[:, j], feature] = 'Zzz'
+    report = ValidationReport(STREAMLIT_FEATURES)
+    codes = translator.translate_frame(bad_df, report)
+    assert len(report) == bad.sum() and report.rows_with_errors() == bad.any(axis=1).sum()
+    assert np.array_equal(codes[bad], np.zeros(bad.sum(), dtype=np.uint8))
+    assert np.array_equal(codes[~bad], expected[~bad])
+    print(f"OK: {len(report):,} valores inválidos en {report.rows_with_errors():,} filas, todos contados en el informe")
+
+    print(f"\n{'Entrada':<52}{'filas/s':>16}")
+    object_codes_df = codes_df.astype(object)
+    for label, func in (
+            ('codes_from_frame, categórico', lambda: encoder.codes_from_frame(codes_df)),
+            ('translate_frame, categórico', lambda: translator.translate_frame(codes_df)),
+            ('codes_from_frame, códigos (object)', lambda: encoder.codes_from_frame(object_codes_df)),
+            ('translate_frame, códigos (object)', lambda: translator.translate_frame(object_codes_df)),
+            ('translate_frame, etiquetas (object)', lambda: translator.translate_frame(labels_df)),
+            (f'translate_frame, etiquetas con {args.invalid:.1%} inválidos',
+             lambda: translator.translate_frame(bad_df, ValidationReport(STREAMLIT_FEATURES)))):
+        print(f"{label:<52}{rows_per_second(func, args.rows):>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
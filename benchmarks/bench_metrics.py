@@ -0,0 +1,53 @@
+# Benchmark del coste de la instrumentación: microsegundos que añade medir una etapa
+# con las métricas activadas y desactivadas, frente a no medir nada. Antes de medir
+# comprueba que la exportación de Prometheus y el volcado JSON reflejan lo registrado.
+#
+#   python benchmarks/bench_metrics.py [--number 200000]
+import argparse
+import json
+import os
+import tempfile
+
+from common import microseconds_per_call
+from metrics import Metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del coste de las métricas por etapa")
+    parser.add_argument('--number', type=int, default=200_000)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    for seconds in (2e-6, 3e-4, 0.2):
+        metrics.observe('predict', seconds)
+    metrics.record_batch(50_000, 0.1)
+    text = metrics.to_prometheus()
+    assert 'fungiscan_stage_seconds_count{stage="predict"} 3' in text
+    assert 'fungiscan_stage_seconds_bucket{stage="predict",le="+Inf"} 3' in text
+    assert 'fungiscan_rows_total 50000' in text
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'metricas.json')
+        metrics.dump_json(path)
+        with open(path, encoding='utf-8') as f:
+            assert json.load(f)['stages']['predict']['count'] == 3
+    print("Exportación Prometheus y JSON: OK")
+
+    def bare():
+        pass
+
+    def timed(metrics):
+        def run():
+            with metrics.stage('predict'):
+                pass
+        return run
+
+    base = microseconds_per_call(bare, args.number)
+    enabled = microseconds_per_call(timed(Metrics(enabled=True)), args.number)
+    disabled = microseconds_per_call(timed(Metrics(enabled=False)), args.number)
+    print(f"Sin medir:              {base:.3f} µs")
+    print(f"Etapa con métricas:     {enabled:.3f} µs  (+{enabled - base:.3f} µs)")
+    print(f"Métricas desactivadas:  {disabled:.3f} µs  (+{disabled - base:.3f} µs)")
+
+
+if __name__ == '__main__':
+    main()
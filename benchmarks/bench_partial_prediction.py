@@ -0,0 +1,79 @@
+# Benchmark de la predicción con características desconocidas (marginalización del
+# árbol) frente a enumerar todas las combinaciones. Antes de medir comprueba con
+# filas al azar que la fracción venenosa, el peor caso y 'determinada' coinciden con
+# la enumeración, tanto en lote como fila a fila.
+#
+#   python benchmarks/bench_partial_prediction.py [--checks 300]
+import argparse
+import itertools
+import os
+
+import numpy as np
+
+from common import MODELS_FOLDER, load_agaricus, microseconds_per_call
+from compiled_tree import CompiledTree
+from feature_encoder import FeatureEncoder
+from lookup_table import generate_lookup_table
+from mushroom_schema import feature_alphabets
+
+
+def enumerate_completions(tree, row, unknown, alphabets):
+    combos = list(itertools.product(*[alphabets[tree.features[j]] for j in unknown]))
+    full = np.repeat(row[None], len(combos), axis=0)
+    for k, j in enumerate(unknown):
+        full[:, j] = [ord(combo[k]) for combo in combos]
+    return tree.predict_codes(full)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la predicción con características desconocidas")
+    parser.add_argument('--checks', type=int, default=300)
+    args = parser.parse_args()
+
+    tree = CompiledTree.load(os.path.join(generate_lookup_table(), 'tree.npz'))
+    encoder = FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+    alphabets = feature_alphabets(tree.features)
+    poisonous = 1
+    codes = encoder.to_codes(load_agaricus()[tree.features])
+
+    rng = np.random.default_rng(0)
+    for _ in range(args.checks):
+        row = codes[rng.integers(len(codes))].copy()
+        unknown = rng.choice(len(tree.features), size=rng.integers(1, 5), replace=False)
+        row[unknown] = 0
+        result = tree.predict_partial_codes(row[None], alphabets, poisonous)
+        predictions = enumerate_completions(tree, row, unknown, alphabets)
+        assert np.isclose(result.poisonous_fraction[0], (predictions == poisonous).mean())
+        assert result.determined[0] == (len(set(predictions)) == 1)
+        assert result.worst_case[0] == (poisonous if (predictions == poisonous).any() else predictions[0])
+        record = {f: chr(c) if c else None for f, c in zip(tree.features, row.tolist())}
+        single = tree.predict_partial_record(record, alphabets, poisonous)
+        assert np.isclose(single.poisonous_fraction, result.poisonous_fraction[0])
+        assert (single.determined, single.worst_case) == (result.determined[0], result.worst_case[0])
+        assert np.allclose(single.proba, result.proba[0])
+    print(f"OK: {args.checks} filas con 1-4 desconocidas coinciden con la enumeración")
+
+    print(f"\n{'Caso':<50}{'combinaciones':>16}{'µs/fila':>12}")
+    row = codes[0].copy()
+    for n_unknown in (1, 3, 5):
+        unknown = list(range(n_unknown))
+        partial = row.copy()
+        partial[unknown] = 0
+        n_combos = int(np.prod([len(alphabets[tree.features[j]]) for j in unknown]))
+        print(f"{f'enumeración, {n_unknown} desconocidas':<50}{n_combos:>16,}"
+              f"{microseconds_per_call(lambda: enumerate_completions(tree, row, unknown, alphabets), 20):>12.1f}")
+        record = {f: chr(c) if c else None for f, c in zip(tree.features, partial.tolist())}
+        print(f"{f'marginalización, {n_unknown} desconocidas':<50}{n_combos:>16,}"
+              f"{microseconds_per_call(lambda: tree.predict_partial_record(record, alphabets, poisonous), 2000):>12.1f}")
+    n_combos = int(np.prod([len(a) for a in alphabets.values()]))
+    print(f"{'marginalización, todas desconocidas':<50}{n_combos:>16,}"
+          f"{microseconds_per_call(lambda: tree.predict_partial_record({}, alphabets, poisonous), 2000):>12.1f}")
+    batch = codes.copy()
+    batch[:, [10, 13]] = 0
+    rate = len(batch) / (microseconds_per_call(
+        lambda: tree.predict_partial_codes(batch, alphabets, poisonous), 10) / 1e6)
+    print(f"\nLote de {len(batch):,} filas con 2 desconocidas: {rate:,.0f} filas/s")
+
+
+if __name__ == '__main__':
+    main()
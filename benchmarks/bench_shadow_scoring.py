@@ -0,0 +1,116 @@
+# Modo sombra (shadow_scoring.ShadowScorer) con dos retadores entrenados como en el
+# notebook: un Bagging de árboles, exportado a .fsm, y un GradientBoosting, que no
+# se compila y se sirve con sklearn. Primero comprueba, con todas las filas
+# muestreadas y sin descartes, que el acuerdo y el registro de desacuerdos coinciden
+# con comparar las predicciones directamente. Después mide lo que añade submit() al
+# camino del campeón (lotes de 1 y 512 filas, como el servicio) y cuántas filas se
+# descartan cuando llegan lotes más deprisa de lo que los retadores predicen. Con
+# una sola CPU el hilo de los retadores comparte núcleo con el campeón, así que
+# 'extra' incluye su tiempo de CPU; la fila con muestreo 0% es solo la contabilidad
+# de submit().
+#
+#   python benchmarks/bench_shadow_scoring.py [--rows 20000] [--rate 0.1] [--trees 100]
+import argparse
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+
+from common import MODELS_FOLDER, load_agaricus, microseconds_per_call
+from bench_compiled_tree import random_codes
+from batch_prediction import score_codes
+from feature_encoder import STREAMLIT_FEATURES
+from model_artifact import export_bundle
+from model_registry import ModelBundle, ModelRegistry, register_challenger_version, register_tree_version
+from shadow_scoring import ShadowScorer, read_disagreements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del modo sombra")
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--rate', type=float, default=0.1, help="Fracción de filas muestreadas")
+    parser.add_argument('--trees', type=int, default=100)
+    args = parser.parse_args()
+
+    from sklearn.ensemble import BaggingClassifier, GradientBoostingClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from compiled_ensemble import CompiledEnsemble
+
+    folder = tempfile.mkdtemp()
+    try:
+        registry = ModelRegistry()
+        register_tree_version(registry, default=True)
+        champion = registry.get()
+        label_encoder, encoder = champion.label_encoder, champion.encoder
+
+        data = load_agaricus()
+        X_train = encoder.to_frame(encoder.transform(data[STREAMLIT_FEATURES]))
+        y_train = label_encoder.transform(data['class'])
+        tree = joblib.load(os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+        bagging = BaggingClassifier(estimator=DecisionTreeClassifier(**tree.get_params()), n_estimators=args.trees,
+                                    max_samples=0.3, max_features=0.5, random_state=0).fit(X_train, y_train)
+        boosting = GradientBoostingClassifier(n_estimators=args.trees, max_depth=2, random_state=0).fit(X_train, y_train)
+        export_bundle(os.path.join(folder, 'bagging.fsm'),
+                      ModelBundle(label_encoder, encoder, CompiledEnsemble.from_sklearn(bagging, encoder)))
+        joblib.dump(boosting, os.path.join(folder, 'boosting.pkl'))
+        for name in ('label_encoder_y.pkl', 'ohe_columns_for_streamlit.pkl'):
+            shutil.copy(os.path.join(MODELS_FOLDER, name), folder)
+        register_challenger_version(registry, 'bagging', 'bagging.fsm', folder)
+        register_challenger_version(registry, 'boosting', 'boosting.pkl', folder)
+        challengers = {name: (lambda name=name: registry.get(name)) for name in ('bagging', 'boosting')}
+        print(f"Retadores: {', '.join(f'{n} ({type(c().predictor).__name__})' for n, c in challengers.items())}")
+
+        # El modo sombra solo compara filas completas
+        codes = random_codes(data[STREAMLIT_FEATURES], args.rows)
+        codes = codes[codes.all(axis=1)]
+        champion_labels = score_codes(champion.predictor, codes, label_encoder, encoder).labels
+
+        log_path = os.path.join(folder, 'desacuerdos.bin')
+        shadow = ShadowScorer(challengers, sample_rate=1.0, max_pending=1_000, log_path=log_path, seed=0)
+        for start in range(0, len(codes), 512):
+            shadow.submit(codes[start:start + 512], champion_labels[start:start + 512])
+        shadow.wait()
+        records = read_disagreements(log_path)
+        for name, get_bundle in challengers.items():
+            bundle = get_bundle()
+            expected = score_codes(bundle.predictor, codes, bundle.label_encoder, bundle.encoder).labels
+            disagree = expected != champion_labels
+            stats = shadow.stats[name]
+            logged = records[records['challenger'] == name.encode()]
+            assert stats.rows == len(codes) and stats.errors == 0
+            assert stats.rows - stats.agreements == disagree.sum() == len(logged)
+            assert np.array_equal(np.sort(logged['codes'].view('S15').ravel()),
+                                  np.sort(codes[disagree].copy().view('S15').ravel()))
+            print(f"OK: {name}: acuerdo {stats.agreement_rate:.2%}, {len(logged):,} desacuerdos en el registro "
+                  f"({os.path.getsize(log_path):,} bytes en total), {stats.microseconds_per_row:.1f} µs/fila")
+
+        print(f"\n{'Camino del campeón':<44}{'µs/lote':>12}{'extra':>10}")
+        for batch_size in (1, 512):
+            batch = codes[:batch_size]
+
+            def champion_only():
+                score_codes(champion.predictor, batch, label_encoder, encoder)
+
+            base = microseconds_per_call(champion_only, 2_000)
+            print(f"{f'{batch_size} filas, solo campeón':<44}{base:>12.1f}")
+            for rate in (0.0, args.rate):
+                scorer = ShadowScorer(challengers, sample_rate=rate, log_path=None, seed=0)
+
+                def with_shadow():
+                    scorer.submit(batch, score_codes(champion.predictor, batch, label_encoder, encoder).labels)
+
+                shadowed = microseconds_per_call(with_shadow, 2_000)
+                scorer.wait()
+                print(f"{f'{batch_size} filas, + submit (muestreo {rate:.0%})':<44}{shadowed:>12.1f}"
+                      f"{shadowed - base:>+10.1f}")
+            snapshot = scorer.snapshot()
+            print(f"    {snapshot['offered_rows']:,} filas ofrecidas, {snapshot['sampled_rows']:,} en sombra, "
+                  f"{snapshot['dropped_rows']:,} descartadas por carga")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Utilidades compartidas por los scripts de benchmark
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODELS_FOLDER = os.path.join(ROOT, 'models')
+sys.path.append(os.path.join(ROOT, 'src'))
+
+COLUMN_NAMES = [
+    'class', 'cap-shape', 'cap-surface', 'cap-color', 'bruises', 'odor',
+    'gill-attachment', 'gill-spacing', 'gill-size', 'gill-color',
+    'stalk-shape', 'stalk-root', 'stalk-surface-above-ring',
+    'stalk-surface-below-ring', 'stalk-color-above-ring',
+    'stalk-color-below-ring', 'veil-type', 'veil-color', 'ring-number',
+    'ring-type', 'spore-print-color', 'population', 'habitat'
+]
+
+
+def load_agaricus():
+    return pd.read_csv(os.path.join(ROOT, 'data', 'agaricus-lepiota.data'), header=None, names=COLUMN_NAMES)
+
+
+def rows_per_second(func, n_rows, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return n_rows / best
+
+
+def microseconds_per_call(func, number=10_000):
+    func()
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def synthetic_dataset(n_rows, features=None, noise=0.05, seed=0):
+    # n_rows setas generadas a partir de agaricus-lepiota.data: filas reales elegidas
+    # al azar y, con probabilidad 'noise' por celda, un valor de la misma columna
+    # tomado de otra fila, para que aparezcan combinaciones nuevas. Devuelve un
+    # DataFrame categórico (ocupa 1 byte por celda) y la clase de la fila de origen.
+    import numpy as np
+    data = load_agaricus()
+    features = list(features or data.columns.drop('class'))
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(len(data), size=n_rows)
+    columns = {}
+    for feature in features:
+        categorical = data[feature].astype('category')
+        codes = categorical.cat.codes.to_numpy()[rows]
+        replaced = rng.random(n_rows) < noise
+        codes[replaced] = categorical.cat.codes.to_numpy()[rng.integers(len(data), size=int(replaced.sum()))]
+        columns[feature] = pd.Categorical.from_codes(codes, categorical.cat.categories)
+    return pd.DataFrame(columns), data['class'].to_numpy()[rows]
@@ -0,0 +1,251 @@
+# Prueba de carga de la app de Streamlit (app/app.py) sin navegador: cada sesión es
+# un AppTest que repite lo que hace un usuario y se mide cada ejecución del script
+# ("rerun"), que en Streamlit recorre la página entera en cada interacción.
+#
+#   python benchmarks/load_test_app.py [--levels 1,4] [--iterations 5] [--rows 2000]
+#   python benchmarks/load_test_app.py --save [--compare --window 3 --threshold 0.25]
+#
+# Cada iteración de una sesión hace cuatro reruns:
+#
+#   inicio       la página sin cambios (guía de la pestaña 0, registro, comentarios...)
+#   clasificar   rellena el formulario con una seta de agaricus-lepiota.data, a veces
+#                con características desconocidas, y pulsa "Clasificar Seta"
+#   subida       sube un CSV nuevo con las columnas de ejemplo_setas.csv (códigos o
+#                etiquetas en español con --labels) y procesa el lote
+#   pagina       cambia de página en la vista previa (el lote ya está en la sesión)
+#
+# AppTest no se puede ejecutar desde varios hilos a la vez (cambia el Runtime global
+# de Streamlit), así que cada sesión va en su propio proceso y N sesiones
+# concurrentes son N procesos que compiten por la CPU. El primer rerun de cada
+# proceso (importaciones y carga de artefactos) y una iteración de calentamiento no
+# se cuentan; después todas las sesiones esperan en una barrera y empiezan a la vez.
+# Por rerun se mide el tiempo real y la CPU del proceso; por sesión, la memoria
+# residente tras el calentamiento, lo que crece hasta el final y el pico.
+#
+# Con --save los resultados se añaden a benchmarks/history_app.json en el formato de
+# suite.py, así que sirve de control de regresiones del coste de un rerun:
+#
+#   python benchmarks/suite.py --history benchmarks/history_app.json compare --window 3
+#
+# --compare ejecuta esa comparación al terminar y devuelve su código de salida. La
+# CPU por rerun es la métrica más estable; las latencias con varias sesiones
+# dependen de cuántas CPU tenga la máquina.
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from common import ROOT, synthetic_dataset
+from feature_encoder import STREAMLIT_FEATURES
+from mushroom_schema import FEATURE_MAPS, UNKNOWN_OPTION
+
+APP_FILE = os.path.join(ROOT, 'app', 'app.py')
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), 'history_app.json')
+STEPS = ('inicio', 'clasificar', 'subida', 'pagina')
+# Probabilidad de dejar una característica como desconocida en el formulario
+UNKNOWN_RATE = 0.1
+
+_barrier = None
+
+
+def _init_session(barrier):
+    global _barrier
+    _barrier = barrier
+
+
+def _rss_mb():
+    # Memoria residente actual; sin /proc, el pico (ru_maxrss, KB en Linux)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def upload_files(n_files, n_rows, labels=False, seed=0):
+    # CSV distintos (así cada subida procesa un archivo nuevo), con códigos de una
+    # letra o con las etiquetas del formulario
+    files = []
+    for k in range(n_files):
+        df, _ = synthetic_dataset(n_rows, STREAMLIT_FEATURES, seed=seed + k)
+        if labels:
+            for feature in STREAMLIT_FEATURES:
+                names = {code: label for label, code in FEATURE_MAPS[feature].items()}
+                df[feature] = df[feature].cat.rename_categories(lambda code: names.get(code, code))
+        files.append(df.to_csv(index=False).encode('utf-8'))
+    return files
+
+
+def form_selections(n, seed=0):
+    # n formularios: {característica: etiqueta} de filas reales, con UNKNOWN_RATE desconocidas
+    from common import load_agaricus
+    data = load_agaricus()
+    rng = np.random.default_rng(seed)
+    forms = []
+    for row in rng.integers(len(data), size=n):
+        form = {}
+        for feature in STREAMLIT_FEATURES:
+            names = {code: label for label, code in FEATURE_MAPS[feature].items()}
+            label = names.get(data[feature].iat[row], UNKNOWN_OPTION)
+            form[feature] = UNKNOWN_OPTION if rng.random() < UNKNOWN_RATE else label
+        forms.append(form)
+    return forms
+
+
+def _timed_run(at, samples, step, timeout):
+    start, cpu = time.perf_counter(), time.process_time()
+    at.run(timeout=timeout)
+    if samples is not None:
+        samples[step].append((time.perf_counter() - start, time.process_time() - cpu))
+    if at.exception:
+        raise RuntimeError(f"Error en el rerun '{step}': {at.exception[0].value}")
+
+
+def _iteration(at, form, csv, name, samples, timeout):
+    _timed_run(at, samples, 'inicio', timeout)
+    # Los selectbox del formulario están en el mismo orden que STREAMLIT_FEATURES
+    for selectbox, feature in zip(at.selectbox, STREAMLIT_FEATURES):
+        selectbox.set_value(form[feature])
+    next(button for button in at.button if button.label == "Clasificar Seta").click()
+    _timed_run(at, samples, 'clasificar', timeout)
+    at.file_uploader[0].set_value((name, csv, 'text/csv'))
+    _timed_run(at, samples, 'subida', timeout)
+    if len(at.number_input):
+        at.number_input[0].set_value(2)
+    _timed_run(at, samples, 'pagina', timeout)
+
+
+def run_session(forms, files, timeout):
+    # Una sesión completa en este proceso; devuelve sus muestras y su memoria
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - start
+    _iteration(at, forms[0], files[0], 'setas_0.csv', None, timeout)
+    rss_start = _rss_mb()
+    samples = {step: [] for step in STEPS}
+    # Si otra sesión falla antes de llegar, la espera termina con BrokenBarrierError
+    _barrier.wait(timeout)
+    for k, (form, csv) in enumerate(zip(forms[1:], files[1:]), 1):
+        _iteration(at, form, csv, f'setas_{k}.csv', samples, timeout)
+    return {
+        'first_run': first_run,
+        'samples': samples,
+        'rss_start': rss_start,
+        'rss_end': _rss_mb(),
+        'rss_peak': _peak_rss_mb(),
+    }
+
+
+def run_level(concurrency, iterations, rows, labels, timeout, seed):
+    ctx = get_context('spawn')
+    barrier = ctx.Barrier(concurrency)
+    # +1: la iteración de calentamiento
+    jobs = [(form_selections(iterations + 1, seed=seed + 1000 * s),
+             upload_files(iterations + 1, rows, labels, seed=seed + 1000 * s), timeout)
+            for s in range(concurrency)]
+    with ProcessPoolExecutor(concurrency, mp_context=ctx, initializer=_init_session, initargs=(barrier,)) as executor:
+        futures = [executor.submit(run_session, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def summarize(concurrency, sessions):
+    # Métricas en el formato de suite.py (valor, unidad, mayor_es_mejor)
+    results = {}
+    for step in STEPS:
+        samples = np.array([sample for session in sessions for sample in session['samples'][step]])
+        p50, p95, p99 = np.percentile(samples[:, 0], [50, 95, 99]) * 1000
+        results[f'rerun/{step}/c{concurrency}/p50'] = _metric(p50, 'ms', False)
+        results[f'rerun/{step}/c{concurrency}/p95'] = _metric(p95, 'ms', False)
+        results[f'rerun/{step}/c{concurrency}/p99'] = _metric(p99, 'ms', False)
+        results[f'cpu/{step}/c{concurrency}'] = _metric(samples[:, 1].mean() * 1000, 'ms', False)
+    results[f'rss/sesion/c{concurrency}'] = _metric(np.mean([s['rss_start'] for s in sessions]), 'MB', False)
+    results[f'rss/crecimiento/c{concurrency}'] = _metric(
+        np.mean([s['rss_end'] - s['rss_start'] for s in sessions]), 'MB', False)
+    results[f'rss/pico/c{concurrency}'] = _metric(max(s['rss_peak'] for s in sessions), 'MB', False)
+    results[f'primer_rerun/c{concurrency}'] = _metric(np.median([s['first_run'] for s in sessions]), 's', False)
+    return results
+
+
+def _metric(value, unit, higher_is_better):
+    return {'valor': float(value), 'unidad': unit, 'mayor_es_mejor': higher_is_better}
+
+
+def print_level(concurrency, sessions, results, elapsed):
+    n_reruns = sum(len(samples) for session in sessions for samples in session['samples'].values())
+    print(f"\n{concurrency} sesiones: {n_reruns} reruns en {elapsed:.1f} s ({n_reruns / elapsed:.1f} reruns/s), "
+          f"primer rerun {results[f'primer_rerun/c{concurrency}']['valor']:.2f} s (mediana)")
+    print(f"{'rerun':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'CPU ms':>10}")
+    for step in STEPS:
+        n = sum(len(session['samples'][step]) for session in sessions)
+        print(f"{step:<12}{n:>6}" + "".join(f"{results[f'rerun/{step}/c{concurrency}/{p}']['valor']:>10.1f}"
+                                            for p in ('p50', 'p95', 'p99'))
+              + f"{results[f'cpu/{step}/c{concurrency}']['valor']:>10.1f}")
+    print(f"RSS por sesión: {results[f'rss/sesion/c{concurrency}']['valor']:.0f} MB tras el calentamiento, "
+          f"{results[f'rss/crecimiento/c{concurrency}']['valor']:+.1f} MB durante la prueba, "
+          f"pico {results[f'rss/pico/c{concurrency}']['valor']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la app de Streamlit")
+    parser.add_argument('--levels', default='1,4', help="Sesiones concurrentes por nivel, separadas por comas")
+    parser.add_argument('--iterations', type=int, default=5, help="Iteraciones medidas por sesión")
+    parser.add_argument('--rows', type=int, default=2000, help="Filas de cada CSV subido")
+    parser.add_argument('--labels', action='store_true', help="CSV con etiquetas en español en vez de códigos")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Segundos máximos por rerun")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', action='store_true', help=f"Añadir los resultados a {HISTORY_FILE}")
+    parser.add_argument('--history', default=HISTORY_FILE)
+    parser.add_argument('--note', default='', help="Comentario que se guarda con la ejecución")
+    parser.add_argument('--compare', action='store_true',
+                        help="Comparar con el historial al terminar (implica --save)")
+    parser.add_argument('--window', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',')]
+    results = {}
+    start = time.perf_counter()
+    for concurrency in levels:
+        level_start = time.perf_counter()
+        sessions = run_level(concurrency, args.iterations, args.rows, args.labels, args.timeout, args.seed)
+        level_results = summarize(concurrency, sessions)
+        print_level(concurrency, sessions, level_results, time.perf_counter() - level_start)
+        results.update(level_results)
+
+    if not (args.save or args.compare):
+        return 0
+    import suite
+    entry = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'nota': args.note,
+        'opciones': {'niveles': levels, 'iteraciones': args.iterations, 'filas': args.rows,
+                     'etiquetas': args.labels, 'semilla': args.seed},
+        'entorno': suite._environment(),
+        'segundos': time.perf_counter() - start,
+        'resultados': results,
+    }
+    history = suite.load_history(args.history)
+    history.append(entry)
+    suite.save_history(history, args.history)
+    print(f"\nEjecución {len(history) - 1} guardada en {args.history}")
+    if args.compare and len(history) > 1:
+        print()
+        return suite.main(['--history', args.history, 'compare', '--window', str(args.window),
+                           '--threshold', str(args.threshold)])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# Prueba de carga local del servicio de predicción (src/prediction_service.py).
+# Abre N conexiones keep-alive concurrentes contra /predict (o /predict/batch) durante
+# unos segundos por nivel de concurrencia y muestra p50/p99 y peticiones por segundo.
+#
+#   uvicorn prediction_service:app --app-dir src --port 8000
+#   python benchmarks/load_test_service.py --url http://127.0.0.1:8000 --levels 1,8,32,128
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from common import load_agaricus
+from feature_encoder import STREAMLIT_FEATURES
+
+
+async def _request(reader, writer, host, path, body):
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    content_length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            content_length = int(value)
+    await reader.readexactly(content_length)
+    return int(status_line.split()[1])
+
+
+async def _client(host, port, path, bodies, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status = await _request(reader, writer, host, path, bodies[i % len(bodies)])
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            i += 1
+    finally:
+        writer.close()
+
+
+async def run_level(host, port, path, bodies, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, path, bodies, deadline, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return np.array(latencies), len(errors), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de predicción")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--levels', default='1,8,32,128', help="Niveles de concurrencia separados por comas")
+    parser.add_argument('--duration', type=float, default=5.0, help="Segundos por nivel")
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help="Si es > 0, usa /predict/batch con este número de registros por petición")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    records = load_agaricus()[STREAMLIT_FEATURES].sample(1000, random_state=42).to_dict('records')
+    if args.batch_size > 0:
+        path = '/predict/batch'
+        bodies = [json.dumps({'records': records[i:i + args.batch_size]}).encode('utf-8')
+                  for i in range(0, len(records), args.batch_size)]
+        rows_per_request = args.batch_size
+    else:
+        path = '/predict'
+        bodies = [json.dumps(record).encode('utf-8') for record in records]
+        rows_per_request = 1
+
+    print(f"{path}  ({args.duration:.0f} s por nivel)")
+    print(f"{'concurrencia':>12}{'peticiones':>12}{'errores':>9}{'p50 ms':>9}{'p99 ms':>9}{'pet/s':>10}{'filas/s':>11}")
+    for concurrency in [int(level) for level in args.levels.split(',')]:
+        latencies, errors, elapsed = asyncio.run(run_level(host, port, path, bodies, concurrency, args.duration))
+        requests_per_second = len(latencies) / elapsed
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (float('nan'),) * 2
+        print(f"{concurrency:>12}{len(latencies):>12}{errors:>9}{p50:>9.2f}{p99:>9.2f}"
+              f"{requests_per_second:>10,.0f}{requests_per_second * rows_per_request:>11,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+# Suite de benchmarks reproducible: codificación, inferencia y entrenamiento de todos
+# los modelos candidatos del notebook, más los predictores que sirve la app.
+#
+#   python benchmarks/suite.py run [--quick] [--models arbol,bagging] [--note "..."]
+#   python benchmarks/suite.py compare [--baseline -2] [--window 3] [--threshold 0.15]
+#
+# 'run' genera los datos de forma sintética a partir de agaricus-lepiota.data
+# (common.synthetic_dataset) con una semilla fija y mide, para lotes de 1, 1k, 100k
+# y 1M filas:
+#
+#   codificacion/<n>                 filas/s de FeatureEncoder (DataFrame -> OHE)
+#   prediccion/<modelo>/<n>          filas/s de predict sobre la matriz ya codificada
+#   prediccion/<modelo>/una_fila     µs por predicción de una sola seta
+#   entrenamiento/<modelo>           segundos de optimize_model_with_gridsearch
+#   carga/<artefacto>                segundos hasta tener el artefacto en memoria,
+#                                    importaciones incluidas (proceso nuevo)
+#   rss/<grupo>                      pico de memoria residente del proceso, en MB
+#
+# Cada grupo (codificación, cada modelo, cada artefacto) se ejecuta en un proceso
+# nuevo, así el pico de RSS y los tiempos de carga no dependen de lo que se midió
+# antes. Los resultados se añaden a benchmarks/history.json junto con el commit y
+# las versiones; 'compare' enfrenta la última ejecución con una anterior y termina
+# con código 1 si alguna métrica empeora más que el umbral.
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from common import MODELS_FOLDER, ROOT
+
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), 'history.json')
+BATCH_SIZES = (1, 1_000, 100_000, 1_000_000)
+QUICK_BATCH_SIZES = (1, 1_000, 100_000)
+TRAIN_ROWS = 8_124
+DEFAULT_THRESHOLD = 0.10
+
+
+def _candidates(full_grids):
+    # Los modelos del notebook con la cuadrícula del notebook (full_grids) o una
+    # reducida que mantiene el tipo de modelo y tarda segundos, no minutos.
+    import numpy as np
+    from sklearn.ensemble import AdaBoostClassifier, BaggingClassifier, GradientBoostingClassifier
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    from hamming_knn import HammingKNNClassifier
+
+    def tree(**params):
+        return DecisionTreeClassifier(random_state=42, **params)
+
+    candidates = {
+        'knn': (KNeighborsClassifier(), {'n_neighbors': np.arange(1, 31)}, {'n_neighbors': [1, 5, 15]}),
+        'knn_hamming': (HammingKNNClassifier(), {'n_neighbors': np.arange(1, 31)}, {'n_neighbors': [1, 5, 15]}),
+        'arbol': (tree(), {'max_depth': np.arange(3, 21, 2), 'min_samples_split': [2, 5, 10],
+                           'min_samples_leaf': [1, 3, 5]},
+                  {'max_depth': [5, 9, 13], 'min_samples_leaf': [1, 5]}),
+        'bagging': (BaggingClassifier(estimator=tree(), random_state=42),
+                    {'n_estimators': [100, 200], 'max_samples': [0.7, 0.8], 'max_features': [0.7, 0.8],
+                     'estimator__max_depth': [7, 12]},
+                    {'n_estimators': [100], 'max_samples': [0.8], 'max_features': [0.8],
+                     'estimator__max_depth': [7, 12]}),
+        'adaboost': (AdaBoostClassifier(estimator=tree(max_depth=1), random_state=42),
+                     {'n_estimators': [50, 100, 200], 'learning_rate': [0.01, 0.1, 1.0]},
+                     {'n_estimators': [100], 'learning_rate': [0.1, 1.0]}),
+        'gradient_boosting': (GradientBoostingClassifier(random_state=42),
+                              {'n_estimators': [50, 100, 200], 'learning_rate': [0.01, 0.1, 0.2],
+                               'max_depth': [3, 5]},
+                              {'n_estimators': [100], 'learning_rate': [0.1], 'max_depth': [3]}),
+    }
+    return {name: (model, full if full_grids else reduced) for name, (model, full, reduced) in candidates.items()}
+
+
+MODELS = ('knn', 'knn_hamming', 'arbol', 'bagging', 'adaboost', 'gradient_boosting')
+# KNN compara cada fila con todo el conjunto de entrenamiento: 1M filas tardaría minutos
+MAX_ROWS = {'knn': 100_000, 'knn_hamming': 100_000}
+ARTIFACTS = ('pickles', 'sin_pickle', 'arbol_compilado')
+
+
+def _metric(value, unit, higher_is_better):
+    return {'valor': value, 'unidad': unit, 'mayor_es_mejor': higher_is_better}
+
+
+def _best_seconds(func, budget=0.5, max_repeat=20):
+    # Mínimo de varias repeticiones: en una máquina compartida el ruido solo suma
+    # tiempo, así que el mínimo es lo más estable. Se repite hasta gastar 'budget'
+    # segundos (al menos 3 veces) para que los lotes pequeños tengan más muestras.
+    func()
+    best, spent, repeat = float('inf'), 0.0, 0
+    while repeat < 3 or (spent < budget and repeat < max_repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best, spent, repeat = min(best, elapsed), spent + elapsed, repeat + 1
+    return best
+
+
+def _microseconds_per_call(func, budget=0.5):
+    # Como _best_seconds, pero cada muestra es un bucle de llamadas de ~budget/10 s
+    func()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= budget / 10 or number >= 100_000:
+            break
+        number *= 4
+    return _best_seconds(lambda: [func() for _ in range(number)], budget) / number * 1e6
+
+
+def _peak_rss_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _bench_encoding(sizes, seed):
+    from common import synthetic_dataset
+    from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+    X, _ = synthetic_dataset(max(sizes), STREAMLIT_FEATURES, seed=seed)
+    encoder = FeatureEncoder.fit(X, STREAMLIT_FEATURES)
+    results = {}
+    for n in sizes:
+        batch = X.iloc[:n]
+        seconds = _best_seconds(lambda: encoder.transform(batch))
+        results[f'codificacion/{n}'] = _metric(n / seconds, 'filas/s', True)
+    results['rss/codificacion'] = _metric(_peak_rss_mb(), 'MB', False)
+    return results
+
+
+def _bench_model(name, sizes, seed, full_grids):
+    import numpy as np
+    from common import synthetic_dataset
+    from data_processing import optimize_model_with_gridsearch
+    from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+    model, grid = _candidates(full_grids)[name]
+    X_train_raw, y_train = synthetic_dataset(TRAIN_ROWS, STREAMLIT_FEATURES, seed=seed)
+    encoder = FeatureEncoder.fit(X_train_raw, STREAMLIT_FEATURES)
+    X_train = encoder.to_frame(encoder.transform(X_train_raw))
+    y_train = (y_train == 'p').astype(np.int64)
+
+    start = time.perf_counter()
+    best_model, _ = optimize_model_with_gridsearch(model, grid, X_train, y_train, model_name=name, cv=3,
+                                                   n_jobs=1, verbose=0)
+    results = {f'entrenamiento/{name}': _metric(time.perf_counter() - start, 's', False)}
+
+    sizes = [n for n in sizes if n <= MAX_ROWS.get(name, float('inf'))]
+    X_raw, _ = synthetic_dataset(max(sizes), STREAMLIT_FEATURES, seed=seed + 1)
+    X = encoder.to_frame(encoder.transform(X_raw))
+    one_row = X.iloc[:1]
+    results[f'prediccion/{name}/una_fila'] = _metric(_microseconds_per_call(lambda: best_model.predict(one_row)),
+                                                     'µs', False)
+    for n in sizes:
+        batch = X.iloc[:n]
+        seconds = _best_seconds(lambda: best_model.predict(batch))
+        results[f'prediccion/{name}/{n}'] = _metric(n / seconds, 'filas/s', True)
+    results[f'rss/{name}'] = _metric(_peak_rss_mb(), 'MB', False)
+    return results
+
+
+def _bench_artifact(name, sizes, seed):
+    # Carga en un proceso nuevo (con las importaciones propias de cada camino; numpy y
+    # pandas ya los importó common) y predicción sobre la matriz de códigos
+    start = time.perf_counter()
+    if name == 'pickles':
+        import joblib
+        from feature_encoder import FeatureEncoder
+        model = joblib.load(os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+        joblib.load(os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl'))
+        encoder = FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+
+        def predict(codes):
+            return model.predict(encoder.to_frame(encoder.transform_codes(codes)))
+    elif name == 'sin_pickle':
+        from inference import load_bundle
+        bundle = load_bundle()
+        encoder, predict = bundle.encoder, bundle.predictor.predict_codes
+    else:
+        from compiled_tree import CompiledTree
+        from inference import load_encoding
+        from feature_encoder import FeatureEncoder
+        tree = CompiledTree.load(os.path.join(MODELS_FOLDER, 'lookup_table', 'tree.npz'))
+        encoder = FeatureEncoder(load_encoding(os.path.join(MODELS_FOLDER, 'lookup_table'))['ohe_columns'])
+        predict = tree.predict_codes
+    results = {f'carga/{name}': _metric(time.perf_counter() - start, 's', False)}
+
+    from common import synthetic_dataset
+    X_raw, _ = synthetic_dataset(max(sizes), encoder.features, seed=seed + 1)
+    codes = encoder.to_codes(X_raw)
+    results[f'prediccion/{name}/una_fila'] = _metric(_microseconds_per_call(lambda: predict(codes[:1])), 'µs', False)
+    for n in sizes:
+        batch = codes[:n]
+        seconds = _best_seconds(lambda: predict(batch))
+        results[f'prediccion/{name}/{n}'] = _metric(n / seconds, 'filas/s', True)
+    results[f'rss/{name}'] = _metric(_peak_rss_mb(), 'MB', False)
+    return results
+
+
+def _run_group(kind, name, sizes, seed, full_grids):
+    # Punto de entrada del proceso hijo ('spawn': parte de un intérprete vacío)
+    sys.path.append(os.path.join(ROOT, 'src'))
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    import contextlib
+    import warnings
+    warnings.filterwarnings('ignore')
+    # optimize_model_with_gridsearch imprime los mejores parámetros: a stderr, con el progreso
+    with contextlib.redirect_stdout(sys.stderr):
+        if kind == 'codificacion':
+            return _bench_encoding(sizes, seed)
+        if kind == 'modelo':
+            return _bench_model(name, sizes, seed, full_grids)
+        return _bench_artifact(name, sizes, seed)
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import numpy
+    import sklearn
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'sklearn': sklearn.__version__,
+        'maquina': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_history(path=HISTORY_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_FILE):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=1, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def run(args):
+    sizes = QUICK_BATCH_SIZES if args.quick else BATCH_SIZES
+    if args.sizes:
+        sizes = tuple(int(n) for n in args.sizes.split(','))
+    models = args.models.split(',') if args.models else list(MODELS)
+    unknown = [m for m in models if m not in MODELS]
+    if unknown:
+        raise SystemExit(f"Modelos desconocidos: {', '.join(unknown)} (disponibles: {', '.join(MODELS)})")
+
+    groups = [('codificacion', None)] + [('modelo', m) for m in models] + [('artefacto', a) for a in ARTIFACTS]
+    results = {}
+    start = time.perf_counter()
+    for kind, name in groups:
+        label = kind if name is None else f"{kind} {name}"
+        print(f"[suite] {label}...", file=sys.stderr, flush=True)
+        group_start = time.perf_counter()
+        # Un proceso por grupo: max_tasks_per_child=1 y 'spawn' para empezar siempre de cero
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'), max_tasks_per_child=1) as executor:
+            group_results = executor.submit(_run_group, kind, name, sizes, args.seed, args.full_grids).result()
+        results.update(group_results)
+        print(f"[suite] {label}: {time.perf_counter() - group_start:.1f} s", file=sys.stderr, flush=True)
+
+    entry = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'nota': args.note,
+        'opciones': {'tamaños': list(sizes), 'semilla': args.seed, 'cuadriculas_completas': args.full_grids},
+        'entorno': _environment(),
+        'segundos': time.perf_counter() - start,
+        'resultados': results,
+    }
+    history = load_history(args.history)
+    history.append(entry)
+    save_history(history, args.history)
+
+    print(f"\n{'Métrica':<44}{'valor':>16}  unidad")
+    for name, metric in sorted(results.items()):
+        print(f"{name:<44}{_format(metric['valor']):>16}  {metric['unidad']}")
+    print(f"\nEjecución {len(history) - 1} guardada en {args.history}")
+
+
+def compare(args):
+    history = load_history(args.history)
+    if len(history) < 2:
+        raise SystemExit(f"Se necesitan al menos dos ejecuciones en {args.history}")
+    current = history[args.run]
+    # Con --window N la referencia es la mediana de N ejecuciones que terminan en
+    # --baseline: en máquinas compartidas una sola ejecución puede variar un 20-30 %
+    end = args.baseline % len(history) + 1
+    baselines = history[max(0, end - args.window):end]
+    baseline = _median_results(baselines)
+    print(f"Comparando {current['fecha']} ({current['entorno']['commit']}) con "
+          + ", ".join(f"{b['fecha']} ({b['entorno']['commit']})" for b in baselines)
+          + f", umbral {args.threshold:.0%}\n")
+    if any(b['opciones'] != current['opciones'] or b['entorno']['cpus'] != current['entorno']['cpus']
+           for b in baselines):
+        print("Aviso: las ejecuciones usan opciones o máquinas distintas\n")
+
+    regressions = []
+    print(f"{'Métrica':<44}{'antes':>14}{'ahora':>14}{'cambio':>10}")
+    for name in sorted(set(current['resultados']) & set(baseline)):
+        old, new = baseline[name], current['resultados'][name]
+        if not old['valor']:
+            continue
+        change = new['valor'] / old['valor'] - 1
+        # Positivo = mejora, sea la métrica de "más es mejor" o de "menos es mejor"
+        improvement = change if new['mayor_es_mejor'] else -change
+        flag = ''
+        if improvement < -args.threshold:
+            flag = '  REGRESIÓN'
+            regressions.append(name)
+        elif improvement > args.threshold:
+            flag = '  mejora'
+        print(f"{name:<44}{_format(old['valor']):>14}{_format(new['valor']):>14}{change:>+10.1%}{flag}")
+
+    only = sorted(set(current['resultados']) ^ set(baseline))
+    if only:
+        print(f"\nMétricas que solo están en una de las dos ejecuciones: {', '.join(only)}")
+    if regressions:
+        print(f"\n{len(regressions)} regresiones de más del {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\nSin regresiones")
+    return 0
+
+
+def _median_results(runs):
+    values = {}
+    for run in runs:
+        for name, metric in run['resultados'].items():
+            values.setdefault(name, (metric, []))[1].append(metric['valor'])
+    return {name: dict(metric, valor=statistics.median(samples)) for name, (metric, samples) in values.items()}
+
+
+def _format(value):
+    return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.3f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de benchmarks de FungiScan")
+    parser.add_argument('--history', default=HISTORY_FILE, help="Archivo JSON con el historial de ejecuciones")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Ejecuta la suite y añade el resultado al historial")
+    run_parser.add_argument('--quick', action='store_true', help="Sin el lote de 1M filas")
+    run_parser.add_argument('--sizes', help="Tamaños de lote separados por comas (p. ej. 1,1000)")
+    run_parser.add_argument('--models', help=f"Subconjunto de modelos: {','.join(MODELS)}")
+    run_parser.add_argument('--full-grids', action='store_true',
+                            help="Entrenar con las cuadrículas completas del notebook")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--note', default='', help="Comentario que se guarda con la ejecución")
+
+    compare_parser = subparsers.add_parser('compare', help="Compara dos ejecuciones del historial")
+    compare_parser.add_argument('--run', type=int, default=-1, help="Ejecución a comparar (índice, -1 = última)")
+    compare_parser.add_argument('--baseline', type=int, default=-2, help="Ejecución de referencia (índice)")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help="Empeoramiento relativo que cuenta como regresión")
+    compare_parser.add_argument('--window', type=int, default=1,
+                                help="Usar como referencia la mediana de las N ejecuciones hasta --baseline")
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        # models/lookup_table no está en el repositorio: los caminos sin pickle la leen
+        from lookup_table import generate_lookup_table
+        generate_lookup_table()
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
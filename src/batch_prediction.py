@@ -0,0 +1,345 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+
+import numpy as np
+
+from metrics import get_metrics
+from mushroom_schema import POISONOUS_LABEL, feature_alphabets
+
+
+# Número de filas que se leen y codifican de una vez. Con 72 columnas OHE en uint8
+# la matriz de un bloque ocupa ~3.6 MB, da igual lo grande que sea el archivo.
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Entradas de la caché de predicciones entre subidas (cada una ocupa unos 200 bytes)
+DEFAULT_CACHE_SIZE = 50_000
+
+# Resultado de score_codes, fila a fila
+ScoredRows = namedtuple('ScoredRows', ['labels', 'predictions', 'fraction', 'determined'])
+
+
+class MissingColumnsError(ValueError):
+    # Al archivo le faltan características del modelo (se comprueba en la cabecera,
+    # antes de predecir nada)
+    def __init__(self, missing):
+        super().__init__(f"Faltan columnas en el archivo: {', '.join(missing)}")
+        self.missing = list(missing)
+
+
+def iter_predictions(source, model, label_encoder, encoder,
+                     chunk_size=DEFAULT_CHUNK_SIZE, prediction_column='predicción', uncertainty_columns=False,
+                     cache=None, stats=None, dedup=True, translator=None, report=None, monitor=None,
+                     shadow=None, explainer=None):
+    # Lee el CSV por bloques y devuelve cada bloque con la columna de predicción
+    # añadida. 'model' puede ser cualquier predictor con predict_codes (CompiledTree,
+    # LookupTable) o un modelo de sklearn; para este último la matriz OHE se reserva
+    # una vez y se reutiliza en todos los bloques.
+    #
+    # Las celdas vacías se tratan como características desconocidas (ver
+    # predict_codes_with_unknowns). Con uncertainty_columns=True se añaden además las
+    # columnas 'fracción_venenosa' y 'determinada'. Cada bloque registra en las
+    # métricas el tiempo de codificación, predict e inverse_transform, y sus filas/s.
+    #
+    # Cada combinación distinta de un bloque se predice una sola vez (ver score_codes);
+    # 'cache' (PredictionCache) y 'stats' (ScoringStats) se pasan a score_codes.
+    #
+    # Con 'translator' (ingest.LabelTranslator) las columnas pueden traer códigos o
+    # etiquetas en español, y los valores inválidos se anotan en 'report'
+    # (ingest.ValidationReport) con su fila en el archivo en vez de codificarse en silencio.
+    #
+    # Con 'monitor' (drift_monitor.DriftMonitor) cada bloque se suma a las estadísticas
+    # de deriva y se añade la columna 'combinación_nueva': la fila está completa y su
+    # combinación de códigos no aparece en los datos de entrenamiento.
+    #
+    # Con 'shadow' (shadow_scoring.ShadowScorer) una muestra de cada bloque se predice
+    # además con los modelos retadores en segundo plano.
+    #
+    # Con 'explainer' (explanations.DecisionPathExplainer) se añade la columna
+    # 'explicación' con las condiciones del árbol que más pesaron en cada predicción.
+    import pandas as pd
+
+    buffer = np.zeros((chunk_size, encoder.n_columns), dtype=np.uint8)
+    # Leer las características como 'category' deja que el parser de C resuelva los
+    # valores distintos; el codificador solo traduce las categorías, no cada fila.
+    # El resto de columnas se leen como texto: si no, su tipo depende de cada bloque
+    # (una columna vacía en el primero sale float y con texto en otro, object) y los
+    # bloques no encajan en un mismo esquema al escribir los resultados.
+    dtypes = defaultdict(lambda: str, {feature: 'category' for feature in encoder.features})
+
+    metrics = get_metrics()
+
+    n_rows = 0
+    for i, chunk in enumerate(pd.read_csv(source, chunksize=chunk_size, dtype=dtypes)):
+        if i == 0:
+            missing = [col for col in encoder.features if col not in chunk.columns]
+            if missing:
+                raise MissingColumnsError(missing)
+
+        start = time.perf_counter()
+        with metrics.stage('encoding'):
+            if translator is not None:
+                codes = translator.translate_frame(chunk, report, row_offset=n_rows)
+            else:
+                codes = encoder.to_codes(chunk)
+        n_rows += len(chunk)
+        scored = score_codes(model, codes, label_encoder, encoder, cache=cache, stats=stats, dedup=dedup,
+                             buffer=buffer)
+        chunk[prediction_column] = scored.labels
+        if shadow is not None:
+            with metrics.stage('shadow'):
+                shadow.submit(codes, scored.labels)
+        if uncertainty_columns:
+            chunk['fracción_venenosa'] = scored.fraction
+            chunk['determinada'] = scored.determined
+        if explainer is not None:
+            with metrics.stage('explain'):
+                chunk['explicación'] = explainer.explain(codes, scored.predictions).text
+        if monitor is not None:
+            with metrics.stage('drift'):
+                chunk['combinación_nueva'] = monitor.observe(codes)
+        metrics.record_batch(len(chunk), time.perf_counter() - start)
+        yield chunk
+
+
+def score_codes(model, codes, label_encoder, encoder, cache=None, stats=None, dedup=True, buffer=None):
+    # Predice un bloque de códigos evaluando el modelo una sola vez por combinación
+    # distinta: cada fila se resume en una clave int64 (encoder.row_keys), las claves
+    # se agrupan con una ordenación (_group_keys) y los resultados de las filas únicas
+    # se reparten con el índice inverso. Las etiquetas (inverse_transform) también se calculan solo para
+    # las filas únicas. Con 'cache' se reutilizan además las combinaciones ya vistas en
+    # bloques o subidas anteriores, y 'stats' acumula filas, combinaciones distintas y
+    # evaluaciones del modelo.
+    metrics = get_metrics()
+    codes = np.asarray(codes, dtype=np.uint8)
+    if not len(codes):
+        # Un bloque vacío (p. ej. la plantilla CSV, solo con cabecera): columnas vacías
+        # con los mismos tipos que las de un bloque con filas
+        return ScoredRows(label_encoder.classes_[:0], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=float),
+                          np.zeros(0, dtype=bool))
+    with metrics.stage('dedup'):
+        if dedup:
+            keys, first, inverse = _group_keys(encoder.row_keys(codes))
+            unique_codes = codes[first]
+        else:
+            keys, inverse, unique_codes = None, None, codes
+        if cache is not None and keys is not None:
+            cache.bind(model, encoder, label_encoder)
+            found, cached = cache.lookup(keys)
+        else:
+            found, cached = np.zeros(len(unique_codes), dtype=bool), []
+
+    missing = np.flatnonzero(~found)
+    labels = predictions = fraction = determined = None
+    if len(missing):
+        with metrics.stage('predict'):
+            predictions, fraction, determined = _predict_rows(model, unique_codes[missing], label_encoder,
+                                                              encoder, buffer)
+        with metrics.stage('inverse_transform'):
+            labels = label_encoder.inverse_transform(predictions)
+        if cache is not None and keys is not None:
+            cache.store(keys[missing], labels, predictions, fraction, determined)
+
+    if cached:
+        hits = np.flatnonzero(found)
+        columns = [_merge(len(found), missing, evaluated, hits, [entry[i] for entry in cached])
+                   for i, evaluated in enumerate((labels, predictions, fraction, determined))]
+    else:
+        columns = [labels, predictions, fraction, determined]
+    if stats is not None:
+        if keys is None and stats.track_distinct:
+            keys = np.unique(encoder.row_keys(codes))
+        stats.add(len(codes), keys, len(missing))
+    if inverse is not None:
+        columns = [column[inverse] for column in columns]
+    return ScoredRows(*columns)
+
+
+def _group_keys(keys):
+    # Como np.unique(keys, return_index=True, return_inverse=True), pero con una sola
+    # ordenación no estable (la mitad de tiempo): cualquier fila de cada grupo sirve
+    # de representante, no hace falta que sea la primera.
+    if not len(keys):
+        return keys, np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = np.empty(len(keys), dtype=bool)
+    starts[0] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=starts[1:])
+    inverse = np.empty(len(keys), dtype=np.intp)
+    inverse[order] = np.cumsum(starts) - 1
+    return sorted_keys[starts], order[starts], inverse
+
+
+def _predict_rows(model, codes, label_encoder, encoder, buffer=None):
+    if hasattr(model, 'predict_codes'):
+        # Evalúa directamente los códigos, sin matriz OHE
+        return predict_codes_with_unknowns(model, codes, label_encoder, encoder.features)
+    if buffer is None or len(buffer) < len(codes):
+        buffer = None
+    X = encoder.transform_codes(codes, out=buffer)
+    predictions = model.predict(encoder.to_frame(X))
+    return _unknowns_as_worst_case(predictions, codes, label_encoder.transform([POISONOUS_LABEL])[0])
+
+
+def _merge(size, evaluated_positions, evaluated, cached_positions, cached):
+    cached = np.asarray(cached)
+    if not len(evaluated_positions):
+        return cached
+    merged = np.empty(size, dtype=np.result_type(evaluated, cached))
+    merged[evaluated_positions] = evaluated
+    merged[cached_positions] = cached
+    return merged
+
+
+class PredictionCache:
+    # Caché LRU acotada de clave de fila -> (etiqueta, predicción, fracción venenosa,
+    # determinada), compartida entre subidas. Las claves solo tienen sentido para un
+    # modelo y un codificador concretos: si cambian (p. ej. al recargar el modelo) la
+    # caché se vacía.
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._owners = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bind(self, *owners):
+        with self._lock:
+            if self._owners is None or len(owners) != len(self._owners) or \
+                    any(a is not b for a, b in zip(owners, self._owners)):
+                self._entries.clear()
+                self._owners = owners
+
+    def lookup(self, keys):
+        # Devuelve (máscara de claves encontradas, entradas de las encontradas en orden)
+        found = np.zeros(len(keys), dtype=bool)
+        values = []
+        with self._lock:
+            entries = self._entries
+            for i, key in enumerate(keys.tolist()):
+                entry = entries.get(key)
+                if entry is not None:
+                    entries.move_to_end(key)
+                    found[i] = True
+                    values.append(entry)
+            self.hits += len(values)
+            self.misses += len(keys) - len(values)
+        return found, values
+
+    def store(self, keys, labels, predictions, fraction, determined):
+        if not self.max_size:
+            return
+        # Si el bloque no cabe entero, solo se guardan sus últimas claves
+        start = max(0, len(keys) - self.max_size)
+        with self._lock:
+            entries = self._entries
+            for entry in zip(keys[start:].tolist(), labels[start:], predictions[start:],
+                             fraction[start:].tolist(), determined[start:].tolist()):
+                entries[entry[0]] = entry[1:]
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ScoringStats:
+    # Contadores de una subida o un proceso: filas, combinaciones distintas y filas que
+    # llegaron a evaluarse con el modelo. Las combinaciones distintas se cuentan en todo
+    # el archivo, no por bloque: se guardan sus claves (encoder.row_keys) ordenadas,
+    # 8 bytes por combinación. Con track_distinct=False (el servicio, que nunca
+    # termina) no se guardan y 'unique' es None.
+    def __init__(self, track_distinct=True):
+        self.rows = 0
+        self.evaluated = 0
+        self.track_distinct = track_distinct
+        self._keys = np.zeros(0, dtype=np.int64) if track_distinct else None
+
+    def add(self, rows, keys, evaluated):
+        # keys: claves distintas y ordenadas del bloque, como las de _group_keys
+        self.rows += rows
+        self.evaluated += evaluated
+        if self._keys is not None and keys is not None and len(keys):
+            positions = np.searchsorted(self._keys, keys).clip(max=max(len(self._keys) - 1, 0))
+            new = keys[self._keys[positions] != keys] if len(self._keys) else keys
+            if len(new):
+                # Dos tramos ordenados: la ordenación estable (timsort) los mezcla en tiempo lineal
+                self._keys = np.sort(np.concatenate([self._keys, new]), kind='stable')
+
+    @property
+    def unique(self):
+        return None if self._keys is None else len(self._keys)
+
+    @property
+    def reduction(self):
+        # Cuántas veces menos evaluaciones que filas
+        return self.rows / self.evaluated if self.evaluated else float('inf')
+
+
+_prediction_cache = None
+_prediction_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    # Caché compartida por el proceso (la app la usa entre subidas)
+    global _prediction_cache
+    with _prediction_cache_lock:
+        if _prediction_cache is None:
+            _prediction_cache = PredictionCache()
+        return _prediction_cache
+
+
+def predict_codes_with_unknowns(model, codes, label_encoder, features):
+    # Predice un bloque de códigos. Las filas con alguna característica desconocida
+    # (celda vacía o valor no reconocido: código 0) se predicen marginalizando el
+    # árbol sobre las letras posibles y se quedan con el peor caso: venenosa si alguna
+    # combinación lo es. Devuelve (predicciones, fracción venenosa, determinada).
+    #
+    # Los modelos sin predict_partial_codes (CompiledEnsemble, modelos de sklearn) no
+    # pueden marginalizar: ver _unknowns_as_worst_case.
+    predictions = model.predict_codes(codes)
+    poisonous = label_encoder.transform([POISONOUS_LABEL])[0]
+    if not hasattr(model, 'predict_partial_codes'):
+        return _unknowns_as_worst_case(predictions, codes, poisonous)
+    fraction = (predictions == poisonous).astype(float)
+    determined = np.ones(len(predictions), dtype=bool)
+    unknown = (codes == 0).any(axis=1)
+    if unknown.any():
+        predictions = predictions.copy()
+        partial = model.predict_partial_codes(codes[unknown], feature_alphabets(features), poisonous)
+        predictions[unknown] = partial.worst_case
+        fraction[unknown] = partial.poisonous_fraction
+        determined[unknown] = partial.determined
+    return predictions, fraction, determined
+
+
+def _unknowns_as_worst_case(predictions, codes, poisonous):
+    # Para modelos que no marginalizan. Un código desconocido se codifica como un
+    # one-hot de ceros, que para el modelo es la categoría eliminada por drop_first: su
+    # predicción sería una suposición. Esas filas se quedan con el peor caso
+    # (venenosa), sin fracción venenosa (NaN) y como no determinadas.
+    fraction = (predictions == poisonous).astype(float)
+    unknown = (codes == 0).any(axis=1)
+    if unknown.any():
+        predictions = predictions.copy()
+        predictions[unknown] = poisonous
+        fraction[unknown] = np.nan
+    return predictions, fraction, ~unknown
+
+
+def predict_csv_to_file(source, output, model, label_encoder, encoder,
+                        chunk_size=DEFAULT_CHUNK_SIZE, prediction_column='predicción'):
+    # Escribe los resultados en 'output' (ruta o fichero abierto) según se van
+    # calculando. Devuelve el número de filas procesadas.
+    n_rows = 0
+    for chunk in iter_predictions(source, model, label_encoder, encoder,
+                                  chunk_size=chunk_size, prediction_column=prediction_column):
+        chunk.to_csv(output, index=False, header=(n_rows == 0), mode='a' if n_rows else 'w')
+        n_rows += len(chunk)
+    return n_rows
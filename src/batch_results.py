@@ -0,0 +1,138 @@
+import gzip
+import os
+import tempfile
+
+import numpy as np
+
+from ingest import LabelTranslator
+from mushroom_schema import CLASS_NAMES, FEATURE_MAPS, POISONOUS_LABEL
+
+
+# Resultados de una predicción en lote sin tenerlos enteros en memoria: los bloques
+# de iter_predictions se comprimen en un fichero temporal según llegan (ResultWriter)
+# y solo se guardan unos recuentos por valor de algunas columnas (ResultSummary). Lo
+# que ocupa la sesión no depende del tamaño del archivo, salvo el resultado
+# comprimido en disco.
+
+# Formatos de descarga: extensión del archivo y tipo MIME
+RESULT_FORMATS = {
+    'csv.gz': ('setas_con_predicciones.csv.gz', 'application/gzip'),
+    'parquet': ('setas_con_predicciones.parquet', 'application/vnd.apache.parquet'),
+}
+
+# Columnas por las que se resumen los resultados
+SUMMARY_COLUMNS = ('habitat', 'population')
+
+
+class ResultWriter:
+    # Escribe bloques de resultados en un fichero temporal anónimo (se borra al
+    # cerrarlo o al liberarse el objeto) como CSV con gzip o Parquet. Parquet necesita
+    # pyarrow; el esquema sale del primer bloque, con las columnas de texto y las
+    # categóricas como string para que todos los bloques coincidan (iter_predictions
+    # lee como texto todas las columnas que no son características, así una columna
+    # vacía en el primer bloque no queda como float).
+    def __init__(self, fmt='csv.gz', compresslevel=6):
+        if fmt not in RESULT_FORMATS:
+            raise ValueError(f"Formato no soportado: {fmt} (opciones: {', '.join(RESULT_FORMATS)})")
+        self.format = fmt
+        self.file_name, self.mime = RESULT_FORMATS[fmt]
+        self.rows = 0
+        self._file = tempfile.TemporaryFile(mode='w+b')
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=compresslevel) \
+            if fmt == 'csv.gz' else None
+        self._parquet = None
+        self._schema = None
+        self._closed = False
+
+    def write(self, chunk):
+        if self._gzip is not None:
+            self._gzip.write(chunk.to_csv(index=False, header=(self.rows == 0)).encode('utf-8'))
+        else:
+            self._write_parquet(chunk)
+        self.rows += len(chunk)
+
+    def _write_parquet(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._schema is None:
+            inferred = pa.Table.from_pandas(chunk, preserve_index=False).schema
+            self._schema = pa.schema([
+                pa.field(field.name, pa.string()) if chunk[field.name].dtype.kind == 'O' else field
+                for field in inferred])
+            self._parquet = pq.ParquetWriter(self._file, self._schema)
+        self._parquet.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+
+    def close(self):
+        # Termina el archivo (cola de gzip, pie de Parquet); después solo se puede leer
+        if self._closed:
+            return
+        if self._gzip is not None:
+            self._gzip.close()
+        elif self._parquet is not None:
+            self._parquet.close()
+        self._file.flush()
+        self._closed = True
+
+    @property
+    def size(self):
+        # Bytes del archivo comprimido
+        self.close()
+        return os.fstat(self._file.fileno()).st_size
+
+    def read(self):
+        # Contenido completo del archivo. La app lo pide solo al pulsar la descarga, desde
+        # otro hilo: pread no mueve la posición del fichero.
+        return os.pread(self._file.fileno(), self.size, 0)
+
+    def discard(self):
+        self.close()
+        self._file.close()
+
+
+class ResultSummary:
+    # Recuento de predicciones por valor de cada columna de 'columns' (hábitat y
+    # población por defecto). Los valores pueden ser códigos o etiquetas: se traducen
+    # con un LabelTranslator y se cuentan por código (0 = desconocido o no válido), así
+    # que ocupa 256 contadores por columna y clase sea cual sea el número de filas.
+    def __init__(self, columns=SUMMARY_COLUMNS, prediction_column='predicción', translator=None):
+        self.columns = list(columns)
+        self.prediction_column = prediction_column
+        self.translator = translator or LabelTranslator(self.columns)
+        self._feature_index = {feature: j for j, feature in enumerate(self.translator.features)}
+        self._counts = {}
+
+    def add(self, chunk):
+        import pandas as pd
+        classes, class_codes = np.unique(chunk[self.prediction_column].astype(str).to_numpy(),
+                                         return_inverse=True)
+        for column in self.columns:
+            values = chunk[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                value_codes, uniques = values.cat.codes.to_numpy(), values.cat.categories.tolist()
+            else:
+                value_codes, uniques = pd.factorize(values)
+                uniques = list(uniques)
+            table, _ = self.translator.translate_values(self._feature_index[column], uniques)
+            codes = np.append(table, np.uint8(0))[value_codes]
+            for k, label in enumerate(classes):
+                counts = self._counts.setdefault((column, label), np.zeros(256, dtype=np.int64))
+                counts += np.bincount(codes[class_codes == k], minlength=256)
+
+    def to_frame(self, column):
+        # Una fila por valor de la columna que aparece en los resultados, con el número
+        # de setas de cada clase, el total y el porcentaje de venenosas
+        import pandas as pd
+        classes = sorted(label for c, label in self._counts if c == column)
+        names = [CLASS_NAMES.get(label, label) for label in classes]
+        values = [(label, ord(code)) for label, code in FEATURE_MAPS[column].items()] + [('Desconocido', 0)]
+        rows = []
+        for label, code in values:
+            counts = [int(self._counts[(column, c)][code]) for c in classes]
+            if sum(counts):
+                rows.append([label] + counts)
+        frame = pd.DataFrame(rows, columns=[column] + names).set_index(column)
+        frame['Total'] = frame[names].sum(axis=1)
+        poisonous = CLASS_NAMES.get(POISONOUS_LABEL)
+        if poisonous in frame:
+            frame['% venenosas'] = (100 * frame[poisonous] / frame['Total']).round(1)
+        return frame.sort_values('Total', ascending=False)
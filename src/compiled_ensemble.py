@@ -0,0 +1,311 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from compiled_tree import _max_depth
+
+
+# Elementos (árboles x filas) que se evalúan de una vez: cada paso trabaja con unos
+# pocos MB y cabe en caché, da igual el tamaño del lote.
+BLOCK_SIZE = 1 << 16
+
+# Por debajo de este número de elementos no compensa repartir los árboles entre hilos
+MIN_PARALLEL_SIZE = 1 << 15
+
+
+# Conjunto de árboles (BaggingClassifier, AdaBoostClassifier o un solo árbol)
+# "compilado" en una única tabla de nodos, con un array por campo como CompiledTree:
+# feature, code, children y value cubren los nodos de todos los árboles seguidos y
+# 'roots' dice dónde empieza cada uno. Se evalúan todos los árboles sobre todo el lote
+# a la vez: cada iteración baja un nivel en una matriz (árboles x filas) de índices de
+# nodo, así que el coste en Python es por nivel, no por árbol ni por fila.
+#
+# value[hoja] es lo que aporta esa hoja a la suma del conjunto:
+#   'media' (Bagging, árbol)   probabilidades del árbol por clase del conjunto; la
+#                              suma se divide por el número de árboles
+#   'samme' (AdaBoost)         peso del árbol en la clase que predice y -peso/(K-1)
+#                              en las demás; la suma se divide por la suma de pesos
+#                              y da decision_function
+# Las sumas se hacen árbol a árbol y en el mismo orden que sklearn, así que con
+# n_jobs=1 predict_proba coincide bit a bit. Con n_jobs > 1 los árboles se reparten
+# en bloques contiguos entre hilos (NumPy suelta el GIL en la indexación y las
+# comparaciones) y las sumas parciales se juntan al final, como hace sklearn con
+# n_jobs: el resultado puede variar en el último bit.
+#
+# Las características desconocidas (código 0) no coinciden con ninguna letra, igual
+# que una fila sin ninguna columna OHE activa.
+class CompiledEnsemble:
+    def __init__(self, feature, code, children, value, roots, classes, features, combine, scale, n_jobs=1):
+        if combine not in ('media', 'samme'):
+            raise ValueError(f"combine debe ser 'media' o 'samme', no {combine!r}")
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.code = np.asarray(code, dtype=np.uint8)
+        self.children = np.asarray(children, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.classes = np.asarray(classes)
+        self.features = list(features)
+        self.combine = combine
+        self.scale = float(scale)
+        self.n_jobs = n_jobs
+        self.is_leaf = self.children[:, 0] == np.arange(len(self.feature))
+        self.max_depth = _max_depth_per_tree(self.children, self.is_leaf, self.roots)
+        self._build_layout()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model, encoder, n_jobs=1):
+        # encoder es el FeatureEncoder con las columnas OHE con las que se entrenó el modelo
+        from compiled_tree import CompiledTree
+
+        n_classes = len(model.classes_)
+        if hasattr(model, 'tree_'):
+            trees, columns, weights = [model], [None], [1.0]
+            combine, scale, encoded_classes = 'media', 1.0, False
+        elif hasattr(model, 'estimators_features_'):
+            # Bagging: cada árbol ve un subconjunto de columnas (estimators_features_)
+            trees, columns = model.estimators_, model.estimators_features_
+            weights = [1.0] * len(trees)
+            combine, scale, encoded_classes = 'media', len(trees), True
+        elif hasattr(model, 'estimator_weights_'):
+            trees = model.estimators_
+            columns = [None] * len(trees)
+            weights = model.estimator_weights_[:len(trees)]
+            combine, scale, encoded_classes = 'samme', model.estimator_weights_.sum(), False
+        else:
+            raise ValueError(f"Modelo no soportado: {type(model).__name__}")
+
+        feature, code, children, value, roots = [], [], [], [], []
+        offset = 0
+        for tree, tree_columns, weight in zip(trees, columns, weights):
+            if tree_columns is not None:
+                tree = _with_columns(tree, tree_columns)
+            compiled = CompiledTree.from_sklearn(tree, encoder)
+            # Clases del árbol -> columnas del conjunto. Bagging entrena sus árboles con
+            # las clases ya codificadas (0..K-1); AdaBoost con las etiquetas originales.
+            if encoded_classes:
+                class_index = np.asarray(tree.classes_, dtype=np.intp)
+            else:
+                class_index = np.searchsorted(model.classes_, tree.classes_)
+            tree_value = np.zeros((len(compiled.feature), n_classes))
+            if combine == 'media':
+                tree_value[:, class_index] = compiled.value
+            else:
+                # Lo mismo que AdaBoostClassifier.decision_function: w en la clase
+                # predicha por el árbol y -w/(K-1) en el resto
+                tree_value[:] = -1 / (n_classes - 1) * weight
+                tree_value[np.arange(len(tree_value)), class_index[compiled.leaf_class]] = weight
+
+            feature.append(compiled.feature)
+            code.append(compiled.code)
+            children.append(compiled.children + offset)
+            value.append(tree_value)
+            roots.append(offset)
+            offset += len(compiled.feature)
+
+        return cls(np.concatenate(feature), np.concatenate(code), np.concatenate(children),
+                   np.concatenate(value), roots, model.classes_, encoder.features, combine, scale, n_jobs)
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, code=self.code, children=self.children, value=self.value,
+                 roots=self.roots, classes=self.classes, features=np.array(self.features),
+                 combine=np.array(self.combine), scale=np.array(self.scale))
+
+    @classmethod
+    def load(cls, path, n_jobs=1):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['feature'], data['code'], data['children'], data['value'], data['roots'],
+                       data['classes'], data['features'].tolist(), str(data['combine']),
+                       float(data['scale']), n_jobs)
+
+    def apply_codes(self, codes):
+        # Hoja a la que llega cada fila en cada árbol: matriz (árboles x filas)
+        return self._order[self._apply(np.asarray(codes, dtype=np.uint8), 0, self.n_trees)]
+
+    def decision_codes(self, codes):
+        # Suma de las aportaciones de todos los árboles, ya dividida (ver la cabecera)
+        codes = np.asarray(codes, dtype=np.uint8)
+        total = np.zeros((codes.shape[0], self.value.shape[1]))
+        rows_per_block = max(1, BLOCK_SIZE // self.n_trees)
+        for start in range(0, len(codes), rows_per_block):
+            block = codes[start:start + rows_per_block]
+            total[start:start + len(block)] = self._sum_trees(block)
+        return total / self.scale
+
+    def predict_proba_codes(self, codes):
+        decision = self.decision_codes(codes)
+        if self.combine == 'media':
+            return decision
+        # AdaBoostClassifier._compute_proba_from_decision
+        n_classes = decision.shape[1]
+        if n_classes == 2:
+            margin = decision[:, 1] - decision[:, 0]
+            decision = np.stack([-margin, margin], axis=1) / 2
+        else:
+            decision = decision / (n_classes - 1)
+        decision = np.exp(decision - decision.max(axis=1, keepdims=True))
+        return decision / decision.sum(axis=1, keepdims=True)
+
+    def predict_codes(self, codes):
+        decision = self.decision_codes(codes)
+        if self.combine == 'samme' and decision.shape[1] == 2:
+            # Como AdaBoostClassifier.predict: clase 1 solo si el margen es > 0
+            return self.classes[(decision[:, 1] - decision[:, 0] > 0).view(np.uint8)]
+        return self.classes[decision.argmax(axis=1)]
+
+    def predict_record(self, record):
+        # Una sola seta como diccionario {característica: letra} o secuencia de letras
+        if isinstance(record, dict):
+            record = [record.get(f) for f in self.features]
+        codes = np.array([[ord(letter) if letter else 0 for letter in record]], dtype=np.uint8)
+        return self.predict_codes(codes)
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _sum_trees(self, codes):
+        n_jobs = min(self.n_jobs or 1, self.n_trees)
+        if n_jobs <= 1 or codes.shape[0] * self.n_trees < MIN_PARALLEL_SIZE:
+            return self._sum_shard(codes, 0, self.n_trees)
+        bounds = np.linspace(0, self.n_trees, n_jobs + 1).astype(int)
+        executor = self._get_executor(n_jobs)
+        partial = [executor.submit(self._sum_shard, codes, start, stop)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        total = partial[0].result()
+        for future in partial[1:]:
+            total += future.result()
+        return total
+
+    def _sum_shard(self, codes, start, stop):
+        # Suma árbol a árbol, en orden, de las aportaciones de los árboles start..stop-1
+        # (sum sobre el primer eje acumula fila a fila, como el bucle de sklearn)
+        return self._value[self._apply(codes, start, stop)].sum(axis=0)
+
+    def _build_layout(self):
+        # Tabla de evaluación derivada de la anterior:
+        # - los nodos de cada árbol se renumeran por niveles, así los dos hijos de un
+        #   nodo quedan seguidos y el siguiente nodo es first_child + ir_a_la_derecha
+        #   (las hojas apuntan a sí mismas y nunca van a la derecha);
+        # - cada división "característica == letra" se resume en una columna ('slot') de
+        #   una tabla por fila con un 1 en las letras que tiene la fila (ver _match_table).
+        #   Así cada nivel hace tres lecturas en vez de comparar códigos.
+        n_features = len(self.features)
+        split = ~self.is_leaf
+        self._letter_rank = np.zeros((n_features, 256), dtype=np.intp)
+        for j in range(n_features):
+            letters = np.unique(self.code[split & (self.feature == j)])
+            self._letter_rank[j, letters] = np.arange(1, len(letters) + 1)
+        # El rango 0 (letra que no aparece en ninguna división, o desconocida) nunca
+        # coincide: su columna de la tabla se queda a 0
+        self._n_ranks = int(self._letter_rank.max()) + 1
+        self._n_slots = n_features * self._n_ranks
+
+        order = np.concatenate([_level_order(self.children, self.is_leaf, root) for root in self.roots.tolist()]) \
+            if len(self.roots) else np.zeros(0, dtype=np.intp)
+        new_index = np.empty(len(order), dtype=np.intp)
+        new_index[order] = np.arange(len(order))
+        leaf = self.is_leaf[order]
+        self._order = order
+        self._first_child = np.where(leaf, np.arange(len(order)), new_index[self.children[order, 0]])
+        self._slot = np.where(leaf, 0, self.feature[order] * self._n_ranks
+                              + self._letter_rank[self.feature[order], self.code[order]])
+        self._value = self.value[order]
+        self._roots = new_index[self.roots]
+
+    def _match_table(self, codes):
+        # (filas x slots) con un 1 en la columna de la letra de cada característica
+        n_rows, n_features = codes.shape
+        ranks = self._letter_rank[np.arange(n_features), codes]
+        table = np.zeros((n_rows, self._n_slots), dtype=np.uint8)
+        table[np.arange(n_rows)[:, None], np.arange(n_features) * self._n_ranks + ranks] = 1
+        table[:, ::self._n_ranks] = 0
+        return table.reshape(-1)
+
+    def _apply(self, codes, start, stop):
+        # Hojas (con la numeración de _build_layout) de los árboles start..stop-1,
+        # matriz (árboles x filas)
+        n_rows = codes.shape[0]
+        table = self._match_table(codes)
+        node = np.repeat(self._roots[start:stop], n_rows)
+        row_offsets = np.tile(np.arange(0, n_rows * self._n_slots, self._n_slots, dtype=np.intp), stop - start)
+        slot = np.empty_like(node)
+        go_right = np.empty(len(node), dtype=np.uint8)
+        for _ in range(int(self.max_depth[start:stop].max(initial=0))):
+            np.take(self._slot, node, out=slot)
+            slot += row_offsets
+            np.take(table, slot, out=go_right)
+            np.take(self._first_child, node, out=node)
+            node += go_right
+        return node.reshape(stop - start, n_rows)
+
+    def _get_executor(self, n_jobs):
+        with self._executor_lock:
+            if self._executor is None or self._executor._max_workers != n_jobs:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix='ensemble')
+            return self._executor
+
+
+def _with_columns(tree, columns):
+    # Copia del árbol de Bagging con tree_.feature traducido a las columnas del
+    # conjunto completo (el árbol se entrenó con X[:, columns])
+    import copy
+    tree = copy.copy(tree)
+    tree.tree_ = _RemappedTree(tree.tree_, np.asarray(columns))
+    return tree
+
+
+class _RemappedTree:
+    # Vista de un sklearn Tree con 'feature' cambiado; lo que lee CompiledTree.from_sklearn
+    def __init__(self, tree, columns):
+        self.node_count = tree.node_count
+        self.children_left = tree.children_left
+        self.children_right = tree.children_right
+        self.threshold = tree.threshold
+        self.value = tree.value
+        self.feature = np.where(tree.children_left == -1, tree.feature, columns[tree.feature])
+
+
+def _level_order(children, is_leaf, root):
+    # Nodos del árbol que empieza en 'root', por niveles y con los hijos de cada nodo seguidos
+    order, level = [], [root]
+    while level:
+        order.extend(level)
+        level = [child for node in level if not is_leaf[node] for child in children[node].tolist()]
+    return np.array(order, dtype=np.intp)
+
+
+def _max_depth_per_tree(children, is_leaf, roots):
+    # Profundidad máxima de cada árbol de la tabla (los nodos de un árbol van seguidos)
+    ends = np.append(roots[1:], len(children))
+    return np.array([_max_depth(children[start:end] - start, is_leaf[start:end])
+                     for start, end in zip(roots, ends)], dtype=np.intp)
+
+
+if __name__ == '__main__':
+    # Compila un Bagging o AdaBoost guardado con joblib a un .npz que solo necesita NumPy:
+    #   python src/compiled_ensemble.py models/bagging.pkl models/bagging_compiled.npz
+    import os
+    import sys
+    import joblib
+    from feature_encoder import FeatureEncoder
+
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python src/compiled_ensemble.py modelo.pkl [salida.npz]")
+    models_folder = os.path.join(os.path.dirname(__file__), '..', 'models')
+    model_path = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(model_path)[0] + '_compiled.npz'
+    encoder = FeatureEncoder.from_file(os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl'))
+    ensemble = CompiledEnsemble.from_sklearn(joblib.load(model_path), encoder)
+    ensemble.save(output)
+    print(f"Conjunto de {ensemble.n_trees} árboles compilado guardado en {output}")
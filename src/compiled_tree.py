@@ -0,0 +1,247 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# Resultado de predecir con características desconocidas (una entrada por fila):
+#   worst_case          clase venenosa si alguna forma de completar las desconocidas
+#                       lleva a ella; si no, la clase (única) a la que llevan todas
+#   poisonous_fraction  fracción de las combinaciones posibles que dan venenosa
+#   determined          True si todas las combinaciones dan la misma clase
+#   proba               probabilidad de cada clase promediada sobre las combinaciones
+PartialPrediction = namedtuple('PartialPrediction', ['worst_case', 'poisonous_fraction', 'determined', 'proba'])
+
+
+# Árbol de decisión "compilado": los arrays del árbol de sklearn aplanados en NumPy.
+# Como todas las entradas son One-Hot, cada división "columna_OHE <= 0.5" equivale a
+# "código de la característica == letra", así que el árbol se evalúa directamente sobre
+# los códigos de una letra (ver FeatureEncoder.to_codes) sin codificar nada.
+#
+# Las hojas apuntan a sí mismas en ambos hijos; así todas las filas pueden avanzar
+# max_depth niveles a la vez sin comprobar si ya llegaron a una hoja.
+class CompiledTree:
+    def __init__(self, feature, code, children, value, classes, features):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.code = np.asarray(code, dtype=np.uint8)
+        self.children = np.asarray(children, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.features = list(features)
+        self.leaf_class = self.value.argmax(axis=1)
+        self.is_leaf = self.children[:, 0] == np.arange(len(self.feature))
+        self.max_depth = _max_depth(self.children, self.is_leaf)
+
+        # Copias en listas de Python para el camino de una sola fila, donde el coste
+        # fijo de cada operación de NumPy pesa más que el propio recorrido.
+        self._feature_list = self.feature.tolist()
+        self._char_list = [chr(c) for c in self.code.tolist()]
+        self._left_list = self.children[:, 0].tolist()
+        self._right_list = self.children[:, 1].tolist()
+        self._leaf_list = self.is_leaf.tolist()
+        self._leaf_class_list = self.leaf_class.tolist()
+
+    @classmethod
+    def from_sklearn(cls, model, encoder):
+        # encoder es el FeatureEncoder con las columnas OHE con las que se entrenó el modelo
+        tree = model.tree_
+        n_nodes = tree.node_count
+        column_to_feature = {}
+        for j, feature in enumerate(encoder.features):
+            for code, position in encoder._lookup[j].items():
+                column_to_feature[position] = (j, ord(code))
+
+        feature = np.zeros(n_nodes, dtype=np.intp)
+        code = np.zeros(n_nodes, dtype=np.uint8)
+        children = np.repeat(np.arange(n_nodes, dtype=np.intp)[:, None], 2, axis=1)
+        for node in range(n_nodes):
+            if tree.children_left[node] == -1:
+                continue
+            threshold = tree.threshold[node]
+            if not 0.0 <= threshold < 1.0:
+                raise ValueError(f"El nodo {node} no divide una columna One-Hot (umbral {threshold})")
+            feature[node], code[node] = column_to_feature[tree.feature[node]]
+            # sklearn va a la izquierda si x <= umbral, es decir, si la columna OHE es 0
+            children[node, 0] = tree.children_left[node]
+            children[node, 1] = tree.children_right[node]
+
+        value = tree.value[:, 0, :]
+        value = value / value.sum(axis=1, keepdims=True)
+        return cls(feature, code, children, value, model.classes_, encoder.features)
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, code=self.code, children=self.children,
+                 value=self.value, classes=self.classes, features=np.array(self.features))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['feature'], data['code'], data['children'], data['value'],
+                       data['classes'], data['features'].tolist())
+
+    def apply_codes(self, codes):
+        # Índice de la hoja de cada fila. Todas las filas bajan un nivel por iteración.
+        codes = np.asarray(codes, dtype=np.uint8)
+        n_rows = codes.shape[0]
+        node = np.zeros(n_rows, dtype=np.intp)
+        flat_codes = codes.reshape(-1)
+        row_offsets = np.arange(0, n_rows * codes.shape[1], codes.shape[1], dtype=np.intp)
+        for _ in range(self.max_depth):
+            go_right = flat_codes[row_offsets + self.feature[node]] == self.code[node]
+            node = self.children[node, go_right.view(np.uint8)]
+        return node
+
+    def predict_codes(self, codes):
+        if len(codes) == 1:
+            return self.classes[[self._leaf_class_list[self._apply_row(codes[0])]]]
+        return self.classes[self.leaf_class[self.apply_codes(codes)]]
+
+    def predict_proba_codes(self, codes):
+        return self.value[self.apply_codes(codes)]
+
+    def predict_record(self, record):
+        # Una sola seta como diccionario {característica: código} o tupla de códigos
+        if isinstance(record, dict):
+            record = [record.get(f) for f in self.features]
+        return self.classes[[self._leaf_class_list[self._apply_row(record)]]]
+
+    def predict_partial_codes(self, codes, alphabets, poisonous_class):
+        # Predicción con características desconocidas (código 0) sin enumerar sus
+        # combinaciones. Cada desconocida toma cualquier letra de su alfabeto con la misma
+        # probabilidad; en una división sobre ella la fila sigue las dos ramas, a la
+        # derecha con probabilidad 1/|letras aún posibles| (ver _unknown_right_probability).
+        # Se recorre el árbol una vez, en orden de nodos (los padres van antes que los
+        # hijos), repartiendo la masa de todas las filas a la vez: coste lineal en el
+        # tamaño del árbol, no en el número de combinaciones.
+        codes = np.asarray(codes, dtype=np.uint8)
+        p_unknown = self._unknown_right_probability(alphabets)
+        mass = np.zeros((codes.shape[0], len(self.feature)))
+        mass[:, 0] = 1.0
+        for node in np.flatnonzero(~self.is_leaf):
+            column = codes[:, self.feature[node]]
+            p_right = np.where(column == 0, p_unknown[node], column == self.code[node])
+            left, right = self.children[node]
+            mass[:, right] += mass[:, node] * p_right
+            mass[:, left] += mass[:, node] * (1.0 - p_right)
+
+        leaves = np.flatnonzero(self.is_leaf)
+        leaf_mass = mass[:, leaves]
+        class_mass = leaf_mass @ (self.leaf_class[leaves, None] == np.arange(len(self.classes)))
+        poisonous = int(np.flatnonzero(self.classes == poisonous_class)[0])
+        # Una clase es alcanzable si le llega masa > 0; las masas son productos de
+        # probabilidades exactas, así que las ramas imposibles dan 0 exacto.
+        reachable = class_mass > 0
+        worst_case = np.where(reachable[:, poisonous], poisonous, class_mass.argmax(axis=1))
+        return PartialPrediction(
+            worst_case=self.classes[worst_case],
+            poisonous_fraction=np.clip(class_mass[:, poisonous], 0.0, 1.0),
+            determined=reachable.sum(axis=1) == 1,
+            proba=leaf_mass @ self.value[leaves],
+        )
+
+    def predict_partial_record(self, record, alphabets, poisonous_class):
+        # Una sola seta como diccionario {característica: letra o None}. Mismo recorrido
+        # que predict_partial_codes pero en Python y solo por las ramas con masa > 0.
+        row = [record.get(f) or None for f in self.features]
+        p_unknown = self._unknown_right_probability(alphabets).tolist()
+        leaves, weights = [], []
+        stack = [(0, 1.0)]
+        while stack:
+            node, weight = stack.pop()
+            if self._leaf_list[node]:
+                leaves.append(node)
+                weights.append(weight)
+                continue
+            letter = row[self._feature_list[node]]
+            if letter is None:
+                p_right = p_unknown[node]
+                if p_right > 0.0:
+                    stack.append((self._right_list[node], weight * p_right))
+                if p_right < 1.0:
+                    stack.append((self._left_list[node], weight * (1.0 - p_right)))
+            elif letter == self._char_list[node]:
+                stack.append((self._right_list[node], weight))
+            else:
+                stack.append((self._left_list[node], weight))
+
+        weights = np.array(weights)
+        class_mass = np.bincount(self.leaf_class[leaves], weights=weights, minlength=len(self.classes))
+        poisonous = int(np.flatnonzero(self.classes == poisonous_class)[0])
+        reachable = class_mass > 0
+        worst_case = poisonous if reachable[poisonous] else int(class_mass.argmax())
+        return PartialPrediction(
+            worst_case=self.classes[worst_case],
+            poisonous_fraction=min(max(float(class_mass[poisonous]), 0.0), 1.0),
+            determined=bool(reachable.sum() == 1),
+            proba=weights @ self.value[leaves],
+        )
+
+    def _unknown_right_probability(self, alphabets):
+        # Para cada nodo, probabilidad de ir a la derecha ("código == letra") si la
+        # característica es desconocida. Depende de lo que el camino desde la raíz ya
+        # dijo de esa característica: si ya se fijó una letra, es 0 o 1; si se
+        # descartaron letras, es 1 / (letras del alfabeto que siguen siendo posibles).
+        # No depende de la fila, así que se calcula una vez por alfabeto.
+        key = tuple(alphabets[f] for f in self.features)
+        cached = getattr(self, '_unknown_cache', None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        p_right = np.zeros(len(self.feature))
+        stack = [(0, {})]
+        while stack:
+            node, constraints = stack.pop()
+            if self.is_leaf[node]:
+                continue
+            j, letter = self._feature_list[node], self._char_list[node]
+            state = constraints.get(j, frozenset())
+            left, right = self._left_list[node], self._right_list[node]
+            if isinstance(state, str):
+                # Ya se sabe la letra por una división anterior del mismo camino
+                p_right[node] = float(state == letter)
+                stack.append((left, constraints))
+                stack.append((right, constraints))
+                continue
+            possible = set(key[j]) - state
+            p_right[node] = 1.0 / len(possible) if letter in possible else 0.0
+            stack.append((left, {**constraints, j: state | {letter}}))
+            stack.append((right, {**constraints, j: letter}))
+
+        self._unknown_cache = (key, p_right)
+        return p_right
+
+    def _apply_row(self, row):
+        # row puede ser una fila de códigos uint8 o una secuencia de letras
+        if isinstance(row, np.ndarray):
+            row = [chr(c) for c in row.tolist()]
+        node = 0
+        while not self._leaf_list[node]:
+            if row[self._feature_list[node]] == self._char_list[node]:
+                node = self._right_list[node]
+            else:
+                node = self._left_list[node]
+        return node
+
+
+def _max_depth(children, is_leaf):
+    depth = np.zeros(len(children), dtype=np.intp)
+    # En sklearn los hijos siempre tienen un índice mayor que su padre
+    for node in range(len(children)):
+        if not is_leaf[node]:
+            depth[children[node]] = depth[node] + 1
+    return int(depth.max()) if len(depth) else 0
+
+
+if __name__ == '__main__':
+    # Exporta el árbol de la app a un .npz que solo necesita NumPy para cargarse:
+    #   python src/compiled_tree.py models/best_decision_tree_compiled.npz
+    import os
+    import sys
+    import joblib
+    from feature_encoder import FeatureEncoder
+
+    models_folder = os.path.join(os.path.dirname(__file__), '..', 'models')
+    output = sys.argv[1] if len(sys.argv) > 1 else os.path.join(models_folder, 'best_decision_tree_compiled.npz')
+    model = joblib.load(os.path.join(models_folder, 'best_decision_tree_model_streamlit.pkl'))
+    encoder = FeatureEncoder.from_file(os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl'))
+    CompiledTree.from_sklearn(model, encoder).save(output)
+    print(f"Árbol compilado guardado en {output}")
@@ -1,53 +1,427 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import classification_report, confusion_matrix
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.model_selection import GridSearchCV
+
+# sklearn, joblib, matplotlib y seaborn se importan dentro de las funciones de
+# entrenamiento, evaluación y gráficos que los usan: importar este módulo no los carga.
+
+
+SEARCH_MODES = ('grid', 'random', 'halving')
 
 
 def optimize_model_with_gridsearch(model_base, param_grid, X_train, y_train, model_name="Modelo", cv=5, 
-scoring='f1_macro', n_jobs=-1, verbose=1):
-    # Configurar y Ejecutar GridSearchCV
-    grid_search = GridSearchCV(model_base, param_grid, cv=cv, scoring=scoring, n_jobs=n_jobs, verbose=verbose)
+scoring='f1_macro', n_jobs=-1, verbose=1, search='grid', n_iter=20, factor=3, cache_dir=None,
+random_state=42, return_report=False):
+    # search='grid' prueba todas las combinaciones (como GridSearchCV), 'random' prueba
+    # n_iter combinaciones al azar y 'halving' hace successive halving: todas las
+    # combinaciones empiezan con una parte pequeña de los datos y en cada ronda solo
+    # pasa 1/factor de las mejores, con factor veces más muestras.
+    #
+    # Con cache_dir, el resultado de cada fold se guarda en disco con una clave que
+    # depende del estimador y sus parámetros, de los índices del fold, del scoring y
+    # de una huella de los datos, así que al volver a ejecutar el notebook solo se
+    # entrenan las combinaciones nuevas. El mejor modelo reentrenado también se guarda.
+    from sklearn.base import clone, is_classifier
+    from sklearn.metrics import check_scoring
+    from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+
+    if search not in SEARCH_MODES:
+        raise ValueError(f"search debe ser uno de {SEARCH_MODES}, no {search!r}")
+    start = time.perf_counter()
+
+    if search == 'random':
+        candidates = list(ParameterSampler(param_grid, n_iter=n_iter, random_state=random_state))
+    else:
+        candidates = list(ParameterGrid(param_grid))
+    cv = check_cv(cv, y_train, classifier=is_classifier(model_base))
+    scorer = check_scoring(model_base, scoring=scoring)
+    cache = _SearchCache(cache_dir, model_base, scoring, X_train, y_train)
+
+    if search == 'halving':
+        rounds = _halving_rounds(len(candidates), len(y_train), cv.get_n_splits(), factor, random_state)
+    else:
+        rounds = [None]
+
+    rows = []
+    alive = list(range(len(candidates)))
+    for round_index, subset in enumerate(rounds):
+        if round_index > 0:
+            # Solo pasan a la siguiente ronda las mejores combinaciones de la anterior
+            n_keep = max(1, int(np.ceil(len(alive) / factor)))
+            alive = [alive[i] for i in np.argsort(-mean_scores, kind='stable')[:n_keep]]
+        rows_round = _evaluate_candidates(model_base, candidates, alive, X_train, y_train, cv, subset,
+                                          scorer, cache, n_jobs, verbose)
+        for row in rows_round:
+            row['ronda'] = round_index
+        rows.extend(rows_round)
+        mean_scores = np.array([np.mean([r['puntuacion'] for r in rows_round if r['candidato'] == i])
+                                for i in alive])
+
+    # Igual que GridSearchCV: en caso de empate gana la primera combinación
+    best_index = alive[int(np.argmax(mean_scores))]
+    best_params = candidates[best_index]
+    best_model, refit_cached = cache.refit(clone(model_base).set_params(**best_params), X_train, y_train)
 
-    # Entrenar el modelo con los datos de entrenamiento
-    grid_search.fit(X_train, y_train)
+    report = pd.DataFrame(rows, columns=['candidato', 'parametros', 'ronda', 'muestras', 'fold', 'puntuacion',
+                                         'tiempo_fit', 'tiempo_score', 'en_cache'])
+    if verbose:
+        n_cached = int(report['en_cache'].sum())
+        print(f"{model_name}: {len(candidates)} combinaciones, {len(report)} ajustes de validación cruzada "
+              f"({n_cached} en caché, {len(report) - n_cached} nuevos{', modelo final en caché' if refit_cached else ''}) "
+              f"en {time.perf_counter() - start:.1f} s")
 
     # Mostrar los mejores hiperparámetros encontrados
-    best_params = grid_search.best_params_
     print(f"\nMejores hiperparámetros encontrados para {model_name}: {best_params}")
 
-    # Accedemos al modelo mejor entrenado (el mejor estimador de Grid Search)
-    best_model = grid_search.best_estimator_
-
+    if return_report:
+        return best_model, best_params, report
     return best_model, best_params
 
-def evaluate_and_report_model(model, X_train, y_train, X_test, y_test, label_encoder, model_name="Modelo"):
+
+def fold_timing_summary(report):
+    # Resumen por combinación del reporte de optimize_model_with_gridsearch(return_report=True):
+    # puntuación media y tiempo de entrenamiento, de la última ronda en la que participó
+    last_round = report.groupby('candidato')['ronda'].transform('max')
+    report = report[report['ronda'] == last_round]
+    summary = report.groupby(['candidato', 'parametros']).agg(
+        ronda=('ronda', 'first'), muestras=('muestras', 'first'),
+        puntuacion_media=('puntuacion', 'mean'), puntuacion_std=('puntuacion', 'std'),
+        tiempo_fit_medio=('tiempo_fit', 'mean'), tiempo_fit_total=('tiempo_fit', 'sum'),
+        en_cache=('en_cache', 'all'))
+    return summary.sort_values(['ronda', 'puntuacion_media'], ascending=False).reset_index()
+
+
+def _evaluate_candidates(model_base, candidates, alive, X, y, cv, subset, scorer, cache, n_jobs, verbose):
+    # Evalúa por validación cruzada las combinaciones 'alive'. subset (o None para todos)
+    # son los índices de las muestras de esta ronda; los folds se guardan siempre con
+    # índices del conjunto completo para que la clave de la caché no dependa de la ronda.
+    from joblib import Parallel, delayed
+    from sklearn.base import clone
+
+    if subset is None:
+        splits = list(cv.split(X, y))
+    else:
+        splits = [(subset[train], subset[test]) for train, test in cv.split(_take(X, subset), _take(y, subset))]
+    n_samples = len(y) if subset is None else len(subset)
+
+    rows, tasks = [], []
+    for i in alive:
+        estimator = clone(model_base).set_params(**candidates[i])
+        for fold, (train, test) in enumerate(splits):
+            row = {'candidato': i, 'parametros': str(candidates[i]), 'muestras': n_samples, 'fold': fold}
+            key = cache.fold_key(estimator, train, test)
+            cached = cache.get(key)
+            if cached is not None:
+                row.update(cached, en_cache=True)
+            else:
+                row['en_cache'] = False
+                tasks.append((row, key, estimator, train, test))
+            rows.append(row)
+
+    if tasks and _shares_fit_across_ks(model_base, candidates):
+        # Un solo ajuste por fold para todos los k pendientes (ver _fit_and_score_ks)
+        by_fold = {}
+        for task in tasks:
+            by_fold.setdefault(task[0]['fold'], []).append(task)
+        groups = list(by_fold.values())
+        results = Parallel(n_jobs=n_jobs, verbose=max(0, verbose - 1), return_as='generator')(
+            delayed(_fit_and_score_ks)(clone(model_base), X, y, group[0][3], group[0][4],
+                                       [task[2].n_neighbors for task in group], scorer)
+            for group in groups)
+        for group, group_results in zip(groups, results):
+            for (row, key, _, _, _), result in zip(group, group_results):
+                row.update(result)
+                cache.put(key, result)
+    elif tasks:
+        results = Parallel(n_jobs=n_jobs, verbose=max(0, verbose - 1), return_as='generator')(
+            delayed(_fit_and_score)(clone(estimator), X, y, train, test, scorer)
+            for _, _, estimator, train, test in tasks)
+        # Guardamos cada resultado según llega: si se interrumpe la búsqueda, lo ya
+        # calculado no se pierde
+        for (row, key, _, _, _), result in zip(tasks, results):
+            row.update(result)
+            cache.put(key, result)
+    return rows
+
+
+def _shares_fit_across_ks(model_base, candidates):
+    # Estimadores que puntúan varios n_neighbors con un solo ajuste (HammingKNNClassifier),
+    # cuando la cuadrícula no cambia ningún otro parámetro
+    return hasattr(model_base, 'scores_for_ks') and all(set(c) <= {'n_neighbors'} for c in candidates)
+
+
+def _fit_and_score(estimator, X, y, train, test, scorer):
+    start = time.perf_counter()
+    estimator.fit(_take(X, train), _take(y, train))
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    score = scorer(estimator, _take(X, test), _take(y, test))
+    return {'puntuacion': float(score), 'tiempo_fit': fit_time, 'tiempo_score': time.perf_counter() - start}
+
+
+def _fit_and_score_ks(estimator, X, y, train, test, ks, scorer):
+    # Como _fit_and_score para cada k de 'ks' con un solo ajuste y una sola búsqueda
+    # de vecinos. El tiempo de ajuste se reparte a partes iguales entre los k.
+    start = time.perf_counter()
+    estimator.fit(_take(X, train), _take(y, train))
+    fit_time = (time.perf_counter() - start) / len(ks)
+    start = time.perf_counter()
+    scores = estimator.scores_for_ks(_take(X, test), _take(y, test), ks, scorer)
+    score_time = (time.perf_counter() - start) / len(ks)
+    return [{'puntuacion': float(scores[k]), 'tiempo_fit': fit_time, 'tiempo_score': score_time} for k in ks]
+
+
+def _halving_rounds(n_candidates, n_samples, n_splits, factor, random_state):
+    # Muestras de cada ronda: la última usa todos los datos y cada ronda anterior
+    # factor veces menos (con un mínimo para que cada fold tenga ejemplos de sobra).
+    # Las submuestras están anidadas: son prefijos de la misma permutación.
+    n_rounds = 1 + int(np.floor(np.log(max(n_candidates, 1)) / np.log(factor)))
+    min_samples = min(n_samples, n_splits * 20)
+    sizes = [max(min_samples, n_samples // factor ** (n_rounds - 1 - r)) for r in range(n_rounds)]
+    permutation = np.random.RandomState(random_state).permutation(n_samples)
+    return [np.sort(permutation[:size]) if size < n_samples else None for size in sizes]
+
+
+def _take(data, indices):
+    return data.iloc[indices] if hasattr(data, 'iloc') else np.asarray(data)[indices]
+
+
+class _SearchCache:
+    # Caché en disco de la búsqueda. Un archivo JSON por (estimador, parámetros, fold)
+    # con la puntuación y los tiempos, y un .joblib por modelo final reentrenado.
+    def __init__(self, folder, model_base, scoring, X, y):
+        self.folder = folder
+        if folder is None:
+            return
+        os.makedirs(folder, exist_ok=True)
+        self.scoring = scoring if isinstance(scoring, str) or scoring is None else repr(scoring)
+        self.data = _data_fingerprint(X, y)
+
+    def fold_key(self, estimator, train, test):
+        if self.folder is None:
+            return None
+        return _hash([_estimator_key(estimator), self.scoring, self.data, _hash_indices(train), _hash_indices(test)])
+
+    def get(self, key):
+        if key is None:
+            return None
+        try:
+            with open(os.path.join(self.folder, key + '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        if key is None:
+            return
+        path = os.path.join(self.folder, key + '.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(path + '.tmp', path)
+
+    def refit(self, estimator, X, y):
+        # Devuelve (modelo entrenado con todos los datos, si venía de la caché)
+        import joblib
+        if self.folder is None:
+            return estimator.fit(X, y), False
+        path = os.path.join(self.folder, _hash([_estimator_key(estimator), self.data]) + '.joblib')
+        if os.path.exists(path):
+            try:
+                return joblib.load(path), True
+            except Exception:
+                pass
+        estimator.fit(X, y)
+        joblib.dump(estimator, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return estimator, False
+
+
+def _estimator_key(estimator):
+    params = {name: _plain(value) for name, value in sorted(estimator.get_params(deep=True).items())}
+    return [type(estimator).__module__, type(estimator).__qualname__, params]
+
+
+def _plain(value):
+    # np.arange(1, 31) da np.int64: se guardan igual que los int de Python para que
+    # la clave no cambie según cómo se escribió la cuadrícula
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def _data_fingerprint(X, y):
+    digest = hashlib.sha256()
+    if hasattr(X, 'columns'):
+        digest.update(json.dumps([str(c) for c in X.columns]).encode('utf-8'))
+    for array in (np.asarray(X), np.asarray(y)):
+        digest.update(f"{array.dtype.str}{array.shape}".encode('ascii'))
+        if array.dtype == object:
+            digest.update(json.dumps(array.astype(str).tolist()).encode('utf-8'))
+        else:
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def _hash_indices(indices):
+    return hashlib.sha256(np.ascontiguousarray(indices, dtype=np.int64).tobytes()).hexdigest()
+
+
+def _hash(parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def evaluate_model(model, X_train, y_train, X_test, y_test, label_encoder, model_name="Modelo",
+                   y_train_pred=None, y_test_pred=None):
+    # Métricas estructuradas de un modelo. Cada conjunto se predice una sola vez (o se
+    # usan las predicciones que se pasen, p. ej. las que ya se calcularon antes) y de
+    # esas predicciones salen todas las métricas.
+    from sklearn.metrics import classification_report, confusion_matrix
+
+    start = time.perf_counter()
+    if y_train_pred is None:
+        y_train_pred = model.predict(X_train)
+    if y_test_pred is None:
+        y_test_pred = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+
+    labels = np.arange(len(label_encoder.classes_))
+    target_names = [str(c) for c in label_encoder.classes_]
+    result = {'modelo': model_name, 'segundos_prediccion': predict_seconds}
+    for split, y_true, y_pred in (('train', y_train, y_train_pred), ('test', y_test, y_test_pred)):
+        report = classification_report(y_true, y_pred, labels=labels, target_names=target_names,
+                                       output_dict=True, zero_division=0)
+        result[f'accuracy_{split}'] = report['accuracy']
+        result[f'f1_macro_{split}'] = report['macro avg']['f1-score']
+        for name in target_names:
+            result[f'recall_{name}_{split}'] = report[name]['recall']
+        result[f'reporte_{split}'] = report
+    result['matriz_confusion'] = confusion_matrix(y_test, y_test_pred, labels=labels)
+    result['clases'] = target_names
+    result['y_train_pred'] = y_train_pred
+    result['y_test_pred'] = y_test_pred
+    return result
+
+
+def evaluate_models(models, X_train, y_train, X_test, y_test, label_encoder, n_jobs=1, figures_dir=None):
+    # Evalúa varios modelos {nombre: modelo} sobre las mismas matrices codificadas.
+    # Con n_jobs > 1 los modelos se predicen en paralelo en hilos (la predicción de
+    # sklearn libera el GIL en gran parte). Devuelve (tabla resumen, resultados por
+    # modelo); con figures_dir las matrices de confusión se guardan como PNG en segundo
+    # plano y su ruta queda en resultados[nombre]['figura'] (un Future).
+    def evaluate(item):
+        name, model = item
+        return evaluate_model(model, X_train, y_train, X_test, y_test, label_encoder, name)
+
+    if n_jobs == 1 or len(models) <= 1:
+        results = [evaluate(item) for item in models.items()]
+    else:
+        with ThreadPoolExecutor(max_workers=None if n_jobs == -1 else n_jobs) as executor:
+            results = list(executor.map(evaluate, models.items()))
+
+    results = {result['modelo']: result for result in results}
+    if figures_dir is not None:
+        for name, result in results.items():
+            result['figura'] = render_confusion_matrix(result, figures_dir)
+    return metrics_table(results), results
+
+
+def metrics_table(results):
+    # Una fila por modelo con las métricas escalares de evaluate_model
+    rows = [{key: value for key, value in result.items() if np.isscalar(value)} for result in results.values()]
+    return pd.DataFrame(rows).set_index('modelo')
+
+
+_figure_executor = None
+
+
+def render_confusion_matrix(result, figures_dir, background=True):
+    # Guarda la matriz de confusión de evaluate_model en figures_dir/<modelo>_matriz_confusion.png.
+    # Se dibuja con la API orientada a objetos de matplotlib (Figure + lienzo Agg), sin
+    # pyplot ni ventana, así que funciona sin pantalla. Con background=True se hace en un
+    # hilo aparte y devuelve un Future con la ruta; si no, devuelve la ruta.
+    global _figure_executor
+    os.makedirs(figures_dir, exist_ok=True)
+    slug = ''.join(c if c.isalnum() else '_' for c in result['modelo']).strip('_').lower()
+    path = os.path.join(figures_dir, f"{slug}_matriz_confusion.png")
+    if not background:
+        return _save_confusion_matrix(result['matriz_confusion'], result['clases'], result['modelo'], path)
+    if _figure_executor is None:
+        # Un solo hilo: matplotlib no garantiza dibujar varias figuras a la vez
+        _figure_executor = ThreadPoolExecutor(max_workers=1)
+    return _figure_executor.submit(_save_confusion_matrix, result['matriz_confusion'], result['clases'],
+                                   result['modelo'], path)
+
+
+def _save_confusion_matrix(cm, classes, model_name, path):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=(8, 6))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    _plot_confusion_matrix(ax, cm, classes, model_name)
+    figure.savefig(path)
+    return path
+
+
+def _plot_confusion_matrix(ax, cm, classes, model_name):
+    import seaborn as sns
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', xticklabels=classes, yticklabels=classes, ax=ax)
+    ax.set_title(f'Matriz de Confusión para {model_name}')
+    ax.set_xlabel('Clase Predicha')
+    ax.set_ylabel('Clase Verdadera')
+
+
+def _in_notebook():
+    # Kernel de Jupyter (no una consola de IPython ni un script)
+    ipython = sys.modules.get('IPython')
+    shell = ipython.get_ipython() if ipython is not None else None
+    return shell is not None and 'IPKernelApp' in shell.config
+
+
+def evaluate_and_report_model(model, X_train, y_train, X_test, y_test, label_encoder, model_name="Modelo",
+                              show=None, figures_dir=None):
+    # Versión con texto de evaluate_model, la que usa el notebook. Devuelve también el
+    # diccionario de métricas (en el notebook, las celdas terminan en ';' para no
+    # imprimirlo). show=True dibuja la matriz de confusión con plt.show; por defecto
+    # solo dentro de un notebook, porque en un script plt.show bloquea hasta cerrar la
+    # ventana. figures_dir la guarda en disco en segundo plano.
+    from sklearn.metrics import classification_report
+
+    if show is None:
+        show = _in_notebook()
+
+    result = evaluate_model(model, X_train, y_train, X_test, y_test, label_encoder, model_name)
+    target_names = result['clases']
     print(f"\n--- Evaluación del {model_name} ---")
 
-    # Predicciones en el conjunto de ENTRENAMIENTO
-    y_train_pred = model.predict(X_train)
+    # Rendimiento en el conjunto de ENTRENAMIENTO
     print(f"\nRendimiento en el Conjunto de ENTRENAMIENTO ({model_name}):")
     print("Reporte de Clasificación (Entrenamiento):\n",
-          classification_report(y_train, y_train_pred, target_names=label_encoder.classes_))
+          classification_report(y_train, result['y_train_pred'], target_names=target_names))
 
-    # Predicciones en el conjunto de PRUEBA
-    y_test_pred = model.predict(X_test)
+    # Rendimiento en el conjunto de PRUEBA
     print(f"\nRendimiento en el Conjunto de PRUEBA ({model_name}):")
     print("Reporte de Clasificación (Prueba):\n",
-          classification_report(y_test, y_test_pred, target_names=label_encoder.classes_))
-
+          classification_report(y_test, result['y_test_pred'], target_names=target_names))
 
     # Matriz de Confusión para el conjunto de prueba
     print(f"\nMatriz de Confusión ({model_name} - Conjunto de Prueba):")
-    cm = confusion_matrix(y_test, y_test_pred)
-    plt.figure(figsize=(8, 6))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
-                xticklabels=label_encoder.classes_,
-                yticklabels=label_encoder.classes_)
-    plt.title(f'Matriz de Confusión para {model_name}')
-    plt.xlabel('Clase Predicha')
-    plt.ylabel('Clase Verdadera')
-    plt.show()
+    if figures_dir is not None:
+        result['figura'] = render_confusion_matrix(result, figures_dir)
+    if show:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(8, 6))
+        _plot_confusion_matrix(plt.gca(), result['matriz_confusion'], target_names, model_name)
+        plt.show()
+    else:
+        print(result['matriz_confusion'])
+    return result
@@ -0,0 +1,367 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+
+# Carga del dataset de setas desde una caché binaria por columnas.
+#
+# La primera vez se convierte el archivo original (agaricus-lepiota.data o
+# expanded.Z) a una carpeta con:
+#
+#   codes.npy    uint8 de forma (n_columnas, n_filas): cada columna es contigua y
+#                guarda el índice de la letra en el alfabeto de esa columna, o
+#                MISSING_CODE (255) para '?'
+#   header.json  columnas, alfabetos, número de filas y huella del archivo original
+#
+# Las siguientes cargas leen el header y abren codes.npy memory-mapped, sin parsear
+# nada. La caché se regenera sola si cambia el archivo original.
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'data')
+DATA_FILE = os.path.join(DATA_FOLDER, 'agaricus-lepiota.data')
+EXPANDED_FILE = os.path.join(DATA_FOLDER, 'expanded.Z')
+NAMES_FILE = os.path.join(DATA_FOLDER, 'agaricus-lepiota.names')
+CACHE_FOLDER = os.path.join(DATA_FOLDER, '.cache')
+
+CODES_FILE = 'codes.npy'
+HEADER_FILE = 'header.json'
+MISSING_CODE = 255
+
+COLUMN_NAMES = [
+    'class', 'cap-shape', 'cap-surface', 'cap-color', 'bruises', 'odor',
+    'gill-attachment', 'gill-spacing', 'gill-size', 'gill-color',
+    'stalk-shape', 'stalk-root', 'stalk-surface-above-ring',
+    'stalk-surface-below-ring', 'stalk-color-above-ring',
+    'stalk-color-below-ring', 'veil-type', 'veil-color', 'ring-number',
+    'ring-type', 'spore-print-color', 'population', 'habitat'
+]
+
+
+class AgaricusDataset:
+    def __init__(self, codes, header):
+        self.codes = codes
+        self.header = header
+        self.columns = header['columns']
+        self.alphabets = header['alphabets']
+
+    def __len__(self):
+        return self.header['n_rows']
+
+    def column_codes(self, column):
+        # Vista (sin copia) de los códigos de una columna
+        return self.codes[self.columns.index(column)]
+
+    def to_frame(self, columns=None, categorical=True):
+        # DataFrame de letras, como pd.read_csv(...).replace('?', np.nan). Con
+        # categorical=True las columnas son Categorical construidas directamente
+        # desde los códigos: 255 visto como int8 es -1, el código de NaN de pandas.
+        import pandas as pd
+        data = {}
+        for column in columns or self.columns:
+            codes = self.column_codes(column)
+            alphabet = list(self.alphabets[column])
+            if categorical:
+                data[column] = pd.Categorical.from_codes(codes.view(np.int8), categories=alphabet)
+            else:
+                letters = np.full(256, np.nan, dtype=object)
+                letters[:len(alphabet)] = alphabet
+                data[column] = letters[codes]
+        return pd.DataFrame(data)
+
+    def to_ascii_codes(self, features):
+        # Matriz (n_filas, n_características) de códigos ASCII, la que usan
+        # FeatureEncoder y CompiledTree (0 = desconocido)
+        result = np.empty((len(self), len(features)), dtype=np.uint8)
+        for j, column in enumerate(features):
+            ascii_lut = np.zeros(256, dtype=np.uint8)
+            alphabet = self.alphabets[column]
+            ascii_lut[:len(alphabet)] = np.frombuffer(alphabet.encode('ascii'), dtype=np.uint8)
+            result[:, j] = ascii_lut[self.column_codes(column)]
+        return result
+
+
+def load_dataset(source=DATA_FILE, cache_folder=CACHE_FOLDER, mmap=True):
+    # Devuelve el dataset desde la caché, convirtiéndolo antes si no existe o si el
+    # archivo original cambió
+    folder = os.path.join(cache_folder, os.path.basename(source))
+    header = _read_header(folder)
+    if header is None or not _is_fresh(header, source, folder):
+        build_cache(source, folder)
+        header = _read_header(folder)
+    codes = np.load(os.path.join(folder, CODES_FILE), mmap_mode='r' if mmap else None)
+    return AgaricusDataset(codes, header)
+
+
+def build_cache(source, folder, names_path=NAMES_FILE):
+    alphabets = read_alphabets(names_path)
+    if source.endswith('.Z'):
+        codes = np.concatenate([chunk for chunk in iter_expanded_codes(source, alphabets)], axis=1)
+    else:
+        codes = _letters_to_codes(_read_letters(source), alphabets)
+
+    os.makedirs(folder, exist_ok=True)
+    stat = os.stat(source)
+    header = {
+        'version': 1,
+        'source': os.path.basename(source),
+        'source_stat': [stat.st_mtime_ns, stat.st_size],
+        'source_sha256': _file_sha256(source),
+        'n_rows': int(codes.shape[1]),
+        'columns': COLUMN_NAMES,
+        'alphabets': alphabets,
+        'missing_code': MISSING_CODE,
+    }
+    # Los dos archivos se escriben aparte y se cambian con os.replace: otro proceso que
+    # cargue la caché a la vez nunca mapea un codes.npy a medio escribir. El header va
+    # el último: si la conversión se interrumpe, la caché no vale
+    _replace_file(os.path.join(folder, CODES_FILE), lambda f: np.save(f, np.ascontiguousarray(codes)))
+    _write_header(folder, header)
+    return header
+
+
+def _write_header(folder, header):
+    _replace_file(os.path.join(folder, HEADER_FILE),
+                  lambda f: f.write(json.dumps(header, indent=1).encode('utf-8')))
+
+
+def _replace_file(path, write):
+    # Temporal propio de cada proceso, para que dos conversiones simultáneas no
+    # escriban en el mismo archivo
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_alphabets(names_path=NAMES_FILE):
+    # Alfabeto de cada columna en el orden de agaricus-lepiota.names, como
+    # {columna: {nombre: letra}} en orden. Los códigos de la caché son posiciones en
+    # este orden, así que son los mismos para el .data y para expanded.Z.
+    return {column: ''.join(names.values()) for column, names in read_value_names(names_path).items()}
+
+
+def read_value_names(names_path=NAMES_FILE):
+    with open(names_path, encoding='utf-8') as f:
+        text = f.read()
+    section = text[text.index('7. Attribute Information:'):text.index('8. Missing Attribute Values')]
+    classes = re.search(r'\(classes:\s*(.*?)\)', section).group(1)
+    value_names = {'class': _parse_values(classes)}
+    for name, values in re.findall(r'\n\s*\d+\.\s+([\w?-]+):\s+(.*?)(?=\n\s*\d+\.\s|\Z)', section, re.S):
+        value_names[name.rstrip('?')] = _parse_values(values)
+    if list(value_names) != COLUMN_NAMES:
+        raise ValueError(f"Columnas inesperadas en {names_path}: {list(value_names)}")
+    return value_names
+
+
+def _parse_values(text):
+    # 'bell=b,conical=c' -> {'bell': 'b', 'conical': 'c'}; el '?' de faltante no entra
+    return {name: letter for name, letter in re.findall(r'([a-z]+)=([^,\s])', text) if letter != '?'}
+
+
+def _read_letters(path):
+    # Matriz (n_filas, n_columnas) de bytes con una letra por celda. Todas las celdas
+    # del .data son de un carácter, así que cada fila ocupa exactamente
+    # 2 * n_columnas bytes (letras separadas por comas más el salto de línea) y
+    # basta con un reshape; si no es así se parte línea a línea.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    width = 2 * len(COLUMN_NAMES)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) % width == 0:
+        rows = raw.reshape(-1, width)
+        if (rows[:, 1:-1:2] == ord(',')).all() and (rows[:, -1] == ord('\n')).all():
+            return rows[:, 0::2]
+    lines = [line.split(b',') for line in data.replace(b'\r', b'').split(b'\n') if line]
+    if any(len(line) != len(COLUMN_NAMES) or any(len(cell) != 1 for cell in line) for line in lines):
+        raise ValueError(f"{path}: formato no reconocido")
+    return np.frombuffer(b''.join(b''.join(line) for line in lines), dtype=np.uint8).reshape(-1, len(COLUMN_NAMES))
+
+
+def _letters_to_codes(letters, alphabets):
+    # (n_filas, n_columnas) de letras -> (n_columnas, n_filas) de códigos
+    codes = np.empty((letters.shape[1], letters.shape[0]), dtype=np.uint8)
+    for j, column in enumerate(COLUMN_NAMES):
+        lut = np.full(256, MISSING_CODE, dtype=np.uint8)
+        lut[np.frombuffer(alphabets[column].encode('ascii'), dtype=np.uint8)] = np.arange(len(alphabets[column]))
+        codes[j] = lut[letters[:, j]]
+        unknown = (codes[j] == MISSING_CODE) & (letters[:, j] != ord('?'))
+        if unknown.any():
+            raise ValueError(f"Letra desconocida en la columna {column}: {chr(letters[unknown, j][0])!r}")
+    return codes
+
+
+def iter_expanded_codes(path=EXPANDED_FILE, alphabets=None, chunk_rows=100_000, names_path=NAMES_FILE):
+    # Lee expanded.Z en streaming (sin descomprimirlo a disco) y devuelve bloques de
+    # códigos (n_columnas, <= chunk_rows) con el mismo alfabeto que la caché.
+    # expanded.Z usa nombres largos en mayúsculas (EDIBLE, CONVEX, BRUISES/NO...), que
+    # se traducen con la tabla de agaricus-lepiota.names.
+    value_names = read_value_names(names_path)
+    alphabets = alphabets or read_alphabets(names_path)
+    translations = []
+    for column in COLUMN_NAMES:
+        translation = {name.upper(): alphabets[column].index(letter)
+                       for name, letter in value_names[column].items()}
+        translation['?'] = MISSING_CODE
+        translations.append(translation)
+
+    rows = []
+    for line_number, line in enumerate(iter_lines(decompress_lzw(path)), start=1):
+        cells = line.split(',')
+        # El archivo empieza con un correo y termina con separadores: solo cuentan las
+        # líneas con todas las columnas
+        if len(cells) != len(COLUMN_NAMES):
+            continue
+        try:
+            rows.append(bytes(translation[cell] for translation, cell in zip(translations, cells)))
+        except KeyError as e:
+            raise ValueError(f"{path}, línea {line_number}: valor desconocido {e.args[0]!r}")
+        if len(rows) == chunk_rows:
+            yield _rows_to_codes(rows)
+            rows = []
+    if rows:
+        yield _rows_to_codes(rows)
+
+
+def iter_expanded_frames(path=EXPANDED_FILE, chunk_rows=100_000, categorical=True, names_path=NAMES_FILE):
+    # Lo mismo que iter_expanded_codes pero en DataFrames de letras, como to_frame()
+    alphabets = read_alphabets(names_path)
+    header = {'columns': COLUMN_NAMES, 'alphabets': alphabets}
+    for codes in iter_expanded_codes(path, alphabets, chunk_rows, names_path):
+        yield AgaricusDataset(codes, dict(header, n_rows=codes.shape[1])).to_frame(categorical=categorical)
+
+
+def _rows_to_codes(rows):
+    return np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(len(rows), -1).T.copy()
+
+
+def iter_lines(blocks):
+    # Líneas de texto a partir de bloques de bytes que pueden cortar una línea
+    pending = b''
+    for block in blocks:
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b'\r').decode('ascii')
+    if pending:
+        yield pending.rstrip(b'\r').decode('ascii')
+
+
+def decompress_lzw(path, block_size=1 << 16):
+    # Descompresor en streaming del formato .Z de compress(1) (LZW con códigos de 9 a
+    # max_bits bits). Devuelve bloques de ~block_size bytes descomprimidos.
+    #
+    # compress escribe los códigos en grupos de 8 (n_bits bytes por grupo). Cuando
+    # cambia el ancho de código o llega un CLEAR, el resto del grupo actual es relleno
+    # y hay que saltarlo, por eso se lee grupo a grupo.
+    with open(path, 'rb') as f:
+        magic = f.read(3)
+        if len(magic) < 3 or magic[:2] != b'\x1f\x9d':
+            raise ValueError(f"{path} no es un archivo .Z de compress")
+        max_bits = magic[2] & 0x1f
+        block_mode = bool(magic[2] & 0x80)
+        if not 9 <= max_bits <= 16:
+            raise ValueError(f"{path}: max_bits={max_bits} no soportado")
+        max_entries = 1 << max_bits
+        first_free = 257 if block_mode else 256
+
+        # En modo bloque el código 256 es CLEAR y no tiene entrada en el diccionario
+        entries = [bytes([i]) for i in range(256)] + [b''] * block_mode
+        free_entry = first_free
+        n_bits = 9
+        max_code = (1 << n_bits) - 1
+        previous = None
+        output = bytearray()
+        while True:
+            group = f.read(n_bits)
+            if not group:
+                break
+            value = int.from_bytes(group, 'little')
+            mask = (1 << n_bits) - 1
+            for k in range(len(group) * 8 // n_bits):
+                code = (value >> (k * n_bits)) & mask
+                if code == 256 and block_mode:
+                    # CLEAR: tabla nueva y códigos de 9 bits desde el siguiente grupo
+                    del entries[257:]
+                    free_entry = first_free
+                    n_bits, max_code, previous = 9, 511, None
+                    break
+                if previous is None and code < 256:
+                    # Primer código del archivo o tras un CLEAR: siempre un byte literal
+                    entry = entries[code]
+                elif previous is not None and code < free_entry:
+                    entry = entries[code]
+                    if free_entry < max_entries:
+                        entries.append(previous + entry[:1])
+                        free_entry += 1
+                elif previous is not None and code == free_entry:
+                    entry = previous + previous[:1]
+                    if free_entry < max_entries:
+                        entries.append(entry)
+                        free_entry += 1
+                else:
+                    raise ValueError(f"{path}: código LZW {code} inválido, archivo corrupto")
+                output += entry
+                previous = entry
+                if free_entry > max_code and n_bits < max_bits:
+                    n_bits += 1
+                    max_code = (1 << n_bits) - 1
+                    break
+            if len(output) >= block_size:
+                yield bytes(output)
+                output.clear()
+        if output:
+            yield bytes(output)
+
+
+def _read_header(folder):
+    try:
+        with open(os.path.join(folder, HEADER_FILE), encoding='utf-8') as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(os.path.join(folder, CODES_FILE)):
+        return None
+    return header
+
+
+def _is_fresh(header, source, folder):
+    stat = os.stat(source)
+    if header.get('source_stat') == [stat.st_mtime_ns, stat.st_size]:
+        return True
+    if header.get('source_sha256') != _file_sha256(source):
+        return False
+    # Solo cambió la fecha (un touch, un git checkout): se guarda la nueva para no
+    # volver a calcular el sha256 en cada carga. Si no se puede escribir, la caché
+    # sigue valiendo igual
+    try:
+        _write_header(folder, dict(header, source_stat=[stat.st_mtime_ns, stat.st_size]))
+    except OSError:
+        pass
+    return True
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+if __name__ == '__main__':
+    # Convierte los dos archivos del dataset a la caché:
+    #   python src/dataset_loader.py
+    import time
+    for source in (DATA_FILE, EXPANDED_FILE):
+        start = time.perf_counter()
+        folder = os.path.join(CACHE_FOLDER, os.path.basename(source))
+        header = build_cache(source, folder)
+        print(f"{source}: {header['n_rows']:,} filas en {time.perf_counter() - start:.2f} s -> {folder}")
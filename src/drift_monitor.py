@@ -0,0 +1,321 @@
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from feature_encoder import STREAMLIT_FEATURES
+from mushroom_schema import feature_alphabets
+
+
+# Monitor de deriva de los datos de entrada: compara lo que llega a la app y al
+# servicio con la distribución de agaricus-lepiota.data (UCI, 1987), con la que se
+# entrenó el modelo.
+#
+#   monitor = get_drift_monitor()
+#   unseen = monitor.observe(codes)   # máscara: combinación completa nunca vista
+#   report = monitor.last_report      # PSI y chi-cuadrado por característica
+#
+# Por cada fila observada se suma un contador por (característica, código) y la
+# combinación de los 15 códigos entra en un count-min sketch (DEPTH x WIDTH
+# contadores), así que la memoria es fija (~1 MB) sea cual sea el tráfico. Las filas
+# completas (sin desconocidas) cuya combinación no aparece en el dataset de
+# entrenamiento se marcan como nuevas; la búsqueda es una búsqueda binaria sobre las
+# ~8.000 claves del dataset. Cada CHECK_INTERVAL segundos observe() recalcula el
+# informe de deriva con las distribuciones marginales.
+#
+# Variables de entorno que lee get_drift_monitor():
+#
+#   FUNGISCAN_DRIFT=0                  desactiva el monitor
+#   FUNGISCAN_DRIFT_INTERVAL=60        segundos entre informes
+CHECK_INTERVAL = 60.0
+SKETCH_DEPTH = 4
+SKETCH_WIDTH = 1 << 15
+_UINT64_MASK = (1 << 64) - 1
+
+# PSI habituales: < 0.1 sin cambios, 0.1-0.25 cambio moderado, > 0.25 deriva
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+
+# Comparación de una característica con el entrenamiento. 'new_values' son las
+# letras que aparecen en el tráfico y nunca en el entrenamiento.
+FeatureDrift = namedtuple('FeatureDrift', ['feature', 'rows', 'unknown', 'psi', 'chi_square', 'dof', 'new_values'])
+
+# Informe completo: filas observadas, filas con alguna desconocida, filas completas
+# con una combinación nueva y un FeatureDrift por característica
+DriftReport = namedtuple('DriftReport', ['timestamp', 'rows', 'incomplete', 'unseen', 'features'])
+
+
+class CountMinSketch:
+    # Frecuencia aproximada de claves int64 con DEPTH filas de WIDTH contadores: cada
+    # clave suma 1 en una posición por fila (hash multiplicativo) y la estimación es el
+    # mínimo de sus posiciones. Nunca subestima; sobreestima como mucho en
+    # e / width * total con probabilidad 1 - exp(-depth).
+    def __init__(self, depth=SKETCH_DEPTH, width=SKETCH_WIDTH, seed=0):
+        if width & (width - 1):
+            raise ValueError("La anchura del sketch tiene que ser una potencia de 2")
+        self.depth = depth
+        self.width = width
+        self.total = 0
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        # Multiplicadores impares de 64 bits
+        self._multipliers = rng.integers(1, 1 << 62, size=(depth, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._shift = np.uint64(64 - width.bit_length() + 1)
+        # Lo mismo en enteros de Python, para sumar una sola clave sin pasar por NumPy
+        self._hashes = [(int(a), int(self._shift)) for a in self._multipliers[:, 0]]
+
+    def _positions(self, keys):
+        return (np.asarray(keys, dtype=np.int64).view(np.uint64)[np.newaxis, :] * self._multipliers) >> self._shift
+
+    def add(self, keys):
+        positions = self._positions(keys)
+        for row, columns in zip(self.table, positions):
+            np.add.at(row, columns, 1)
+        self.total += positions.shape[1]
+
+    def add_one(self, key):
+        table = self.table
+        for row, (multiplier, shift) in enumerate(self._hashes):
+            table[row, ((key * multiplier) & _UINT64_MASK) >> shift] += 1
+        self.total += 1
+
+    def estimate(self, keys):
+        positions = self._positions(keys)
+        return np.min(np.take_along_axis(self.table, positions.astype(np.intp), axis=1), axis=0)
+
+
+class TrainingReference:
+    # Distribución del dataset de entrenamiento: recuento por (característica, código
+    # ASCII) y claves ordenadas de sus combinaciones completas
+    def __init__(self, codes, features=STREAMLIT_FEATURES):
+        self.features = list(features)
+        self.alphabets = feature_alphabets(self.features)
+        codes = np.asarray(codes, dtype=np.uint8)
+        self.rows = len(codes)
+        self.counts = _code_counts(codes)
+        self._digit_luts, self._radices = _key_tables(self.features, self.alphabets)
+        keys, complete = self.combination_keys(codes)
+        self.keys = np.unique(keys[complete])
+        self._key_set = frozenset(self.keys.tolist())
+        self._digit_lists = [lut.tolist() for lut in self._digit_luts]
+
+    @classmethod
+    def from_dataset(cls, features=STREAMLIT_FEATURES, source=None):
+        # agaricus-lepiota.data a través de la caché de dataset_loader (sin pandas)
+        from dataset_loader import DATA_FILE, load_dataset
+        return cls(load_dataset(source or DATA_FILE).to_ascii_codes(features), features)
+
+    def combination_keys(self, codes):
+        # Clave int64 de cada fila (número en base mixta: una cifra por característica,
+        # la posición de su letra en el alfabeto) y máscara de filas completas. Las
+        # desconocidas y las letras fuera del alfabeto usan la última cifra.
+        keys = np.zeros(len(codes), dtype=np.int64)
+        complete = np.ones(len(codes), dtype=bool)
+        for lut, radix, column in zip(self._digit_luts, self._radices, np.asarray(codes, dtype=np.uint8).T):
+            digits = lut[column]
+            keys *= radix
+            keys += digits
+            complete &= digits < radix - 1
+        return keys, complete
+
+    def record_key(self, row):
+        # combination_keys de una sola fila (bytes o secuencia de códigos) en Python:
+        # (clave, completa)
+        key = 0
+        complete = True
+        for lut, radix, code in zip(self._digit_lists, self._radices, row):
+            digit = lut[code]
+            key = key * radix + digit
+            complete = complete and digit < radix - 1
+        return key, complete
+
+    def contains(self, keys):
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return self.keys[positions] == keys
+
+
+class DriftMonitor:
+    def __init__(self, reference=None, enabled=True, check_interval=CHECK_INTERVAL, recent_size=100):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self._reference = reference
+        self._lock = threading.Lock()
+        self._counts = np.zeros((len(STREAMLIT_FEATURES), 256), dtype=np.int64)
+        self.sketch = CountMinSketch()
+        self.rows = 0
+        self.incomplete = 0
+        self.unseen = 0
+        # Últimas combinaciones nuevas, como texto de 15 letras, para inspeccionarlas
+        self.recent_unseen = deque(maxlen=recent_size)
+        self.last_report = None
+        self._next_check = time.monotonic() + check_interval
+
+    @property
+    def reference(self):
+        # Se carga la primera vez que se observa algo (unas decenas de ms)
+        if self._reference is None:
+            with self._lock:
+                if self._reference is None:
+                    self._reference = TrainingReference.from_dataset()
+        return self._reference
+
+    def observe(self, codes):
+        # Registra un bloque (n_filas, 15) de códigos ASCII y devuelve la máscara de
+        # filas completas con una combinación que no está en el entrenamiento
+        codes = np.asarray(codes, dtype=np.uint8)
+        if not self.enabled or not len(codes):
+            return np.zeros(len(codes), dtype=bool)
+        if len(codes) == 1:
+            return np.array([self._observe_one(codes[0])])
+        reference = self.reference
+        keys, complete = reference.combination_keys(codes)
+        unseen = complete & ~reference.contains(keys)
+        counts = _code_counts(codes)
+        with self._lock:
+            self._counts += counts
+            self.sketch.add(keys)
+            self.rows += len(codes)
+            self.incomplete += len(codes) - int(complete.sum())
+            n_unseen = int(unseen.sum())
+            self.unseen += n_unseen
+            for row in codes[unseen][-self.recent_unseen.maxlen:]:
+                self.recent_unseen.append(row.tobytes().decode('ascii'))
+            check = time.monotonic() >= self._next_check
+            if check:
+                self._next_check = time.monotonic() + self.check_interval
+        if check:
+            self.last_report = self.compare()
+        return unseen
+
+    def _observe_one(self, row):
+        # Una petición o un formulario: unos pocos µs en Python en vez de NumPy
+        reference = self.reference
+        row = row.tobytes()
+        key, complete = reference.record_key(row)
+        unseen = complete and key not in reference._key_set
+        with self._lock:
+            counts = self._counts
+            for j, code in enumerate(row):
+                counts[j, code] += 1
+            self.sketch.add_one(key)
+            self.rows += 1
+            self.incomplete += not complete
+            if unseen:
+                self.unseen += 1
+                self.recent_unseen.append(row.decode('ascii'))
+            check = time.monotonic() >= self._next_check
+            if check:
+                self._next_check = time.monotonic() + self.check_interval
+        if check:
+            self.last_report = self.compare()
+        return unseen
+
+    def frequency(self, codes):
+        # Veces (aproximadas, por exceso) que se ha observado cada combinación de 'codes'
+        keys, _ = self.reference.combination_keys(np.asarray(codes, dtype=np.uint8))
+        with self._lock:
+            return self.sketch.estimate(keys)
+
+    def compare(self):
+        # PSI y chi-cuadrado de cada característica: tráfico observado frente al
+        # entrenamiento, sobre las letras del alfabeto (las desconocidas se cuentan
+        # aparte). Se suma 0.5 a cada letra en los dos lados para que una letra sin
+        # casos no dé un PSI infinito.
+        reference = self.reference
+        with self._lock:
+            counts = self._counts.copy()
+            rows, incomplete, unseen = self.rows, self.incomplete, self.unseen
+        features = []
+        for j, feature in enumerate(reference.features):
+            letters = np.frombuffer(reference.alphabets[feature].encode('ascii'), dtype=np.uint8)
+            observed = counts[j, letters].astype(float)
+            expected = reference.counts[j, letters].astype(float)
+            n = observed.sum()
+            new_values = ''.join(chr(c) for c in letters[(observed > 0) & (expected == 0)])
+            if not n:
+                features.append(FeatureDrift(feature, 0, int(counts[j, 0]), None, None, len(letters) - 1, new_values))
+                continue
+            p = (observed + 0.5) / (n + 0.5 * len(letters))
+            q = (expected + 0.5) / (expected.sum() + 0.5 * len(letters))
+            psi = float(np.sum((p - q) * np.log(p / q)))
+            chi_square = float(np.sum((observed - n * q) ** 2 / (n * q)))
+            features.append(FeatureDrift(feature, int(n), int(counts[j, 0]), psi, chi_square, len(letters) - 1,
+                                         new_values))
+        return DriftReport(time.time(), rows, incomplete, unseen, features)
+
+    def report(self):
+        # Informe recalculado ahora (y guardado como last_report)
+        self.last_report = self.compare()
+        return self.last_report
+
+    def reset(self):
+        with self._lock:
+            self._counts[:] = 0
+            self.sketch = CountMinSketch(self.sketch.depth, self.sketch.width)
+            self.rows = self.incomplete = self.unseen = 0
+            self.recent_unseen.clear()
+            self.last_report = None
+
+    def to_prometheus(self, namespace='fungiscan'):
+        report = self.report()
+        lines = []
+        for name, help_text, value in (('rows_total', 'Filas observadas por el monitor de deriva.', report.rows),
+                                       ('incomplete_rows_total', 'Filas con alguna característica desconocida.',
+                                        report.incomplete),
+                                       ('unseen_combinations_total',
+                                        'Filas completas con una combinación que no está en el entrenamiento.',
+                                        report.unseen)):
+            lines += [f'# HELP {namespace}_drift_{name} {help_text}', f'# TYPE {namespace}_drift_{name} counter',
+                      f'{namespace}_drift_{name} {value}']
+        for name, help_text in (('psi', 'Índice de estabilidad de la población frente al entrenamiento.'),
+                                ('chi_square', 'Estadístico chi-cuadrado frente al entrenamiento.')):
+            lines += [f'# HELP {namespace}_drift_{name} {help_text}', f'# TYPE {namespace}_drift_{name} gauge']
+            lines += [f'{namespace}_drift_{name}{{feature="{f.feature}"}} {getattr(f, name)!r}'
+                      for f in report.features if getattr(f, name) is not None]
+        return '\n'.join(lines) + '\n'
+
+
+def _code_counts(codes):
+    # Recuento (n_características, 256) de cada código ASCII por columna
+    n_features = codes.shape[1]
+    if len(codes) == 1:
+        counts = np.zeros((n_features, 256), dtype=np.int64)
+        counts[np.arange(n_features), codes[0]] = 1
+        return counts
+    flat = codes.astype(np.intp) + np.arange(n_features, dtype=np.intp) * 256
+    return np.bincount(flat.ravel(), minlength=n_features * 256).reshape(n_features, 256)
+
+
+def _key_tables(features, alphabets):
+    # Por característica: código ASCII -> cifra (posición en el alfabeto; la última,
+    # para desconocidas y letras no válidas) y la base de esa cifra
+    luts, radices = [], []
+    for feature in features:
+        alphabet = alphabets[feature]
+        lut = np.full(256, len(alphabet), dtype=np.int64)
+        lut[np.frombuffer(alphabet.encode('ascii'), dtype=np.uint8)] = np.arange(len(alphabet))
+        luts.append(lut)
+        radices.append(len(alphabet) + 1)
+    if math.prod(radices) >= 1 << 63:
+        raise ValueError("Demasiadas combinaciones posibles para una clave int64")
+    return luts, radices
+
+
+_drift_monitor = None
+_drift_monitor_lock = threading.Lock()
+
+
+def get_drift_monitor():
+    # Instancia compartida por todo el proceso, configurada con las variables de entorno
+    global _drift_monitor
+    with _drift_monitor_lock:
+        if _drift_monitor is None:
+            _drift_monitor = DriftMonitor(enabled=os.environ.get('FUNGISCAN_DRIFT', '1') != '0',
+                                          check_interval=float(os.environ.get('FUNGISCAN_DRIFT_INTERVAL',
+                                                                              CHECK_INTERVAL)))
+        return _drift_monitor
@@ -0,0 +1,205 @@
+import threading
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+from mushroom_schema import FEATURE_MAPS, POISONOUS_LABEL
+
+
+# Explicaciones del árbol de decisión: qué condiciones sobre las características
+# observadas llevaron a cada predicción, para lotes enteros.
+#
+# El camino de una fila por el árbol queda determinado por el nodo en el que termina:
+# su hoja o, si alguna característica que el árbol evalúa es desconocida, la primera
+# división sobre una de ellas (a partir de ahí la predicción marginaliza todas las
+# ramas, ver CompiledTree.predict_partial_codes). Así que todo lo que depende del
+# camino se calcula una vez por nodo al crear el explicador:
+#
+#   - el camino desde la raíz (una fila de la matriz indicadora de nodos)
+#   - la condición de cada arista ("gill-color es Marrón", "ring-type no es Colgante")
+#     con las etiquetas de mushroom_schema, y cuánto cambia en ella la fracción de
+#     setas venenosas de entrenamiento entre el nodo padre y el hijo
+#   - las TOP_CONDITIONS condiciones del camino que más empujan hacia cada clase, y el
+#     texto que las resume: una fila muestra las de la clase que se le predijo (con
+#     desconocidas, el peor caso puede no ser la clase mayoritaria del nodo final)
+#
+# Explicar un lote es buscar el nodo final de cada fila (la tabla de consulta da la
+# hoja de las filas completas; solo las filas con desconocidas recorren el árbol) e
+# indexar esas tablas por nodo: el mismo coste que predecir, más una copia.
+TOP_CONDITIONS = 3
+
+# Resultado de DecisionPathExplainer.explain, una entrada por fila:
+#   node           nodo final (hoja, o división sobre una característica desconocida)
+#   conditions     (n, TOP_CONDITIONS) nodos cuyas aristas de entrada son las
+#                  condiciones decisivas, de más a menos; -1 si hay menos condiciones
+#                  que empujen hacia la clase predicha
+#   contributions  (n, TOP_CONDITIONS) cambio de la fracción de venenosas en cada una
+#   text           las condiciones decisivas en texto, separadas por '; '
+#   path           matriz dispersa (n, nodos) con un 1 en cada nodo del camino, o None
+Explanation = namedtuple('Explanation', ['node', 'conditions', 'contributions', 'text', 'path'])
+
+
+class DecisionPathExplainer:
+    def __init__(self, predictor, poisonous_class, feature_maps=FEATURE_MAPS, top=TOP_CONDITIONS):
+        # predictor: CompiledTree, o LookupTable con su árbol compilado (tree.npz). Los
+        # ensembles y los modelos de sklearn no tienen un único camino que mostrar.
+        tree = getattr(predictor, 'tree', predictor)
+        if not hasattr(tree, 'children') or not hasattr(tree, 'is_leaf'):
+            raise ValueError("Las explicaciones solo están disponibles para el árbol de decisión")
+        self.tree = tree
+        self.top = top
+        self.poisonous_class = poisonous_class
+        # Con una tabla de consulta las filas completas toman la hoja de la tabla
+        self._apply = None
+        if predictor is not tree:
+            try:
+                predictor.apply_codes(np.zeros((0, len(tree.features)), dtype=np.uint8))
+                self._apply = predictor.apply_codes
+            except (AttributeError, ValueError):
+                pass
+        n_nodes = len(tree.feature)
+        internal = np.flatnonzero(~tree.is_leaf)
+        # Características que el árbol evalúa: solo si alguna de ellas es desconocida
+        # hay que recorrerlo fila a fila
+        self._tested = np.unique(tree.feature[internal])
+
+        parent = np.full(n_nodes, -1, dtype=np.intp)
+        is_right = np.zeros(n_nodes, dtype=bool)
+        parent[tree.children[internal, 0]] = internal
+        parent[tree.children[internal, 1]] = internal
+        is_right[tree.children[internal, 1]] = True
+        poisonous = int(np.flatnonzero(tree.classes == poisonous_class)[0])
+        self.poisonous_fraction = tree.value[:, poisonous]
+        # Cambio de la fracción de venenosas al entrar en cada nodo (0 en la raíz)
+        self.delta = np.where(parent >= 0, self.poisonous_fraction - self.poisonous_fraction[parent], 0.0)
+
+        labels = [{code: label for label, code in feature_maps.get(feature, {}).items()}
+                  for feature in tree.features]
+        self.condition = np.empty(n_nodes, dtype=object)
+        for node in range(n_nodes):
+            if parent[node] < 0:
+                continue
+            j, letter = tree._feature_list[parent[node]], tree._char_list[parent[node]]
+            self.condition[node] = (f"{tree.features[j]} {'es' if is_right[node] else 'no es'} "
+                                    f"{labels[j].get(letter, letter)}")
+
+        # Caminos de todos los nodos en formato CSR (los padres tienen índices menores)
+        paths = [[0]] + [None] * (n_nodes - 1)
+        for node in range(1, n_nodes):
+            paths[node] = paths[parent[node]] + [node]
+        self.depth = np.array([len(path) - 1 for path in paths], dtype=np.intp)
+        self._path_indptr = np.concatenate([[0], np.cumsum(self.depth + 1)])
+        self._path_indices = np.concatenate(paths).astype(np.int32)
+
+        # Primer índice: 0 = hacia comestible (la fracción de venenosas baja), 1 = hacia venenosa
+        self.top_nodes = np.full((2, n_nodes, top), -1, dtype=np.intp)
+        self.top_contributions = np.zeros((2, n_nodes, top))
+        self.text = np.empty((2, n_nodes), dtype=object)
+        for node, path in enumerate(paths):
+            edges = np.array(path[1:], dtype=np.intp)
+            for toward_poisonous, direction in ((0, -1.0), (1, 1.0)):
+                score = direction * self.delta[edges]
+                best = edges[np.argsort(-score, kind='stable')[:np.count_nonzero(score > 0)][:top]]
+                self.top_nodes[toward_poisonous, node, :len(best)] = best
+                self.top_contributions[toward_poisonous, node, :len(best)] = self.delta[best]
+                parts = [f"{self.condition[e]} (venenosas {format_points(self.delta[e])})" for e in best]
+                if not tree.is_leaf[node]:
+                    parts.append(f"{self.unknown_feature(node)} desconocida: se consideran todas las ramas")
+                self.text[toward_poisonous, node] = '; '.join(parts)
+
+    @classmethod
+    def from_bundle(cls, bundle, **kwargs):
+        return cls(bundle.predictor, bundle.label_encoder.transform([POISONOUS_LABEL])[0], **kwargs)
+
+    def final_nodes(self, codes):
+        # Nodo en el que termina cada fila: su hoja o la primera división sobre una
+        # característica desconocida (código 0)
+        codes = np.asarray(codes, dtype=np.uint8)
+        if self._apply is None:
+            return self._walk(codes)
+        nodes = self._apply(codes)
+        unknown = (codes[:, self._tested] == 0).any(axis=1)
+        if unknown.any():
+            rows = np.flatnonzero(unknown)
+            nodes[rows] = self._walk(codes[rows])
+        return nodes
+
+    def _walk(self, codes):
+        # Como CompiledTree.apply_codes, pero una fila se queda quieta al llegar a una
+        # división sobre una característica desconocida (las hojas ya apuntan a sí mismas)
+        tree = self.tree
+        n_rows = codes.shape[0]
+        node = np.zeros(n_rows, dtype=np.intp)
+        flat_codes = codes.reshape(-1)
+        row_offsets = np.arange(0, n_rows * codes.shape[1], codes.shape[1], dtype=np.intp)
+        for _ in range(tree.max_depth):
+            value = flat_codes[row_offsets + tree.feature[node]]
+            following = tree.children[node, (value == tree.code[node]).view(np.uint8)]
+            node = np.where(value == 0, node, following)
+        return node
+
+    def decision_path(self, nodes):
+        # Matriz indicadora dispersa (scipy CSR, filas x nodos del árbol) con los
+        # caminos que terminan en 'nodes', como decision_path de sklearn
+        from scipy.sparse import csr_matrix
+        nodes = np.asarray(nodes, dtype=np.intp)
+        lengths = self.depth[nodes] + 1
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        # Posición de cada entrada dentro del camino de su nodo en _path_indices
+        positions = np.arange(indptr[-1]) + np.repeat(self._path_indptr[nodes] - indptr[:-1], lengths)
+        return csr_matrix((np.ones(indptr[-1], dtype=np.uint8), self._path_indices[positions], indptr),
+                          shape=(len(nodes), len(self.tree.feature)))
+
+    def explain(self, codes, predictions=None, path=False):
+        # Explicación de cada fila de la matriz de códigos. 'predictions' son las clases
+        # predichas (codificadas, como las de score_codes); sin ellas se usa la clase
+        # mayoritaria del nodo final. Con path=True incluye la matriz indicadora de nodos
+        # (necesita scipy).
+        nodes = self.final_nodes(codes)
+        toward_poisonous = self._toward_poisonous(nodes, predictions)
+        return Explanation(
+            node=nodes,
+            conditions=self.top_nodes[toward_poisonous, nodes],
+            contributions=self.top_contributions[toward_poisonous, nodes],
+            text=self.text[toward_poisonous, nodes],
+            path=self.decision_path(nodes) if path else None,
+        )
+
+    def steps(self, node, prediction=None):
+        # Todas las condiciones del camino hasta 'node', en orden: (condición, cambio de
+        # la fracción de venenosas, si es una de las decisivas para 'prediction')
+        path = self._path_indices[self._path_indptr[node] + 1:self._path_indptr[node + 1]].tolist()
+        toward_poisonous = int(self.poisonous_fraction[node] >= 0.5 if prediction is None
+                               else prediction == self.poisonous_class)
+        decisive = set(self.top_nodes[toward_poisonous, node].tolist())
+        return [(self.condition[e], float(self.delta[e]), e in decisive) for e in path]
+
+    def _toward_poisonous(self, nodes, predictions):
+        if predictions is None:
+            return (self.poisonous_fraction[nodes] >= 0.5).astype(np.intp)
+        return (np.asarray(predictions) == self.poisonous_class).astype(np.intp)
+
+    def unknown_feature(self, node):
+        # Característica desconocida en la que se detuvo el camino, o None si llegó a una hoja
+        return None if self.tree.is_leaf[node] else self.tree.features[self.tree.feature[node]]
+
+
+def format_points(change):
+    # Cambio de una fracción en puntos porcentuales: 0.462 -> '+46 puntos'
+    return f"{round(change * 100):+d} puntos"
+
+
+_explainers = weakref.WeakKeyDictionary()
+_explainers_lock = threading.Lock()
+
+
+def get_explainer(predictor, label_encoder):
+    # Explicador del predictor, creado una vez por predictor: si el registro recarga el
+    # modelo, el nuevo predictor tiene el suyo. ValueError si no es un árbol.
+    with _explainers_lock:
+        explainer = _explainers.get(predictor)
+        if explainer is None:
+            explainer = _explainers[predictor] = DecisionPathExplainer(
+                predictor, label_encoder.transform([POISONOUS_LABEL])[0])
+        return explainer
@@ -0,0 +1,205 @@
+import numpy as np
+
+
+# Las características que usa el modelo de Streamlit, en el orden del entrenamiento.
+STREAMLIT_FEATURES = [
+    'cap-shape', 'cap-surface', 'cap-color', 'bruises',
+    'gill-color', 'stalk-shape', 'stalk-surface-above-ring',
+    'stalk-surface-below-ring', 'stalk-color-above-ring',
+    'stalk-color-below-ring', 'veil-color', 'ring-number',
+    'ring-type', 'population', 'habitat'
+]
+
+# Todos los códigos del dataset son una sola letra ASCII, así que una tabla de 256
+# entradas por característica (indexada por el byte) basta para ir de código a columna
+# OHE. El byte 0 se reserva para "valor desconocido o inválido".
+_LUT_SIZE = 256
+_ASCII_LIMIT = 128
+
+
+# Codificador One-Hot único para la app, el procesamiento por lotes y el entrenamiento.
+# Se construye una vez a partir de ohe_columns y codifica mediante una tabla de enteros
+# (característica, código ASCII) -> columna, sin pandas en el camino crítico. Los códigos
+# sin columna (la categoría eliminada con drop_first=True o valores desconocidos)
+# producen ceros, igual que get_dummies + reindexar.
+class FeatureEncoder:
+    def __init__(self, ohe_columns, features=STREAMLIT_FEATURES):
+        self.ohe_columns = list(ohe_columns)
+        self.features = list(features)
+        self.n_columns = len(self.ohe_columns)
+
+        self._lut = np.full((len(self.features), _LUT_SIZE), -1, dtype=np.intp)
+        self._lookup = []
+        # Las columnas de cada característica son consecutivas en ohe_columns (así las
+        # genera get_dummies), de modo que cada una se rellena copiando filas de un
+        # bloque precalculado de tamaño (256, n_columnas_de_la_característica).
+        self._blocks = []
+        # Columnas de cada característica en una sola pasada ("característica_código")
+        columns_by_feature = {}
+        for i, col in enumerate(self.ohe_columns):
+            columns_by_feature.setdefault(col.rpartition('_')[0], []).append(i)
+        for j, feature in enumerate(self.features):
+            prefix = feature + '_'
+            positions = columns_by_feature.get(feature, [])
+            start = positions[0] if positions else 0
+            stop = start + len(positions)
+            if positions != list(range(start, stop)):
+                raise ValueError(f"Las columnas OHE de '{feature}' no son consecutivas")
+
+            block = np.zeros((_LUT_SIZE, stop - start), dtype=np.uint8)
+            lookup = {}
+            for i in positions:
+                code = self.ohe_columns[i][len(prefix):]
+                if len(code) != 1 or not 0 < ord(code) < _ASCII_LIMIT:
+                    raise ValueError(f"Código no soportado en la columna OHE '{self.ohe_columns[i]}'")
+                self._lut[j, ord(code)] = i
+                block[ord(code), i - start] = 1
+                lookup[code] = i
+            self._lookup.append(lookup)
+            self._blocks.append((start, stop, block))
+        if sum(stop - start for start, stop, _ in self._blocks) != self.n_columns:
+            raise ValueError("Hay columnas OHE que no corresponden a ninguna característica")
+        self._lut_flat = self._lut.reshape(-1)
+        self._lut_offsets = np.arange(len(self.features), dtype=np.intp) * _LUT_SIZE
+
+        # Para row_keys: por característica, 0 = desconocido, 1..k = letras con columna
+        # OHE y k+1 = cualquier otra letra, multiplicado por su peso en base mixta.
+        radices = [len(lookup) + 2 for lookup in self._lookup]
+        strides = [1]
+        for radix in radices[:-1]:
+            strides.append(strides[-1] * radix)
+        self._key_luts = None
+        if strides[-1] * radices[-1] < 2 ** 63:
+            self._key_luts = np.empty((len(self.features), _LUT_SIZE), dtype=np.int64)
+            for j, (lookup, radix, stride) in enumerate(zip(self._lookup, radices, strides)):
+                self._key_luts[j] = (radix - 1) * stride
+                self._key_luts[j, 0] = 0
+                for group, code in enumerate(sorted(lookup), start=1):
+                    self._key_luts[j, ord(code)] = group * stride
+
+    @classmethod
+    def from_file(cls, path, features=STREAMLIT_FEATURES):
+        # Se construye a partir de ohe_columns_for_streamlit.pkl
+        import joblib
+        return cls(joblib.load(path), features)
+
+    @classmethod
+    def fit(cls, X, features=STREAMLIT_FEATURES):
+        # Reproduce las columnas de pd.get_dummies(X, drop_first=True): códigos
+        # ordenados y se elimina el primero de cada característica.
+        ohe_columns = []
+        for feature in features:
+            values = np.asarray(X[feature], dtype=object)
+            codes = sorted(set(v for v in values if isinstance(v, str)))
+            ohe_columns.extend(f"{feature}_{code}" for code in codes[1:])
+        return cls(ohe_columns, features)
+
+    def codes_from_frame(self, df):
+        # Matriz (n_filas, n_características) de códigos ASCII en uint8. Cualquier
+        # valor que no sea exactamente una letra ASCII (NaN, '', 'Convexa'...) queda a 0.
+        # Cada columna se factoriza (o se usan sus códigos si ya es categórica) y solo
+        # se traducen los pocos valores distintos, no cada fila.
+        import pandas as pd
+        codes = np.empty((len(df), len(self.features)), dtype=np.uint8)
+        for j, feature in enumerate(self.features):
+            column = df[feature]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                value_codes = column.cat.codes.to_numpy()
+                uniques = column.cat.categories.to_numpy()
+            else:
+                value_codes, uniques = pd.factorize(column)
+            # El código -1 (NaN) cae en el último elemento, que vale 0.
+            table = np.append(_ascii_codes(np.asarray(uniques, dtype=object)), np.uint8(0))
+            codes[:, j] = table[value_codes]
+        return codes
+
+    def codes_from_records(self, records):
+        # Acepta una tupla de códigos o una lista de tuplas/diccionarios. Son entradas
+        # pequeñas (formulario, peticiones JSON), así que un bucle de Python sobre un
+        # bytearray es más rápido que convertir cada columna con NumPy.
+        if isinstance(records, (tuple, dict)):
+            records = [records]
+        n_features = len(self.features)
+        buffer = bytearray(len(records) * n_features)
+        k = 0
+        for record in records:
+            values = [record.get(f) for f in self.features] if isinstance(record, dict) else record
+            for value in values:
+                if isinstance(value, str) and len(value) == 1 and value < '\x80':
+                    buffer[k] = ord(value)
+                k += 1
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(len(records), n_features)
+
+    def to_codes(self, data):
+        if isinstance(data, np.ndarray) and data.dtype == np.uint8:
+            return data
+        if hasattr(data, 'columns'):
+            return self.codes_from_frame(data)
+        return self.codes_from_records(data)
+
+    def row_keys(self, codes):
+        # Un entero int64 por fila que identifica su combinación de códigos tal como la
+        # ve el modelo: las letras sin columna OHE (la categoría eliminada o valores no
+        # reconocidos) comparten grupo porque se codifican igual, y el desconocido (0)
+        # tiene el suyo. Filas con la misma clave reciben la misma predicción.
+        if self._key_luts is None:
+            raise ValueError("Demasiadas combinaciones posibles para una clave int64")
+        codes = np.asarray(codes, dtype=np.uint8)
+        keys = np.zeros(codes.shape[0], dtype=np.int64)
+        for lut, feature_codes in zip(self._key_luts, codes.T):
+            keys += lut[feature_codes]
+        return keys
+
+    def positions(self, codes):
+        # Índice de columna OHE de cada (fila, característica), o -1 si no tiene.
+        return self._lut_flat[codes + self._lut_offsets]
+
+    def transform_codes(self, codes, sparse=False, out=None):
+        codes = np.asarray(codes, dtype=np.uint8)
+        n_rows = codes.shape[0]
+
+        if sparse:
+            from scipy.sparse import csr_matrix
+            positions = self.positions(codes)
+            hit = positions >= 0
+            indptr = np.zeros(n_rows + 1, dtype=np.intp)
+            np.cumsum(hit.sum(axis=1), out=indptr[1:])
+            indices = positions[hit]
+            data = np.ones(indices.shape[0], dtype=np.uint8)
+            return csr_matrix((data, indices, indptr), shape=(n_rows, self.n_columns))
+
+        if out is None or out.shape[0] < n_rows or out.shape[1] != self.n_columns:
+            out = np.empty((n_rows, self.n_columns), dtype=np.uint8)
+        X = out[:n_rows]
+        codes_by_feature = np.ascontiguousarray(codes.T)
+        for (start, stop, block), feature_codes in zip(self._blocks, codes_by_feature):
+            X[:, start:stop] = np.take(block, feature_codes, axis=0)
+        return X
+
+    def transform_record(self, record):
+        # Camino rápido para una sola seta (formulario interactivo): diccionarios de
+        # Python en lugar de operaciones vectorizadas, que no compensan para 1 fila.
+        X = np.zeros((1, self.n_columns), dtype=np.uint8)
+        values = [record[f] for f in self.features] if isinstance(record, dict) else record
+        for lookup, code in zip(self._lookup, values):
+            position = lookup.get(code)
+            if position is not None:
+                X[0, position] = 1
+        return X
+
+    def transform(self, data, sparse=False, out=None):
+        return self.transform_codes(self.to_codes(data), sparse=sparse, out=out)
+
+    def to_frame(self, X):
+        # Los modelos de sklearn se entrenaron con un DataFrame y comprueban los
+        # nombres de columna; envolvemos la matriz sin copiarla.
+        import pandas as pd
+        return pd.DataFrame(X, columns=self.ohe_columns, copy=False)
+
+
+def _ascii_codes(values):
+    # 'U2' deja ver si el valor tiene más de un carácter (el segundo punto de código
+    # no es 0); los NaN se convierten en 'na' y quedan descartados.
+    wide = np.asarray(values, dtype='U2').view(np.uint32).reshape(-1, 2)
+    valid = (wide[:, 1] == 0) & (wide[:, 0] < _ASCII_LIMIT)
+    return np.where(valid, wide[:, 0], 0).astype(np.uint8)
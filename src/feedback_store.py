@@ -0,0 +1,193 @@
+import hashlib
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+
+
+# Almacén de comentarios de la app en SQLite (modo WAL), en lugar de añadirlos a
+# data/comentarios.txt y releer el archivo entero en cada recarga.
+#
+# - Las lecturas usan una conexión por hilo (cada sesión de Streamlit es un hilo) y,
+#   con WAL, no se bloquean mientras se escribe.
+# - Las escrituras pasan por un único hilo escritor que agrupa en una transacción
+#   todos los comentarios que llegan a la vez desde distintas sesiones.
+# - latest() pagina por id (WHERE id < ? ORDER BY id DESC LIMIT n), así que mostrar
+#   una página cuesta lo mismo haya 10 o 10 millones de comentarios.
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'comentarios.db')
+LEGACY_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'comentarios.txt')
+WRITE_BATCH_WAIT = 0.01
+MAX_WRITE_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS comentarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    creado REAL NOT NULL,
+    texto TEXT NOT NULL,
+    origen TEXT NOT NULL DEFAULT 'app'
+);
+CREATE INDEX IF NOT EXISTS comentarios_creado ON comentarios (creado);
+CREATE TABLE IF NOT EXISTS importaciones (
+    ruta TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    comentarios INTEGER NOT NULL,
+    importado REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS importaciones_sha256 ON importaciones (sha256);
+"""
+
+
+class FeedbackStore:
+    def __init__(self, path=DB_PATH, batch_wait=WRITE_BATCH_WAIT):
+        self.path = os.path.abspath(path)
+        self.batch_wait = batch_wait
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _reader(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def add(self, text, origin='app', wait=True):
+        # Encola un comentario. Con wait=True espera a que esté guardado y devuelve su id.
+        text = text.strip()
+        if not text:
+            raise ValueError("El comentario está vacío")
+        self._start_writer()
+        done = threading.Event()
+        item = {'text': text, 'origin': origin, 'created': time.time(), 'done': done, 'id': None, 'error': None}
+        self._queue.put(item)
+        if not wait:
+            return None
+        done.wait()
+        if item['error'] is not None:
+            raise item['error']
+        return item['id']
+
+    def latest(self, limit=10, before_id=None):
+        # Página de los comentarios más recientes: lista de (id, creado, texto). Para la
+        # página siguiente se pasa before_id = id del último de la página actual.
+        if before_id is None:
+            rows = self._reader().execute(
+                'SELECT id, creado, texto FROM comentarios ORDER BY id DESC LIMIT ?', (limit,))
+        else:
+            rows = self._reader().execute(
+                'SELECT id, creado, texto FROM comentarios WHERE id < ? ORDER BY id DESC LIMIT ?',
+                (before_id, limit))
+        return rows.fetchall()
+
+    def since(self, timestamp, limit=100):
+        # Comentarios creados desde 'timestamp' (segundos epoch), los más antiguos primero
+        return self._reader().execute(
+            'SELECT id, creado, texto FROM comentarios WHERE creado >= ? ORDER BY creado LIMIT ?',
+            (timestamp, limit)).fetchall()
+
+    def last_id(self):
+        # Con AUTOINCREMENT los ids no se reutilizan: sirve como total aproximado sin
+        # recorrer la tabla como haría COUNT(*)
+        row = self._reader().execute('SELECT MAX(id) FROM comentarios').fetchone()
+        return row[0] or 0
+
+    def import_text_file(self, path=LEGACY_PATH):
+        # Importa el comentarios.txt antiguo. Cada comentario termina en una línea que
+        # solo contiene '---' (así los escribía la app), de modo que un '---' dentro del
+        # texto no parte el comentario. Solo se insertan los comentarios que no estén ya
+        # guardados con origen 'comentarios.txt': si al archivo se le añade uno, se
+        # importa ese y no se duplican los anteriores. Devuelve cuántos se importaron
+        # (0 si el archivo no existe o no trae nada nuevo). El sha256 del contenido evita
+        # releer la tabla cuando el mismo archivo (o una copia en otra ruta) ya se importó.
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            raw = f.read()
+        path = os.path.abspath(path)
+        sha256 = hashlib.sha256(raw).hexdigest()
+        comments = [c.strip() for c in re.split(r'^---[ \t]*$', raw.decode('utf-8'), flags=re.M)]
+        comments = [c for c in comments if c]
+        created = os.path.getmtime(path)
+
+        with self._writer_lock, closing(self._connect()) as connection, connection:
+            if connection.execute('SELECT 1 FROM importaciones WHERE sha256 = ?', (sha256,)).fetchone():
+                return 0
+            # Se descuenta cada comentario ya importado una vez, así un texto repetido
+            # en el archivo se importa tantas veces como aparece
+            imported = Counter(text for text, in connection.execute(
+                "SELECT texto FROM comentarios WHERE origen = 'comentarios.txt'"))
+            new_comments = []
+            for comment in comments:
+                if imported[comment]:
+                    imported[comment] -= 1
+                else:
+                    new_comments.append(comment)
+            # El archivo no guarda fechas: todos reciben la fecha de modificación y
+            # conservan el orden por id
+            connection.executemany('INSERT INTO comentarios (creado, texto, origen) VALUES (?, ?, ?)',
+                                   [(created, c, 'comentarios.txt') for c in new_comments])
+            connection.execute('INSERT OR REPLACE INTO importaciones VALUES (?, ?, ?, ?)',
+                               (path, sha256, len(comments), time.time()))
+        return len(new_comments)
+
+    def _start_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name='feedback-writer', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            # Pequeña espera para juntar en una transacción lo que llegue a la vez
+            if self.batch_wait:
+                time.sleep(self.batch_wait)
+            while len(batch) < MAX_WRITE_BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                with self._writer_lock, connection:
+                    for item in batch:
+                        cursor = connection.execute(
+                            'INSERT INTO comentarios (creado, texto, origen) VALUES (?, ?, ?)',
+                            (item['created'], item['text'], item['origin']))
+                        item['id'] = cursor.lastrowid
+            except sqlite3.Error as e:
+                for item in batch:
+                    item['id'], item['error'] = None, e
+            for item in batch:
+                item['done'].set()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_feedback_store(path=DB_PATH, import_legacy=True):
+    # Un almacén por base de datos y proceso. La primera vez importa comentarios.txt
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = FeedbackStore(path)
+            if import_legacy:
+                store.import_text_file(os.path.join(os.path.dirname(path), 'comentarios.txt'))
+            _stores[path] = store
+        return store
@@ -0,0 +1,273 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+
+# CLI para volver a puntuar archivos históricos (CSV o Parquet con las columnas de
+# ejemplo_setas.csv) en paralelo:
+#
+#   bin/fungiscan-score datos/*.csv --workers 8 --output-dir puntuados/
+#
+# Cada archivo se divide en bloques (rangos de bytes alineados a líneas para CSV,
+# grupos de filas para Parquet) que se puntúan en un ProcessPoolExecutor. Cada
+# proceso carga el modelo una sola vez al arrancar. Los resultados se escriben en
+# orden, con la columna 'predicción' añadida.
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+PREDICTION_COLUMN = 'predicción'
+
+_worker_bundle = None
+_worker_cache = None
+_worker_translator = None
+
+
+def _init_worker(models_folder, version):
+    # Se ejecuta una vez por proceso: carga los artefactos y los deja en memoria
+    global _worker_bundle, _worker_cache, _worker_translator
+    from batch_prediction import PredictionCache
+    from ingest import LabelTranslator
+    from model_registry import ModelRegistry, register_tree_version
+    registry = ModelRegistry()
+    register_tree_version(registry, models_folder=models_folder, default=True)
+    _worker_bundle = registry.get(version)
+    # Las combinaciones ya vistas por este proceso en otros bloques no se vuelven a predecir
+    _worker_cache = PredictionCache()
+    _worker_translator = LabelTranslator()
+
+
+def _score_frame(df):
+    # Devuelve el DataFrame con la predicción y el número de valores inválidos
+    from batch_prediction import score_codes
+    from ingest import ValidationReport
+    bundle = _worker_bundle
+    # Se aceptan códigos o etiquetas en español; los valores inválidos cuentan como
+    # desconocidos
+    report = ValidationReport(bundle.encoder.features)
+    codes = _worker_translator.translate_frame(df, report)
+    # Cada combinación distinta se predice una vez. Las celdas vacías se marginalizan
+    # y la fila se queda con el peor caso
+    df[PREDICTION_COLUMN] = score_codes(bundle.predictor, codes, bundle.label_encoder, bundle.encoder,
+                                        cache=_worker_cache).labels
+    return df, len(report)
+
+
+def _score_csv_range(path, start, end, columns, dtypes):
+    # Los CSV de setas no tienen campos entre comillas con saltos de línea, así que
+    # cualquier rango que empiece y acabe en un salto de línea contiene filas completas.
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=dtypes)
+    df, invalid = _score_frame(df)
+    labels = df[PREDICTION_COLUMN].astype(str).to_numpy()
+
+    # Volver a serializar con to_csv es lo más lento del proceso; en su lugar se añade
+    # la predicción al final de cada línea original. Si hay líneas en blanco (que
+    # read_csv ignora) el recuento no cuadra y se usa to_csv, igual que si el archivo
+    # ya traía una columna 'predicción': se sustituye en su sitio, como en Parquet.
+    lines = [line.rstrip(b'\r') for line in data.split(b'\n')]
+    lines = [line for line in lines if line]
+    if len(lines) != len(df) or PREDICTION_COLUMN in columns:
+        return len(df), invalid, df.to_csv(index=False, header=False).encode('utf-8')
+    suffixes = [b',' + label.encode('utf-8') + b'\n' for label in labels]
+    return len(df), invalid, b''.join(line + suffix for line, suffix in zip(lines, suffixes))
+
+
+def _score_parquet_row_groups(path, row_groups):
+    import pyarrow.parquet as pq
+    df = pq.ParquetFile(path).read_row_groups(row_groups).to_pandas()
+    df, invalid = _score_frame(df)
+    return len(df), invalid, df
+
+
+def csv_byte_ranges(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    # Rangos [inicio, fin) de ~chunk_bytes que empiezan justo después de un salto de línea
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        f.readline()  # cabecera
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parquet_row_group_batches(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    # Agrupa row groups consecutivos hasta ~chunk_bytes (tamaño sin comprimir)
+    import pyarrow.parquet as pq
+    metadata = pq.ParquetFile(path).metadata
+    batches, current, current_bytes = [], [], 0
+    for i in range(metadata.num_row_groups):
+        current.append(i)
+        current_bytes += metadata.row_group(i).total_byte_size
+        if current_bytes >= chunk_bytes:
+            batches.append(current)
+            current, current_bytes = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _output_path(path, output_dir, suffix):
+    name, extension = os.path.splitext(os.path.basename(path))
+    return os.path.join(output_dir or os.path.dirname(path) or '.', f"{name}{suffix}{extension}")
+
+
+class _Progress:
+    def __init__(self, total_tasks, quiet):
+        self.total_tasks = total_tasks
+        self.quiet = quiet
+        self.done_tasks = 0
+        self.rows = 0
+        self.invalid = 0
+        self.start = time.perf_counter()
+
+    def update(self, rows, invalid=0):
+        self.done_tasks += 1
+        self.rows += rows
+        self.invalid += invalid
+        if not self.quiet:
+            elapsed = time.perf_counter() - self.start
+            print(f"\r[fungiscan-score] bloques {self.done_tasks}/{self.total_tasks}  "
+                  f"filas {self.rows:,}  {self.rows / max(elapsed, 1e-9):,.0f} filas/s",
+                  end='', file=sys.stderr, flush=True)
+
+
+def _run_ordered(executor, tasks, write, progress, max_pending):
+    # Envía como mucho max_pending bloques a la vez y escribe los resultados en el
+    # orden original según van estando disponibles, así la memoria no depende del
+    # tamaño del archivo.
+    pending = {}
+    ready = {}
+    next_to_submit = 0
+    next_to_write = 0
+    while next_to_write < len(tasks):
+        while next_to_submit < len(tasks) and len(pending) + len(ready) < max_pending:
+            func, args = tasks[next_to_submit]
+            pending[executor.submit(func, *args)] = next_to_submit
+            next_to_submit += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            rows, invalid, result = future.result()
+            progress.update(rows, invalid)
+            ready[index] = result
+        while next_to_write in ready:
+            write(ready.pop(next_to_write))
+            next_to_write += 1
+
+
+def score_file(path, executor, output_dir=None, suffix='_puntuado', chunk_bytes=DEFAULT_CHUNK_BYTES,
+               max_pending=8, quiet=False):
+    from feature_encoder import STREAMLIT_FEATURES
+    output = _output_path(path, output_dir, suffix)
+    is_parquet = path.lower().endswith(('.parquet', '.pq'))
+
+    if is_parquet:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = pq.ParquetFile(path).schema_arrow.names
+    else:
+        columns = list(pd.read_csv(path, nrows=0).columns)
+    missing = [f for f in STREAMLIT_FEATURES if f not in columns]
+    if missing:
+        raise ValueError(f"{path}: faltan columnas: {', '.join(missing)}")
+
+    # Si el archivo ya trae una columna 'predicción' (p. ej. al volver a puntuar una
+    # salida anterior) se sustituye en su sitio; si no, se añade al final
+    if is_parquet:
+        tasks = [(_score_parquet_row_groups, (path, batch)) for batch in parquet_row_group_batches(path, chunk_bytes)]
+        progress = _Progress(len(tasks), quiet)
+        # El esquema de salida es el de entrada con la predicción como texto: así un
+        # primer bloque vacío no la deja como tipo null, y un archivo sin filas se
+        # escribe igualmente con su esquema
+        schema = pq.ParquetFile(path).schema_arrow
+        prediction_field = pa.field(PREDICTION_COLUMN, pa.string())
+        if PREDICTION_COLUMN in columns:
+            schema = schema.set(schema.get_field_index(PREDICTION_COLUMN), prediction_field)
+        else:
+            schema = schema.append(prediction_field)
+        writer = pq.ParquetWriter(output, schema)
+
+        def write(df):
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+
+        try:
+            _run_ordered(executor, tasks, write, progress, max_pending)
+        finally:
+            writer.close()
+    else:
+        # Las demás columnas se leen como texto para que, si hay que volver a escribir
+        # el bloque con to_csv, salgan tal cual venían
+        dtypes = dict({c: str for c in columns}, **{f: 'category' for f in STREAMLIT_FEATURES})
+        tasks = [(_score_csv_range, (path, start, end, columns, dtypes)) for start, end in csv_byte_ranges(path, chunk_bytes)]
+        progress = _Progress(len(tasks), quiet)
+        output_columns = columns if PREDICTION_COLUMN in columns else columns + [PREDICTION_COLUMN]
+        with open(output, 'wb') as f:
+            f.write(pd.DataFrame(columns=output_columns).to_csv(index=False).encode('utf-8'))
+            _run_ordered(executor, tasks, f.write, progress, max_pending)
+
+    if not quiet:
+        print(file=sys.stderr)
+    if progress.invalid:
+        print(f"Aviso: {path} tiene {progress.invalid:,} valores que no son ni códigos ni etiquetas válidas; "
+              f"esas características se trataron como desconocidas", file=sys.stderr)
+    return output, progress.rows, time.perf_counter() - progress.start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='fungiscan-score',
+        description="Puntúa archivos CSV o Parquet de setas en paralelo y añade la columna 'predicción'.")
+    parser.add_argument('inputs', nargs='+', help="Archivos o patrones glob (*.csv, *.parquet)")
+    parser.add_argument('-o', '--output-dir', help="Carpeta de salida (por defecto, junto a cada archivo)")
+    parser.add_argument('--suffix', default='_puntuado', help="Sufijo del archivo de salida")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-mb', type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024),
+                        help="Tamaño aproximado de cada bloque en MB")
+    parser.add_argument('--models-folder', default=os.path.join(os.path.dirname(__file__), '..', 'models'))
+    parser.add_argument('--model-version', default=None, help="Versión registrada del modelo")
+    parser.add_argument('-q', '--quiet', action='store_true', help="No mostrar el progreso")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for pattern in args.inputs:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    chunk_bytes = max(1, int(args.chunk_mb * 1024 * 1024))
+    total_rows = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.models_folder, args.model_version)) as executor:
+        for path in paths:
+            try:
+                output, rows, seconds = score_file(path, executor, args.output_dir, args.suffix, chunk_bytes,
+                                                   max_pending=2 * args.workers, quiet=args.quiet)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            total_rows += rows
+            print(f"{path} -> {output}: {rows:,} filas en {seconds:.2f} s ({rows / max(seconds, 1e-9):,.0f} filas/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Total: {len(paths)} archivos, {total_rows:,} filas en {elapsed:.2f} s "
+          f"({total_rows / max(elapsed, 1e-9):,.0f} filas/s con {args.workers} procesos)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
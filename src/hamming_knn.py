@@ -0,0 +1,159 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+
+# KNN para las matrices One-Hot de setas. Con columnas 0/1 la distancia euclídea al
+# cuadrado es exactamente la distancia de Hamming entre filas, así que cada fila se
+# guarda como bits empaquetados en palabras uint64 (90 columnas = 2 palabras) y la
+# distancia es XOR + popcount, sin floats.
+#
+# Los vecinos se ordenan una sola vez hasta max_neighbors y de esa ordenación salen
+# las predicciones para cualquier k <= max_neighbors (predict_for_ks). El modelo
+# recuerda los vecinos de la última consulta, así que predict y predict_proba sobre
+# la misma matriz no vuelven a calcular distancias. En una búsqueda de n_neighbors
+# con optimize_model_with_gridsearch cada fold se entrena y ordena una sola vez para
+# todos los k (scores_for_ks).
+#
+# No es un sustituto exacto de KNeighborsClassifier: las distancias son las mismas,
+# pero cuando varios vecinos empatan en distancia en el puesto k, aquí se eligen por
+# orden en el conjunto de entrenamiento y en sklearn según su algoritmo de búsqueda
+# (árbol o fuerza bruta, sin un orden definido). Con las setas, donde los empates
+# son frecuentes, las predicciones coinciden en ~99.9% de los casos para k=1..30
+# (ver benchmarks/bench_hamming_knn.py).
+DEFAULT_MAX_NEIGHBORS = 30
+DEFAULT_BATCH_SIZE = 256
+
+
+class HammingKNNClassifier(ClassifierMixin, BaseEstimator):
+    def __init__(self, n_neighbors=5, max_neighbors=DEFAULT_MAX_NEIGHBORS, batch_size=DEFAULT_BATCH_SIZE):
+        self.n_neighbors = n_neighbors
+        self.max_neighbors = max_neighbors
+        self.batch_size = batch_size
+
+    def fit(self, X, y):
+        bits = _as_bits(X)
+        self.n_features_in_ = bits.shape[1]
+        if hasattr(X, 'columns'):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.classes_, self._y = np.unique(np.asarray(y), return_inverse=True)
+        self._packed = pack_rows(bits)
+        self._last_neighbors = None
+        return self
+
+    def __getstate__(self):
+        # Los vecinos de la última consulta no se guardan con el modelo
+        return dict(super().__getstate__(), _last_neighbors=None)
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        n_neighbors = n_neighbors or self.n_neighbors
+        distances, indices = self._sorted_neighbors(X, n_neighbors)
+        distances, indices = distances[:, :n_neighbors], indices[:, :n_neighbors]
+        # Misma escala que KNeighborsClassifier (euclídea): sqrt de la distancia de Hamming
+        return (np.sqrt(distances), indices) if return_distance else indices
+
+    def predict(self, X):
+        return self.predict_for_ks(X, [self.n_neighbors])[self.n_neighbors]
+
+    def predict_proba(self, X):
+        votes = self._votes(X, [self.n_neighbors])[0]
+        return votes / self.n_neighbors
+
+    def predict_for_ks(self, X, ks):
+        # {k: predicciones} para varios k con una sola búsqueda de vecinos
+        ks = list(ks)
+        return {k: self.classes_[np.argmax(votes, axis=1)] for k, votes in zip(ks, self._votes(X, ks))}
+
+    def scores_for_ks(self, X, y, ks, scorer):
+        # {k: scorer(modelo con n_neighbors=k, X, y)} con una sola búsqueda de vecinos:
+        # se ordenan hasta max(ks) y cada puntuación los reutiliza. Es lo que usa
+        # optimize_model_with_gridsearch cuando la cuadrícula solo cambia n_neighbors.
+        self._sorted_neighbors(X, max(ks))
+        n_neighbors = self.n_neighbors
+        try:
+            scores = {}
+            for k in ks:
+                self.n_neighbors = k
+                scores[k] = scorer(self, X, y)
+            return scores
+        finally:
+            self.n_neighbors = n_neighbors
+
+    def _votes(self, X, ks):
+        # Votos por clase para cada k: cumsum de los votos de los vecinos ordenados.
+        # argmax se queda con la primera clase en caso de empate, como sklearn.
+        _, indices = self._sorted_neighbors(X, max(ks))
+        one_hot = np.zeros(indices.shape + (len(self.classes_),), dtype=np.int32)
+        np.put_along_axis(one_hot, self._y[indices][..., None], 1, axis=2)
+        cumulative = one_hot.cumsum(axis=1)
+        return [cumulative[:, k - 1] for k in ks]
+
+    def _sorted_neighbors(self, X, n_neighbors):
+        if n_neighbors > len(self._y):
+            raise ValueError(f"n_neighbors={n_neighbors} es mayor que el número de filas de entrenamiento "
+                             f"({len(self._y)})")
+        depth = min(max(n_neighbors, self.max_neighbors), len(self._y))
+        query = pack_rows(_as_bits(X, self.n_features_in_))
+        cached = self._last_neighbors
+        if cached is not None and cached[2].shape[1] >= n_neighbors and np.array_equal(cached[0], query):
+            return cached[1:]
+
+        distances = np.empty((len(query), depth), dtype=np.int64)
+        indices = np.empty((len(query), depth), dtype=np.int64)
+        n_train = len(self._y)
+        for start in range(0, len(query), self.batch_size):
+            batch = hamming_distances(query[start:start + self.batch_size], self._packed)
+            # Clave única distancia * n + índice: una sola ordenación da el orden por
+            # distancia con empates resueltos por índice
+            keys = batch.astype(np.int64) * n_train + np.arange(n_train)
+            if depth < n_train:
+                keys = np.partition(keys, depth - 1, axis=1)[:, :depth]
+            keys.sort(axis=1)
+            distances[start:start + len(keys)] = keys // n_train
+            indices[start:start + len(keys)] = keys % n_train
+
+        self._last_neighbors = (query, distances, indices)
+        return distances, indices
+
+
+def pack_rows(bits):
+    # (n, n_columnas) de 0/1 -> (n, n_palabras) uint64, cada fila en palabras de 64 bits
+    packed = np.packbits(bits, axis=1)
+    n_bytes = -(-packed.shape[1] // 8) * 8
+    if packed.shape[1] != n_bytes:
+        packed = np.pad(packed, ((0, 0), (0, n_bytes - packed.shape[1])))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def hamming_distances(query, train):
+    # (n_consultas, n_palabras) x (n_train, n_palabras) -> (n_consultas, n_train)
+    # acumulando XOR + popcount palabra a palabra para no crear el cubo 3D
+    distances = np.zeros((len(query), len(train)), dtype=np.uint16)
+    for w in range(query.shape[1]):
+        distances += _popcount(query[:, w, None] ^ train[None, :, w])
+    return distances
+
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(words):
+        return np.bitwise_count(words)
+else:
+    _POPCOUNT_LUT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        # numpy < 2.0: popcount por bytes con una tabla de 256 entradas
+        return _POPCOUNT_LUT[words[..., None].view(np.uint8)].sum(axis=-1, dtype=np.uint16)
+
+
+def _as_bits(X, n_features=None):
+    if hasattr(X, 'toarray'):
+        X = X.toarray()
+    bits = np.asarray(X)
+    if bits.ndim != 2:
+        raise ValueError(f"Se esperaba una matriz 2D, no de forma {bits.shape}")
+    if bits.dtype != bool:
+        if not np.isin(bits, (0, 1)).all():
+            raise ValueError("HammingKNNClassifier necesita una matriz binaria (One-Hot) de 0/1")
+        bits = bits.astype(bool)
+    if n_features is not None and bits.shape[1] != n_features:
+        raise ValueError(f"Se esperaban {n_features} columnas, no {bits.shape[1]}")
+    return bits
@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+from lookup_table import LookupTable
+from model_registry import ModelBundle
+
+
+# Camino de inferencia mínimo: solo NumPy y artefactos sin pickle. La carpeta de la
+# tabla de consulta (table.npy, header.json, tree.npz) tiene todo lo necesario para
+# predecir salvo las etiquetas de clase y las columnas OHE, que viven en los .pkl de
+# sklearn/joblib. encoding.json guarda esas dos listas (y el SHA-256 de los .pkl de
+# los que salieron), así que se puede puntuar una seta sin importar sklearn, joblib
+# ni pandas:
+#
+#   bundle = load_bundle()
+#   bundle.label_encoder.inverse_transform(bundle.predictor.predict_record(registro))
+#
+# El registro de modelos usa este camino cuando encoding.json corresponde a los .pkl
+# actuales. encoding.json se genera junto con la tabla (la genera el registro al
+# cargar el árbol, o python src/lookup_table.py).
+ENCODING_FILE = 'encoding.json'
+LOOKUP_TABLE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'models', 'lookup_table')
+
+
+class LabelDecoder:
+    # Equivalente a un LabelEncoder ya entrenado (mismos classes_, transform e
+    # inverse_transform) construido a partir de la lista de clases
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def transform(self, labels):
+        labels = np.asarray(labels)
+        # classes_ está ordenado, como en LabelEncoder
+        indices = np.minimum(np.searchsorted(self.classes_, labels), len(self.classes_) - 1)
+        unknown = self.classes_[indices] != labels
+        if np.any(unknown):
+            raise ValueError(f"Etiquetas desconocidas: {np.unique(labels[unknown]).tolist()}")
+        return indices
+
+    def inverse_transform(self, y):
+        y = np.asarray(y)
+        if y.size and (y.min() < 0 or y.max() >= len(self.classes_)):
+            raise ValueError(f"Códigos de clase fuera de rango: {np.unique(y).tolist()}")
+        return self.classes_[y.astype(np.intp)]
+
+
+def save_encoding(folder, label_classes, ohe_columns, label_encoder_sha256=None, ohe_columns_sha256=None):
+    encoding = {
+        'version': 1,
+        'label_classes': [str(c) for c in label_classes],
+        'ohe_columns': [str(c) for c in ohe_columns],
+        'label_encoder_sha256': label_encoder_sha256,
+        'ohe_columns_sha256': ohe_columns_sha256,
+    }
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, ENCODING_FILE), 'w', encoding='utf-8') as f:
+        json.dump(encoding, f, indent=1)
+    return encoding
+
+
+def load_encoding(path):
+    # 'path' puede ser el propio encoding.json o la carpeta que lo contiene
+    if os.path.isdir(path):
+        path = os.path.join(path, ENCODING_FILE)
+    with open(path, encoding='utf-8') as f:
+        encoding = json.load(f)
+    if encoding.get('version') != 1:
+        raise ValueError(f"Versión de {ENCODING_FILE} no soportada: {encoding.get('version')}")
+    return encoding
+
+
+def bundle_from_encoding(encoding, predictor, features=STREAMLIT_FEATURES):
+    return ModelBundle(LabelDecoder(encoding['label_classes']),
+                       FeatureEncoder(encoding['ohe_columns'], features), predictor)
+
+
+def load_bundle(folder=LOOKUP_TABLE_FOLDER):
+    # ModelBundle listo para predecir a partir de la carpeta de la tabla de consulta,
+    # sin el registro ni los .pkl (para contenedores que solo copian esa carpeta)
+    return bundle_from_encoding(load_encoding(folder), LookupTable.load(folder))
+
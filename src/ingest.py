@@ -0,0 +1,152 @@
+import unicodedata
+
+import numpy as np
+
+from feature_encoder import STREAMLIT_FEATURES
+from mushroom_schema import FEATURE_MAPS, UNKNOWN_OPTION
+
+
+# Entrada de archivos subidos: cada columna puede traer el código de una letra ('x')
+# o la etiqueta en español del formulario ('Convexa'), sin distinguir mayúsculas,
+# tildes ni espacios al principio o al final. Igual que FeatureEncoder.codes_from_frame,
+# cada columna se factoriza (o se usan sus códigos si ya es categórica) y solo se
+# traducen los valores distintos; después un único indexado de NumPy lleva el código
+# a todas las filas.
+#
+# Un valor que no es ni un código ni una etiqueta de esa característica no se
+# convierte en una fila One-Hot vacía sin avisar: queda como desconocido (código 0,
+# se predice con el peor caso) y se cuenta en un ValidationReport, que guarda además
+# unos pocos ejemplos por columna con su fila y el valor.
+
+# Valores que significan "no lo sé": característica desconocida, sin error. Las celdas
+# vacías y lo que pandas lee como NaN ('NA', 'null'...) también.
+UNKNOWN_VALUES = ('', '?', UNKNOWN_OPTION)
+
+
+def normalize_label(value):
+    # Minúsculas, sin tildes y sin espacios alrededor: 'Marrón ' -> 'marron'
+    text = unicodedata.normalize('NFKD', str(value).strip().lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+class LabelTranslator:
+    def __init__(self, features=STREAMLIT_FEATURES, feature_maps=FEATURE_MAPS):
+        self.features = list(features)
+        # Por característica: valor -> código ASCII (0 = desconocido). Se guardan tanto
+        # los valores tal cual como normalizados, así lo habitual no pasa por normalize_label.
+        self._tables = []
+        for feature in self.features:
+            table = {}
+            for value in UNKNOWN_VALUES:
+                table[value] = table[normalize_label(value)] = 0
+            for label, code in feature_maps[feature].items():
+                for value in (label, code, normalize_label(label), normalize_label(code)):
+                    table[value] = ord(code)
+            self._tables.append(table)
+
+    def translate_values(self, j, values):
+        # Valores distintos de la característica j -> (códigos uint8, máscara de inválidos)
+        table = self._tables[j]
+        codes = np.zeros(len(values), dtype=np.uint8)
+        invalid = np.zeros(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            if value is None or value != value:
+                continue  # NaN: desconocida
+            code = table.get(value)
+            if code is None:
+                code = table.get(normalize_label(value))
+            if code is None:
+                invalid[i] = True
+            else:
+                codes[i] = code
+        return codes, invalid
+
+    def translate_frame(self, df, report=None, row_offset=0):
+        # Matriz (n_filas, n_características) de códigos ASCII en uint8, como
+        # FeatureEncoder.to_codes. Los valores inválidos se anotan en 'report' con el
+        # índice de fila row_offset + posición en df.
+        import pandas as pd
+        codes = np.empty((len(df), len(self.features)), dtype=np.uint8)
+        bad_rows = None
+        for j, feature in enumerate(self.features):
+            column = df[feature]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                value_codes = column.cat.codes.to_numpy()
+                uniques = column.cat.categories.to_numpy()
+            else:
+                value_codes, uniques = pd.factorize(column)
+            uniques = np.asarray(uniques, dtype=object)
+            table, invalid = self.translate_values(j, uniques.tolist())
+            # El código -1 (NaN) cae en el último elemento: desconocida y válida
+            codes[:, j] = np.append(table, np.uint8(0))[value_codes]
+            if report is not None and invalid.any():
+                bad = np.append(invalid, False)[value_codes]
+                bad_rows = bad if bad_rows is None else bad_rows | bad
+                rows = np.flatnonzero(bad)
+                report.add(feature, rows + row_offset, uniques[value_codes[rows]])
+        if bad_rows is not None:
+            report.add_rows_with_errors(int(bad_rows.sum()))
+        return codes
+
+
+# Ejemplos (fila y valor) que ValidationReport guarda de cada columna
+MAX_EXAMPLES_PER_COLUMN = 20
+
+
+class ValidationReport:
+    # Errores de validación de un archivo: por columna, el número de valores inválidos
+    # y las primeras max_examples filas (int64) con su valor como ejemplo. Lo que ocupa
+    # no depende del número de errores: una columna entera mal escrita guarda igual
+    # max_examples ejemplos. Las filas son las filas de datos del archivo, desde 0 y sin contar
+    # la cabecera.
+    def __init__(self, features=STREAMLIT_FEATURES, max_examples=MAX_EXAMPLES_PER_COLUMN):
+        self.features = list(features)
+        self.max_examples = max_examples
+        self._counts = {}
+        self._examples = []
+        self._n_examples = {}
+        self._rows_with_errors = 0
+
+    def __len__(self):
+        return sum(self._counts.values())
+
+    def add(self, column, rows, values):
+        # Filas (ascendentes) de 'column' con un valor inválido en un bloque
+        if not len(rows):
+            return
+        self._counts[column] = self._counts.get(column, 0) + len(rows)
+        room = self.max_examples - self._n_examples.get(column, 0)
+        if room > 0:
+            self._examples.append((column, np.asarray(rows[:room], dtype=np.int64),
+                                   np.asarray(values[:room], dtype=object)))
+            self._n_examples[column] = self._n_examples.get(column, 0) + min(room, len(rows))
+
+    def add_rows_with_errors(self, n):
+        # Filas de un bloque con al menos un valor inválido (los bloques no se solapan)
+        self._rows_with_errors += n
+
+    def counts(self):
+        # {columna: número de valores inválidos}, en el orden de las características
+        return {f: self._counts[f] for f in self.features if f in self._counts}
+
+    def rows_with_errors(self):
+        return self._rows_with_errors
+
+    def to_frame(self, limit=None):
+        # DataFrame de ejemplos (fila, columna, valor) ordenado por fila y columna;
+        # 'limit' corta las primeras filas del informe
+        import pandas as pd
+        if not self._examples:
+            return pd.DataFrame({'fila': np.zeros(0, dtype=np.int64), 'columna': [], 'valor': []})
+        rows = np.concatenate([rows for _, rows, _ in self._examples])
+        column_index = np.concatenate([np.full(len(rows), self.features.index(column), dtype=np.int64)
+                                       for column, rows, _ in self._examples])
+        values = np.concatenate([values for _, _, values in self._examples])
+        order = np.lexsort((column_index, rows))
+        if limit is not None:
+            order = order[:limit]
+        return pd.DataFrame({
+            'fila': rows[order],
+            'columna': pd.Categorical.from_codes(column_index[order], self.features),
+            'valor': values[order],
+        })
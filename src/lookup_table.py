@@ -0,0 +1,255 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+# Tabla de consulta exhaustiva del árbol. El árbol solo pregunta "¿código == letra?"
+# sobre unas pocas características, así que cada característica usada se reduce a
+# sus letras evaluadas más un grupo "otro" (cualquier otro código, incluido el
+# desconocido). El producto cartesiano reducido se enumera una vez y se guarda la
+# hoja de cada combinación, indexada por un entero de base mixta:
+#
+#   clave = sum(grupo_j * stride_j)
+#
+# Al servir, predecir es calcular la clave e indexar un array (memory-mapped) sin
+# cargar el modelo.
+#
+# La carpeta guarda también el árbol compilado (tree.npz), que se usa para predecir
+# con características desconocidas: ahí la tabla no sirve, porque el grupo "otro"
+# significa "ninguna de las letras evaluadas", no "cualquier letra". Junto a la tabla
+# se escribe además encoding.json (ver inference.py).
+#
+# models/lookup_table no está en el repositorio: cambia con cada reentrenamiento. El
+# registro de modelos la genera al cargar el árbol si falta o no corresponde al .pkl
+# (ver model_registry.build_tree_bundle), y también se puede generar con
+# python src/lookup_table.py.
+TABLE_FILE = 'table.npy'
+HEADER_FILE = 'header.json'
+TREE_FILE = 'tree.npz'
+
+
+class LookupTable:
+    def __init__(self, table, header, tree=None):
+        self.table = table
+        self.header = header
+        self.tree = tree
+        self.features = header['features']
+        self.classes = np.asarray(header['classes'])
+        self.leaf_class = np.asarray(header['leaf_class'], dtype=np.intp)
+        self.leaf_proba = np.asarray(header['leaf_proba'], dtype=np.float64)
+
+        # Para cada característica usada: letra -> grupo (0 = "otro") como tabla de 256
+        # entradas para el camino vectorizado y como diccionario para una sola fila.
+        self.used = [self.features.index(f) for f in header['used_features']]
+        self.strides = np.asarray(header['strides'], dtype=np.int64)
+        self._bucket_luts = np.zeros((len(self.used), 256), dtype=np.int64)
+        self._bucket_dicts = []
+        for i, letters in enumerate(header['tested_codes']):
+            for bucket, letter in enumerate(letters, start=1):
+                self._bucket_luts[i, ord(letter)] = bucket * self.strides[i]
+            self._bucket_dicts.append({letter: bucket * int(self.strides[i])
+                                       for bucket, letter in enumerate(letters, start=1)})
+
+    @classmethod
+    def build(cls, compiled_tree, model_sha256=None):
+        # Características y letras que el árbol evalúa realmente
+        internal = ~compiled_tree.is_leaf
+        tested = {}
+        for j, code in zip(compiled_tree.feature[internal], compiled_tree.code[internal]):
+            tested.setdefault(int(j), set()).add(chr(code))
+        used = sorted(tested)
+        tested_codes = [sorted(tested[j]) for j in used]
+        radices = [len(letters) + 1 for letters in tested_codes]
+        strides = np.cumprod([1] + radices[:-1]).tolist()
+        n_keys = int(np.prod(radices))
+
+        # Enumeramos todas las claves: cada grupo se representa con su letra y el
+        # grupo "otro" con el código 0, que ninguna división reconoce.
+        keys = np.arange(n_keys, dtype=np.int64)
+        codes = np.zeros((n_keys, len(compiled_tree.features)), dtype=np.uint8)
+        for j, letters, radix, stride in zip(used, tested_codes, radices, strides):
+            representatives = np.array([0] + [ord(c) for c in letters], dtype=np.uint8)
+            codes[:, j] = representatives[(keys // stride) % radix]
+
+        leaves = compiled_tree.apply_codes(codes)
+        # Guardamos solo las hojas que aparecen, renumeradas para que quepan en uint8/uint16
+        leaf_nodes, table = np.unique(leaves, return_inverse=True)
+        dtype = np.uint8 if len(leaf_nodes) <= 256 else np.uint16
+        header = {
+            'version': 1,
+            'features': list(compiled_tree.features),
+            'used_features': [compiled_tree.features[j] for j in used],
+            'tested_codes': tested_codes,
+            'radices': radices,
+            'strides': strides,
+            'classes': compiled_tree.classes.tolist(),
+            'leaf_class': compiled_tree.leaf_class[leaf_nodes].tolist(),
+            'leaf_proba': compiled_tree.value[leaf_nodes].tolist(),
+            'model_sha256': model_sha256,
+        }
+        return cls(table.astype(dtype), header, compiled_tree)
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, TABLE_FILE), self.table)
+        with open(os.path.join(folder, HEADER_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.header, f, indent=1)
+        if self.tree is not None:
+            self.tree.save(os.path.join(folder, TREE_FILE))
+
+    @classmethod
+    def load(cls, folder, mmap=True):
+        with open(os.path.join(folder, HEADER_FILE), encoding='utf-8') as f:
+            header = json.load(f)
+        table = np.load(os.path.join(folder, TABLE_FILE), mmap_mode='r' if mmap else None)
+        tree = None
+        if os.path.exists(os.path.join(folder, TREE_FILE)):
+            from compiled_tree import CompiledTree
+            tree = CompiledTree.load(os.path.join(folder, TREE_FILE))
+        return cls(table, header, tree)
+
+    def is_built_from(self, model_path):
+        # Comprueba que la tabla corresponde al modelo actual y no a uno anterior
+        return self.header.get('model_sha256') == file_sha256(model_path)
+
+    def keys(self, codes):
+        codes = np.asarray(codes, dtype=np.uint8)
+        keys = np.zeros(codes.shape[0], dtype=np.int64)
+        for i, j in enumerate(self.used):
+            keys += self._bucket_luts[i][codes[:, j]]
+        return keys
+
+    def predict_codes(self, codes):
+        return self.classes[self.leaf_class[self.table[self.keys(codes)]]]
+
+    def predict_proba_codes(self, codes):
+        return self.leaf_proba[self.table[self.keys(codes)]]
+
+    def apply_codes(self, codes):
+        # Nodo hoja del árbol compilado de cada fila, como CompiledTree.apply_codes pero
+        # con la tabla. Un código desconocido cuenta como "ninguna de las letras evaluadas".
+        return self._leaf_nodes()[self.table[self.keys(codes)]]
+
+    def _leaf_nodes(self):
+        # La tabla guarda las hojas alcanzables renumeradas en orden de nodo (np.unique en
+        # build). Se recuperan recorriendo el árbol con las reglas de la enumeración: a la
+        # izquierda siempre se puede ir (el grupo "otro"), a la derecha solo si el camino
+        # no fijó ya otra letra para esa característica ni descartó esta.
+        cached = getattr(self, '_leaf_nodes_cache', None)
+        if cached is not None:
+            return cached
+        tree = self._require_tree()
+        leaves = []
+        stack = [(0, {})]
+        while stack:
+            node, constraints = stack.pop()
+            if tree.is_leaf[node]:
+                leaves.append(node)
+                continue
+            j, letter = tree._feature_list[node], tree._char_list[node]
+            state = constraints.get(j, frozenset())
+            if isinstance(state, str):
+                stack.append((tree._right_list[node] if state == letter else tree._left_list[node], constraints))
+                continue
+            stack.append((tree._left_list[node], {**constraints, j: state | {letter}}))
+            if letter not in state:
+                stack.append((tree._right_list[node], {**constraints, j: letter}))
+        leaves = np.unique(np.array(leaves, dtype=np.intp))
+        if len(leaves) != len(self.leaf_class) or not np.array_equal(tree.leaf_class[leaves], self.leaf_class):
+            raise ValueError("La tabla de consulta no corresponde a su árbol compilado")
+        self._leaf_nodes_cache = leaves
+        return leaves
+
+    def predict_record(self, record):
+        # Una sola seta como diccionario {característica: código} o tupla de códigos
+        if not isinstance(record, dict):
+            record = dict(zip(self.features, record))
+        key = 0
+        for feature, buckets in zip(self.header['used_features'], self._bucket_dicts):
+            key += buckets.get(record.get(feature), 0)
+        return self.classes[[self.leaf_class[self.table[key]]]]
+
+    def predict_partial_codes(self, codes, alphabets, poisonous_class):
+        return self._require_tree().predict_partial_codes(codes, alphabets, poisonous_class)
+
+    def predict_partial_record(self, record, alphabets, poisonous_class):
+        return self._require_tree().predict_partial_record(record, alphabets, poisonous_class)
+
+    def _require_tree(self):
+        if self.tree is None:
+            raise ValueError(f"La tabla de consulta no incluye {TREE_FILE}; vuelve a generarla con "
+                             f"python src/lookup_table.py")
+        return self.tree
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_lookup_table(folder, lookup_table, label_classes, ohe_columns, label_encoder_sha256=None,
+                       ohe_columns_sha256=None):
+    # Guarda la tabla y encoding.json (ver inference.py) en 'folder'. Se escribe en una
+    # carpeta temporal al lado y después se sustituye la anterior, así quien la lea
+    # a la vez (otro proceso de la app) nunca ve una tabla a medio escribir.
+    import shutil
+    import tempfile
+    from inference import save_encoding
+
+    folder = os.path.abspath(folder)
+    parent = os.path.dirname(folder)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(folder) + '.', dir=parent)
+    try:
+        lookup_table.save(tmp)
+        save_encoding(tmp, label_classes, ohe_columns, label_encoder_sha256, ohe_columns_sha256)
+        old = None
+        if os.path.exists(folder):
+            old = tempfile.mkdtemp(prefix=os.path.basename(folder) + '.old.', dir=parent)
+            os.replace(folder, os.path.join(old, 'tabla'))
+        os.replace(tmp, folder)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def generate_lookup_table(models_folder=None, output=None, model_file='best_decision_tree_model_streamlit.pkl',
+                          force=False):
+    # Genera la tabla del árbol de la app a partir de los .pkl si falta o no corresponde
+    # al modelo actual (o siempre, con force=True). La tabla no está en el repositorio:
+    # la genera el registro de modelos al arrancar la app, y esta función la deja lista
+    # para los scripts que leen la carpeta directamente. Devuelve la ruta de la carpeta.
+    import joblib
+    from compiled_tree import CompiledTree
+    from feature_encoder import FeatureEncoder
+
+    models_folder = models_folder or os.path.join(os.path.dirname(__file__), '..', 'models')
+    output = output or os.path.join(models_folder, 'lookup_table')
+    model_path = os.path.join(models_folder, model_file)
+    label_encoder_path = os.path.join(models_folder, 'label_encoder_y.pkl')
+    ohe_columns_path = os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl')
+    if not force and os.path.exists(os.path.join(output, HEADER_FILE)) and \
+            LookupTable.load(output).is_built_from(model_path):
+        return output
+    encoder = FeatureEncoder.from_file(ohe_columns_path)
+    lookup_table = LookupTable.build(CompiledTree.from_sklearn(joblib.load(model_path), encoder),
+                                     file_sha256(model_path))
+    # Etiquetas y columnas OHE sin pickle, para el camino de inferencia sin sklearn
+    write_lookup_table(output, lookup_table, joblib.load(label_encoder_path).classes_, encoder.ohe_columns,
+                       file_sha256(label_encoder_path), file_sha256(ohe_columns_path))
+    return output
+
+
+if __name__ == '__main__':
+    # Genera (o vuelve a generar) la tabla para el árbol de la app:
+    #   python src/lookup_table.py [carpeta_de_salida]
+    import sys
+
+    output = generate_lookup_table(output=sys.argv[1] if len(sys.argv) > 1 else None, force=True)
+    lookup_table = LookupTable.load(output)
+    print(f"Tabla de {len(lookup_table.table):,} combinaciones "
+          f"({len(lookup_table.used)} de {len(lookup_table.features)} características) guardada en {output}")
@@ -0,0 +1,243 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+
+# Instrumentación del camino de predicción: histogramas de latencia por etapa
+# (carga de artefactos, mapeo de etiquetas, codificación, predict,
+# inverse_transform, renderizado), tamaño de los lotes y filas por segundo.
+#
+#   metrics = get_metrics()
+#   with metrics.stage('predict'):
+#       ...
+#
+# Se exporta en formato de texto de Prometheus (to_prometheus) y como JSON
+# (dump_json, o periódicamente con start_periodic_dump). Cada etapa medida cuesta
+# alrededor de un microsegundo; con enabled=False stage() devuelve un objeto vacío y
+# no se mide nada. Variables de entorno que lee get_metrics():
+#
+#   FUNGISCAN_METRICS=0                 desactiva la instrumentación
+#   FUNGISCAN_METRICS_JSON=ruta.json    vuelca las métricas a ese archivo...
+#   FUNGISCAN_METRICS_INTERVAL=60       ...cada tantos segundos
+NAMESPACE = 'fungiscan'
+
+# Límites superiores de los buckets (segundos y filas)
+STAGE_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 10, 100, 1_000, 10_000, 50_000, 100_000, 1_000_000)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        # El último bucket es +Inf
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        # Aproximación por el límite superior del bucket donde cae el cuantil q
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        return {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else None,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in self.bounds] + ['+Inf'], counts)),
+        }
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    def __init__(self, enabled=True, namespace=NAMESPACE):
+        self.enabled = enabled
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._batch_rows = Histogram(BATCH_BUCKETS)
+        self._rows_total = 0
+        self._last_rows_per_second = 0.0
+        self._dump_thread = None
+        self.started = time.time()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        histogram = self._stages.get(name)
+        if histogram is None:
+            histogram = self._new_stage(name)
+        return _Timer(histogram)
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            (self._stages.get(name) or self._new_stage(name)).observe(seconds)
+
+    def record_batch(self, rows, seconds):
+        # Un lote de la predicción por archivo (o del servicio): tamaño y filas/s
+        if not self.enabled:
+            return
+        self._batch_rows.observe(rows)
+        with self._lock:
+            self._rows_total += rows
+            if seconds > 0:
+                self._last_rows_per_second = rows / seconds
+
+    def _new_stage(self, name):
+        with self._lock:
+            return self._stages.setdefault(name, Histogram(STAGE_BUCKETS))
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._batch_rows = Histogram(BATCH_BUCKETS)
+            self._rows_total = 0
+            self._last_rows_per_second = 0.0
+
+    def _state(self):
+        # Copia bajo el lock de lo que _new_stage y reset modifican desde otros hilos;
+        # snapshot y to_prometheus construyen la salida fuera del lock
+        with self._lock:
+            return (sorted(self._stages.items()), self._batch_rows, self._rows_total,
+                    self._last_rows_per_second)
+
+    def snapshot(self):
+        stages, batch_rows, rows_total, last_rows_per_second = self._state()
+        return {
+            'timestamp': time.time(),
+            'uptime_seconds': time.time() - self.started,
+            'enabled': self.enabled,
+            'stages': {name: histogram.snapshot() for name, histogram in stages},
+            'batch_rows': batch_rows.snapshot(),
+            'rows_total': rows_total,
+            'last_rows_per_second': last_rows_per_second,
+        }
+
+    def to_prometheus(self):
+        # Formato de texto de exposición de Prometheus (versión 0.0.4)
+        stages, batch_rows, rows_total, last_rows_per_second = self._state()
+        name = f'{self.namespace}_stage_seconds'
+        lines = [f'# HELP {name} Latencia de cada etapa de la predicción.', f'# TYPE {name} histogram']
+        for stage, histogram in stages:
+            lines.extend(_histogram_lines(name, histogram, f'stage="{stage}"'))
+
+        name = f'{self.namespace}_batch_rows'
+        lines += [f'# HELP {name} Filas por lote predicho.', f'# TYPE {name} histogram']
+        lines.extend(_histogram_lines(name, batch_rows, ''))
+
+        name = f'{self.namespace}_rows_total'
+        lines += [f'# HELP {name} Filas predichas en lotes.', f'# TYPE {name} counter',
+                  f'{name} {rows_total}']
+        name = f'{self.namespace}_last_batch_rows_per_second'
+        lines += [f'# HELP {name} Filas por segundo del último lote.', f'# TYPE {name} gauge',
+                  f'{name} {_format(last_rows_per_second)}']
+        return '\n'.join(lines) + '\n'
+
+    def dump_json(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def start_periodic_dump(self, path, interval=60.0):
+        # Hilo en segundo plano que vuelca las métricas a 'path' cada 'interval' segundos
+        if self._dump_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump_json(path)
+                except OSError:
+                    pass
+
+        self._dump_thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+        self._dump_thread.start()
+
+
+def _histogram_lines(name, histogram, labels):
+    with histogram._lock:
+        counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+    separator = ',' if labels else ''
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(histogram.bounds + (float('inf'),), counts):
+        cumulative += bucket_count
+        le = '+Inf' if bound == float('inf') else _format(bound)
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{le}"}} {cumulative}')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{name}_sum{suffix} {_format(total)}')
+    lines.append(f'{name}_count{suffix} {count}')
+    return lines
+
+
+def _format(value):
+    return repr(float(value))
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    # Instancia compartida por todo el proceso, configurada con las variables de entorno
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics(enabled=os.environ.get('FUNGISCAN_METRICS', '1') != '0')
+            dump_path = os.environ.get('FUNGISCAN_METRICS_JSON')
+            if dump_path and _metrics.enabled:
+                _metrics.start_periodic_dump(dump_path, float(os.environ.get('FUNGISCAN_METRICS_INTERVAL', 60)))
+        return _metrics
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+
+# Artefacto de modelo en un solo archivo, sin pickle: el predictor compilado (tabla de
+# consulta + árbol, árbol suelto o conjunto de árboles), las clases del LabelEncoder y
+# las columnas OHE. Se carga sin sklearn ni joblib y sin ejecutar código del archivo.
+#
+#   cabecera   MAGIC (8 bytes) | versión (uint32) | longitud del manifiesto (uint32)
+#              | SHA-256 del manifiesto (32 bytes)
+#   manifiesto JSON: tipo de predictor, clases, columnas, atributos y, para cada
+#              array, dtype, forma, posición, tamaño y SHA-256
+#   arrays     datos crudos en little-endian, cada uno alineado a ALIGNMENT bytes
+#
+# Al cargar se lee y valida la cabecera y el manifiesto (unos pocos KB) y los arrays se
+# mapean en memoria de solo lectura: no se copian, y varios procesos que abren el
+# mismo archivo comparten sus páginas a través de la caché de páginas del sistema.
+# El SHA-256 de cada array solo se comprueba con verify=True (hay que leer todo el
+# archivo); el del manifiesto y el tamaño del archivo se comprueban siempre.
+MAGIC = b'FUNGISCN'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+ARTIFACT_FILE = 'best_decision_tree_model_streamlit.fsm'
+MODELS_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+_HEADER = struct.Struct('<8sII32s')
+
+# Resultado de load_artifact: el manifiesto (con los SHA-256 de los .pkl de origen en
+# 'source') y el ModelBundle listo para predecir
+ModelArtifact = namedtuple('ModelArtifact', ['manifest', 'bundle'])
+
+
+def write_artifact(path, manifest, arrays):
+    # manifest: diccionario JSON; arrays: {nombre: ndarray}. Escribe en un temporal y
+    # lo renombra, así un proceso que esté cargando nunca ve un archivo a medias.
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise ValueError(f"El array '{name}' tiene dtype object y no se puede guardar sin pickle")
+        array = arrays[name] = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        entries[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+            'nbytes': array.nbytes,
+            'sha256': hashlib.sha256(array.tobytes()).hexdigest(),
+        }
+        offset = _align(offset + array.nbytes)
+
+    manifest = dict(manifest, format_version=FORMAT_VERSION, arrays=entries)
+    # La posición de los datos depende de la longitud del manifiesto, que a su vez
+    # incluye el tamaño total: se fija el relleno hasta que ambos cuadran
+    data_start = 0
+    while True:
+        manifest['data_offset'] = data_start
+        manifest['size'] = data_start + offset
+        encoded = json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        needed = _align(_HEADER.size + len(encoded))
+        if needed == data_start:
+            break
+        data_start = needed
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded), hashlib.sha256(encoded).digest()))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(manifest['size'])
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_artifact(path, verify=False):
+    # Devuelve (manifiesto, {nombre: array de solo lectura mapeado en memoria})
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"{path} no es un artefacto de modelo (archivo demasiado corto)")
+        magic, version, manifest_length, manifest_sha256 = _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un artefacto de modelo")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Versión de artefacto no soportada: {version} (se esperaba {FORMAT_VERSION})")
+        encoded = f.read(manifest_length)
+        if len(encoded) < manifest_length:
+            raise ValueError(f"{path} está truncado: falta parte del manifiesto")
+        if hashlib.sha256(encoded).digest() != manifest_sha256:
+            raise ValueError(f"El manifiesto de {path} está dañado (SHA-256 distinto)")
+        manifest = json.loads(encoded)
+        size = os.fstat(f.fileno()).st_size
+    if size != manifest['size']:
+        raise ValueError(f"{path} tiene {size} bytes y el manifiesto dice {manifest['size']}: archivo truncado")
+
+    data_start = manifest['data_offset']
+    buffer = np.memmap(path, dtype=np.uint8, mode='r') if manifest['arrays'] else None
+    arrays = {}
+    for name, entry in manifest['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        start = data_start + entry['offset']
+        array = np.frombuffer(buffer, dtype=dtype, count=entry['nbytes'] // dtype.itemsize, offset=start)
+        array = array.reshape(entry['shape'])
+        if verify and hashlib.sha256(buffer[start:start + entry['nbytes']]).hexdigest() != entry['sha256']:
+            raise ValueError(f"El array '{name}' de {path} está dañado (SHA-256 distinto)")
+        arrays[name] = array
+    return manifest, arrays
+
+
+def export_bundle(path, bundle, source=None):
+    # Guarda un ModelBundle cuyo predictor sea LookupTable, CompiledTree o
+    # CompiledEnsemble. 'source' son los SHA-256 de los .pkl de los que sale.
+    from compiled_ensemble import CompiledEnsemble
+    from compiled_tree import CompiledTree
+    from lookup_table import LookupTable
+
+    label_encoder, encoder, predictor = bundle
+    manifest = {
+        'label_classes': [str(c) for c in label_encoder.classes_],
+        'ohe_columns': [str(c) for c in encoder.ohe_columns],
+        'features': list(encoder.features),
+        'source': dict(source or {}),
+    }
+    arrays = {}
+    if isinstance(predictor, LookupTable):
+        manifest['predictor'] = 'lookup_table'
+        manifest['lookup_table'] = predictor.header
+        arrays['lookup_table.table'] = predictor.table
+        if predictor.tree is not None:
+            arrays.update(_tree_arrays(predictor.tree))
+    elif isinstance(predictor, CompiledTree):
+        manifest['predictor'] = 'tree'
+        arrays.update(_tree_arrays(predictor))
+    elif isinstance(predictor, CompiledEnsemble):
+        manifest['predictor'] = 'ensemble'
+        manifest['ensemble'] = {'combine': predictor.combine, 'scale': predictor.scale}
+        arrays.update({f'ensemble.{name}': getattr(predictor, name)
+                       for name in ('feature', 'code', 'children', 'value', 'roots', 'classes')})
+    else:
+        raise ValueError(f"Predictor no soportado: {type(predictor).__name__}")
+    return write_artifact(path, manifest, arrays)
+
+
+def load_artifact(path, verify=False, n_jobs=1):
+    # Solo NumPy: ni sklearn, ni joblib, ni pandas. n_jobs es para los conjuntos.
+    from compiled_tree import CompiledTree
+    from feature_encoder import FeatureEncoder
+    from inference import LabelDecoder
+    from lookup_table import LookupTable
+    from model_registry import ModelBundle
+
+    manifest, arrays = read_artifact(path, verify=verify)
+    kind = manifest.get('predictor')
+    features = manifest['features']
+    tree = None
+    if 'tree.feature' in arrays:
+        tree = CompiledTree(arrays['tree.feature'], arrays['tree.code'], arrays['tree.children'],
+                            arrays['tree.value'], arrays['tree.classes'], features)
+    if kind == 'lookup_table':
+        predictor = LookupTable(arrays['lookup_table.table'], manifest['lookup_table'], tree)
+    elif kind == 'tree':
+        predictor = tree
+    elif kind == 'ensemble':
+        from compiled_ensemble import CompiledEnsemble
+        predictor = CompiledEnsemble(*(arrays[f'ensemble.{name}'] for name in
+                                       ('feature', 'code', 'children', 'value', 'roots', 'classes')),
+                                     features, manifest['ensemble']['combine'], manifest['ensemble']['scale'],
+                                     n_jobs=n_jobs)
+    else:
+        raise ValueError(f"Tipo de predictor desconocido en {path}: {kind}")
+    bundle = ModelBundle(LabelDecoder(manifest['label_classes']),
+                         FeatureEncoder(manifest['ohe_columns'], features), predictor)
+    return ModelArtifact(manifest, bundle)
+
+
+def _tree_arrays(tree):
+    return {f'tree.{name}': getattr(tree, name) for name in ('feature', 'code', 'children', 'value', 'classes')}
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+if __name__ == '__main__':
+    # Exporta a un artefacto .fsm el árbol de la app (con su tabla de consulta) o un
+    # conjunto de árboles guardado con joblib:
+    #   python src/model_artifact.py [--model modelo.pkl] [--output salida.fsm] [--verify]
+    # El .fsm del árbol de la app no está en el repositorio: sus arrays son los de
+    # models/lookup_table, que se lee tal cual si corresponde al modelo.
+    import argparse
+    import joblib
+    from compiled_ensemble import CompiledEnsemble
+    from compiled_tree import CompiledTree
+    from feature_encoder import FeatureEncoder
+    from lookup_table import LookupTable, file_sha256
+    from model_registry import ModelBundle
+
+    parser = argparse.ArgumentParser(description="Exporta un modelo a un artefacto sin pickle")
+    parser.add_argument('--model', default=os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl'))
+    parser.add_argument('--output')
+    parser.add_argument('--verify', action='store_true', help="Comprobar el SHA-256 de todo el artefacto")
+    args = parser.parse_args()
+
+    label_encoder_path = os.path.join(MODELS_FOLDER, 'label_encoder_y.pkl')
+    ohe_columns_path = os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl')
+    model = joblib.load(args.model)
+    encoder = FeatureEncoder.from_file(ohe_columns_path)
+    model_sha256 = file_sha256(args.model)
+    table_folder = os.path.join(MODELS_FOLDER, 'lookup_table')
+    if hasattr(model, 'tree_') and os.path.exists(os.path.join(table_folder, 'header.json')) \
+            and LookupTable.load(table_folder).is_built_from(args.model):
+        predictor = LookupTable.load(table_folder, mmap=False)
+    elif hasattr(model, 'tree_'):
+        predictor = LookupTable.build(CompiledTree.from_sklearn(model, encoder), model_sha256)
+    else:
+        predictor = CompiledEnsemble.from_sklearn(model, encoder)
+    output = os.path.normpath(args.output or os.path.splitext(args.model)[0] + '.fsm')
+    export_bundle(output, ModelBundle(joblib.load(label_encoder_path), encoder, predictor), {
+        'model_sha256': model_sha256,
+        'label_encoder_sha256': file_sha256(label_encoder_path),
+        'ohe_columns_sha256': file_sha256(ohe_columns_path),
+    })
+    if args.verify:
+        load_artifact(output, verify=True)
+    print(f"Artefacto ({type(predictor).__name__}, {os.path.getsize(output):,} bytes) guardado en {output}")
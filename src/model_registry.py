@@ -0,0 +1,315 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+
+MODELS_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'models')
+DEFAULT_VERSION = 'arbol-decision'
+
+# Lo que necesitan la app, el servicio y la CLI para predecir
+ModelBundle = namedtuple('ModelBundle', ['label_encoder', 'encoder', 'predictor'])
+
+# Tiempo que tardó la última llamada a get() y qué artefactos tuvo que leer de disco.
+# En una recarga normal de Streamlit 'reloaded' debe estar vacío.
+LoadStats = namedtuple('LoadStats', ['version', 'seconds', 'reloaded'])
+
+
+def load_pickle(path):
+    import joblib
+    return joblib.load(path)
+
+
+def load_lookup_table(path):
+    from lookup_table import LookupTable
+    return LookupTable.load(path)
+
+
+def load_encoding(path):
+    from inference import load_encoding
+    return load_encoding(path)
+
+
+def load_model_artifact(path):
+    from model_artifact import load_artifact
+    return load_artifact(path)
+
+
+# Registro de modelos por proceso. Streamlit vuelve a ejecutar app.py en cada
+# interacción, pero los módulos importados se conservan, así que los artefactos se
+# cargan una vez por proceso y solo se vuelven a leer si cambia el archivo: primero
+# se compara el mtime/tamaño (una llamada a stat) y, si cambió, el SHA-256 del
+# contenido. Cada versión registrada tiene un nombre y puede convivir con otras.
+class ModelRegistry:
+    def __init__(self, check_interval=1.0):
+        # Como mucho se comprueban los archivos una vez cada check_interval segundos
+        # por versión; entre medias get() no toca el disco.
+        self.check_interval = check_interval
+        self._checked_at = {}
+        self._versions = {}
+        self._artifacts = {}
+        self._built = {}
+        self._lock = threading.RLock()
+        self.default_version = None
+        self.last_load = None
+        self.disk_loads = 0
+        self.cache_hits = 0
+
+    def register(self, name, artifacts, build, default=False):
+        # artifacts: {clave: (ruta, función_de_carga)}
+        # build(artifacts) construye el objeto final usando artifacts.load(clave) y
+        # artifacts.sha256(clave); solo se vigilan las claves que llegó a usar y las que
+        # comprobó con artifacts.exists(clave) sin encontrarlas (si aparecen, se reconstruye).
+        with self._lock:
+            artifacts = {key: (os.path.abspath(path), loader) for key, (path, loader) in artifacts.items()}
+            if self._versions.get(name) != (artifacts, build):
+                self._versions[name] = (artifacts, build)
+                self._built.pop(name, None)
+            if default or self.default_version is None:
+                self.default_version = name
+
+    def versions(self):
+        return list(self._versions)
+
+    def get(self, name=None):
+        return self.get_with_stats(name)[0]
+
+    def get_with_stats(self, name=None):
+        name = name or self.default_version
+        start = time.perf_counter()
+        with self._lock:
+            if name not in self._versions:
+                raise KeyError(f"Versión de modelo no registrada: {name}")
+            artifacts, build = self._versions[name]
+            reloaded = []
+
+            built = self._built.get(name)
+            now = time.monotonic()
+            if built is not None and now - self._checked_at.get(name, -float('inf')) < self.check_interval:
+                self.cache_hits += 1
+            elif built is None or any(not self._is_fresh(artifacts[key][0]) for key in built[1]) \
+                    or any(os.path.exists(artifacts[key][0]) for key in built[2]):
+                accessor = _ArtifactAccessor(self, artifacts, reloaded)
+                value = build(accessor)
+                built = (value, accessor.used, accessor.missing)
+                self._built[name] = built
+                self._checked_at[name] = now
+            else:
+                self._checked_at[name] = now
+                self.cache_hits += 1
+
+        stats = LoadStats(name, time.perf_counter() - start, reloaded)
+        self.last_load = stats
+        return built[0], stats
+
+    def _is_fresh(self, path):
+        cached = self._artifacts.get(path)
+        if cached is None or not os.path.exists(path):
+            return False
+        stat_key = _stat_key(path)
+        if stat_key == cached['stat']:
+            return True
+        # El mtime cambió (p. ej. se copió el mismo archivo): solo recargamos si
+        # cambió el contenido.
+        if _sha256(path) == cached['sha256']:
+            cached['stat'] = stat_key
+            return True
+        return False
+
+    def _load(self, path, loader, key, reloaded):
+        if self._is_fresh(path) and loader in self._artifacts[path]['values']:
+            return self._artifacts[path]['values'][loader]
+        cached = self._artifacts.get(path)
+        stat_key, sha256 = _stat_key(path), _sha256(path)
+        if cached is None or cached['sha256'] != sha256:
+            cached = {'values': {}}
+            self._artifacts[path] = cached
+        cached['stat'], cached['sha256'] = stat_key, sha256
+        if loader not in cached['values']:
+            cached['values'][loader] = loader(path)
+            self.disk_loads += 1
+            reloaded.append(key)
+        return cached['values'][loader]
+
+    def sha256(self, path):
+        if not self._is_fresh(path):
+            # Archivo nuevo o con contenido distinto: lo que hubiera cargado ya no vale
+            self._artifacts[path] = {'values': {}, 'stat': _stat_key(path), 'sha256': _sha256(path)}
+        return self._artifacts[path]['sha256']
+
+
+class _ArtifactAccessor:
+    # Lo que recibe build(): carga artefactos a través de la caché y apunta cuáles usa
+    def __init__(self, registry, artifacts, reloaded):
+        self._registry = registry
+        self._artifacts = artifacts
+        self._reloaded = reloaded
+        self.used = []
+        self.missing = []
+
+    def path(self, key):
+        return self._artifacts[key][0]
+
+    def exists(self, key):
+        if os.path.exists(self.path(key)):
+            return True
+        self.missing.append(key)
+        return False
+
+    def load(self, key):
+        path, loader = self._artifacts[key]
+        self.used.append(key)
+        return self._registry._load(path, loader, key, self._reloaded)
+
+    def sha256(self, key):
+        self.used.append(key)
+        return self._registry.sha256(self.path(key))
+
+
+def _stat_key(path):
+    # Para carpetas (la tabla de consulta) se usan los archivos que contienen
+    if os.path.isdir(path):
+        return tuple((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                     for entry in sorted(os.scandir(path), key=lambda e: e.name))
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    paths = [path]
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    for file_path in paths:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def build_tree_bundle(artifacts):
+    # Versión de la app. Por orden de preferencia:
+    # - el artefacto .fsm (ver model_artifact.py), si corresponde a los .pkl que haya
+    #   en la carpeta; sin .pkl (un despliegue que solo copia el .fsm) se usa tal cual.
+    #   No está en el repositorio (repetiría la tabla de consulta): se genera con
+    #   python src/model_artifact.py y, si aparece con la app en marcha, se usa;
+    # - la tabla de consulta, si se generó a partir de este mismo modelo. Si además
+    #   encoding.json corresponde a los .pkl actuales, las etiquetas y las columnas OHE
+    #   salen de ahí y no se carga ningún pickle (ni sklearn ni joblib);
+    # - si no, la tabla se genera a partir del .pkl y se guarda en su carpeta junto con
+    #   encoding.json (no está en el repositorio: cambia con cada reentrenamiento), así
+    #   que el siguiente arranque ya no carga ningún pickle. Si la carpeta no se puede
+    #   escribir, la tabla solo se usa en memoria.
+    if artifacts.exists('artifact'):
+        artifact = artifacts.load('artifact')
+        source = artifact.manifest.get('source', {})
+        if all(not artifacts.exists(key) or source.get(f'{key}_sha256') == artifacts.sha256(key)
+               for key in ('model', 'label_encoder', 'ohe_columns')):
+            return artifact.bundle
+
+    if artifacts.exists('lookup_table'):
+        lookup_table = artifacts.load('lookup_table')
+        # La tabla guarda el SHA-256 del archivo .pkl del que se generó
+        if lookup_table.header.get('model_sha256') == artifacts.sha256('model'):
+            if artifacts.exists('encoding'):
+                encoding = artifacts.load('encoding')
+                if (encoding.get('label_encoder_sha256') == artifacts.sha256('label_encoder')
+                        and encoding.get('ohe_columns_sha256') == artifacts.sha256('ohe_columns')):
+                    from inference import bundle_from_encoding
+                    return bundle_from_encoding(encoding, lookup_table)
+            return ModelBundle(artifacts.load('label_encoder'),
+                               FeatureEncoder(artifacts.load('ohe_columns'), STREAMLIT_FEATURES), lookup_table)
+
+    from compiled_tree import CompiledTree
+    from lookup_table import LookupTable, write_lookup_table
+    label_encoder = artifacts.load('label_encoder')
+    encoder = FeatureEncoder(artifacts.load('ohe_columns'), STREAMLIT_FEATURES)
+    lookup_table = LookupTable.build(CompiledTree.from_sklearn(artifacts.load('model'), encoder),
+                                     artifacts.sha256('model'))
+    try:
+        write_lookup_table(artifacts.path('lookup_table'), lookup_table, label_encoder.classes_,
+                           encoder.ohe_columns, artifacts.sha256('label_encoder'), artifacts.sha256('ohe_columns'))
+    except OSError:
+        pass
+    return ModelBundle(label_encoder, encoder, lookup_table)
+
+
+def build_ensemble_bundle(artifacts, n_jobs=1):
+    # Bagging o AdaBoost de sklearn servido como CompiledEnsemble: todos los árboles en
+    # una sola tabla de nodos, sin el bucle de sklearn por estimador
+    from compiled_ensemble import CompiledEnsemble
+    label_encoder = artifacts.load('label_encoder')
+    encoder = FeatureEncoder(artifacts.load('ohe_columns'), STREAMLIT_FEATURES)
+    return ModelBundle(label_encoder, encoder,
+                       CompiledEnsemble.from_sklearn(artifacts.load('model'), encoder, n_jobs=n_jobs))
+
+
+def register_ensemble_version(registry, name, model_file, models_folder=MODELS_FOLDER, n_jobs=1, default=False):
+    registry.register(name, {
+        'model': (os.path.join(models_folder, model_file), load_pickle),
+        'label_encoder': (os.path.join(models_folder, 'label_encoder_y.pkl'), load_pickle),
+        'ohe_columns': (os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl'), load_pickle),
+    }, functools.partial(build_ensemble_bundle, n_jobs=n_jobs), default=default)
+
+
+def build_artifact_bundle(artifacts):
+    return artifacts.load('artifact').bundle
+
+
+def build_challenger_bundle(artifacts):
+    # Modelo retador del modo sombra (ver shadow_scoring.py) guardado con joblib: un
+    # árbol, Bagging o AdaBoost se sirve como CompiledEnsemble; cualquier otro
+    # (GradientBoosting...) tal cual, con sklearn. score_codes sabe predecir con ambos.
+    from compiled_ensemble import CompiledEnsemble
+    label_encoder = artifacts.load('label_encoder')
+    encoder = FeatureEncoder(artifacts.load('ohe_columns'), STREAMLIT_FEATURES)
+    model = artifacts.load('model')
+    try:
+        predictor = CompiledEnsemble.from_sklearn(model, encoder)
+    except ValueError:
+        predictor = model
+    return ModelBundle(label_encoder, encoder, predictor)
+
+
+def register_challenger_version(registry, name, model_file, models_folder=MODELS_FOLDER):
+    # model_file puede ser un artefacto .fsm (ver model_artifact.py) o un .pkl de sklearn
+    path = os.path.join(models_folder, model_file)
+    if model_file.endswith('.fsm'):
+        registry.register(name, {'artifact': (path, load_model_artifact)}, build_artifact_bundle)
+        return
+    registry.register(name, {
+        'model': (path, load_pickle),
+        'label_encoder': (os.path.join(models_folder, 'label_encoder_y.pkl'), load_pickle),
+        'ohe_columns': (os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl'), load_pickle),
+    }, build_challenger_bundle)
+
+
+def register_tree_version(registry, name=DEFAULT_VERSION, models_folder=MODELS_FOLDER,
+                          model_file='best_decision_tree_model_streamlit.pkl',
+                          lookup_table_folder='lookup_table', default=False):
+    registry.register(name, {
+        'model': (os.path.join(models_folder, model_file), load_pickle),
+        'label_encoder': (os.path.join(models_folder, 'label_encoder_y.pkl'), load_pickle),
+        'ohe_columns': (os.path.join(models_folder, 'ohe_columns_for_streamlit.pkl'), load_pickle),
+        'lookup_table': (os.path.join(models_folder, lookup_table_folder), load_lookup_table),
+        'encoding': (os.path.join(models_folder, lookup_table_folder, 'encoding.json'), load_encoding),
+        'artifact': (os.path.join(models_folder, os.path.splitext(model_file)[0] + '.fsm'), load_model_artifact),
+    }, build_tree_bundle, default=default)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    # Registro compartido por todo el proceso, con el modelo de la app ya registrado
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+            register_tree_version(_registry, default=True)
+        return _registry
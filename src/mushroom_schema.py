@@ -0,0 +1,173 @@
+# Esquema de las características del formulario: etiquetas en español de cada valor
+# y su código de una letra. Lo comparten la app, la predicción por lotes y las
+# explicaciones.
+
+# Forma del sombrero
+map_cap_shape = {
+    "Campana": "b",
+    "Cónica": "c",
+    "Convexa": "x",
+    "Plana": "f",
+    "Nudosa": "k",
+    "Hundida": "s"
+}
+
+# Superficie del sombrero
+map_cap_surface = {
+    "Fibrosa": "f",
+    "Con ranuras": "g",
+    "Escamosa": "y",
+    "Lisa": "s"
+}
+
+# Color del sombrero
+map_cap_color = {
+    "Marrón": "n",
+    "Beige": "b",
+    "Canela": "c",
+    "Gris": "g",
+    "Verde": "r",
+    "Rosa": "p",
+    "Púrpura": "u",
+    "Rojo": "e",
+    "Blanco": "w",
+    "Amarillo": "y"
+}
+
+# Magulladuras
+map_bruises = {
+    "Con magulladuras": "t",
+    "Sin magulladuras": "f"
+}
+
+# Color de las láminas
+map_gill_color = {
+    "Negro": "k",
+    "Marrón": "n",
+    "Beige": "b",
+    "Chocolate": "h",
+    "Gris": "g",
+    "Verde": "r",
+    "Naranja": "o",
+    "Rosa": "p",
+    "Púrpura": "u",
+    "Rojo": "e",
+    "Blanco": "w",
+    "Amarillo": "y"
+}
+
+# Forma del tallo
+map_stalk_shape = {
+    "Ensanchado hacia la base": "e",
+    "Afilándose hacia la base": "t"
+}
+
+# Superficie del tallo por encima del anillo
+map_stalk_surface_above_ring = {
+    "Fibrosa": "f",
+    "Escamosa": "y",
+    "Sedosa": "k",
+    "Lisa": "s"
+}
+
+# Superficie del tallo por debajo del anillo
+map_stalk_surface_below_ring = {
+    "Fibrosa": "f",
+    "Escamosa": "y",
+    "Sedosa": "k",
+    "Lisa": "s"
+}
+
+# Color del tallo por encima del anillo (coincide con el de abajo, así que creamos uno genérico)
+map_stalk_color = { # Usamos un mapa genérico si las opciones son las mismas para "above" y "below"
+    "Marrón": "n",
+    "Beige": "b",
+    "Canela": "c",
+    "Gris": "g",
+    "Naranja": "o",
+    "Rosa": "p",
+    "Rojo": "e",
+    "Blanco": "w",
+    "Amarillo": "y"
+}
+
+# Color del velo
+map_veil_color = {
+    "Marrón": "n",
+    "Naranja": "o",
+    "Blanco": "w",
+    "Amarillo": "y"
+}
+
+# Número de anillos
+map_ring_number = {
+    "Ninguno": "n",
+    "Uno": "o",
+    "Dos": "t"
+}
+
+# Tipo de anillo
+map_ring_type = {
+    "Telaraña": "c",
+    "Evanescente": "e",
+    "Acampanado": "f",
+    "Grande": "l",
+    "Ninguno": "n",
+    "Colgante": "p",
+    "Enfundado": "s",
+    "Zonal": "z"
+}
+
+# Población
+map_population = {
+    "Abundante": "a",
+    "Agrupado": "c",
+    "Numeroso": "n",
+    "Disperso": "s",
+    "Varios": "v",
+    "Solitario": "y"
+}
+
+# Hábitat
+map_habitat = {
+    "Pastizales": "g",
+    "Hojas": "l",
+    "Prados": "m",
+    "Senderos": "p",
+    "Urbano": "u",
+    "Desechos": "w",
+    "Bosques": "d"
+}
+
+# Características del modelo (mismo orden que streamlit_features) con su mapa
+FEATURE_MAPS = {
+    'cap-shape': map_cap_shape,
+    'cap-surface': map_cap_surface,
+    'cap-color': map_cap_color,
+    'bruises': map_bruises,
+    'gill-color': map_gill_color,
+    'stalk-shape': map_stalk_shape,
+    'stalk-surface-above-ring': map_stalk_surface_above_ring,
+    'stalk-surface-below-ring': map_stalk_surface_below_ring,
+    'stalk-color-above-ring': map_stalk_color,
+    'stalk-color-below-ring': map_stalk_color,
+    'veil-color': map_veil_color,
+    'ring-number': map_ring_number,
+    'ring-type': map_ring_type,
+    'population': map_population,
+    'habitat': map_habitat,
+}
+
+# Opción del formulario para las características que no se pueden observar
+UNKNOWN_OPTION = "No lo sé"
+
+# Clase de las setas venenosas en label_encoder_y.pkl
+POISONOUS_LABEL = 'p'
+
+# Nombre de cada clase para mostrar en la app
+CLASS_NAMES = {'e': 'Comestibles', 'p': 'Venenosas'}
+
+
+def feature_alphabets(features=None):
+    # {característica: letras posibles}, el dominio de cada característica desconocida
+    return {feature: ''.join(FEATURE_MAPS[feature].values()) for feature in features or FEATURE_MAPS}
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batch_prediction import PredictionCache, ScoringStats, score_codes
+from drift_monitor import get_drift_monitor
+from ingest import LabelTranslator
+from metrics import get_metrics
+from model_registry import get_registry
+from mushroom_schema import feature_alphabets
+from shadow_scoring import get_shadow_scorer
+
+
+# Servicio HTTP de predicción sin interfaz, como aplicación ASGI sin dependencias.
+# Usa los mismos artefactos (a través del registro de modelos) y las mismas
+# características que la app de Streamlit. Se arranca con cualquier servidor ASGI:
+#
+#   uvicorn prediction_service:app --app-dir src --port 8000
+#
+#   POST /predict        {"cap-shape": "x", ..., "habitat": "u"}
+#   POST /predict/batch  {"records": [{...}, {...}]}
+#   GET  /health
+#   GET  /metrics        métricas en formato de texto de Prometheus (incluida la deriva)
+#
+# Las peticiones individuales que llegan a la vez se agrupan durante una ventana
+# corta y se predicen con una sola llamada vectorizada. La predicción (y la
+# validación de los lotes) corre en un hilo aparte, no en el bucle de eventos: un
+# lote grande se procesa en bloques de PREDICT_CHUNK_ROWS registros para que las
+# peticiones individuales no esperen a que termine entero. Cada valor es la letra de la
+# característica o su etiqueta en español del formulario (como en los archivos
+# subidos, ver ingest.py); cualquier otro valor se rechaza con un 422 que nombra la
+# característica. Un valor null, '', '?' o "No lo sé" significa "desconocida": se
+# marginaliza, se devuelve el peor caso y la respuesta indica la fracción de
+# combinaciones venenosas y si la predicción está determinada.
+# Cada registro pasa por el monitor de deriva; las respuestas indican los registros
+# completos cuya combinación no aparece en los datos de entrenamiento. Con retadores
+# configurados (FUNGISCAN_SHADOW, ver shadow_scoring.py) una muestra de las filas se
+# predice también con ellos en segundo plano.
+MAX_BATCH_SIZE = 512
+MAX_WAIT_SECONDS = 0.002
+MAX_BODY_BYTES = 16 * 1024 * 1024
+PREDICT_CHUNK_ROWS = 8192
+# A partir de este tamaño el JSON del cuerpo se decodifica fuera del bucle de eventos
+OFFLOAD_JSON_BYTES = 256 * 1024
+
+
+class RequestError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class MicroBatcher:
+    # Cola de filas de códigos pendientes. El primer elemento abre una ventana de
+    # max_wait segundos (o hasta max_batch_size filas) y todo lo acumulado se
+    # predice de una vez en 'executor' (None = el del bucle); cada petición recibe su
+    # resultado por un Future.
+    def __init__(self, predict_codes, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT_SECONDS,
+                 executor=None):
+        self.predict_codes = predict_codes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._worker = None
+        # Lote que el worker está reuniendo o prediciendo (sus elementos ya no están en la cola)
+        self._batch = []
+
+    def start(self):
+        # Un bucle de eventos nuevo (otro asyncio.run) necesita su propia cola y tarea
+        if self._worker is None or self._worker.get_loop() is not asyncio.get_running_loop():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        # Cancela el worker y responde con un 503 a las peticiones que quedaban en la
+        # cola o en el lote en curso: si no, se quedarían esperando para siempre
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        pending = self._batch
+        self._batch = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RequestError(503, "El servicio se está deteniendo"))
+
+    async def submit(self, codes_row):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((codes_row, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = self._batch = [await self._queue.get()]
+            # Dormir la ventana entera y vaciar la cola después es más barato que
+            # esperar cada elemento con un timeout propio.
+            if self.max_wait > 0 and self._queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            futures = [future for _, future in batch]
+            start = time.perf_counter()
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.predict_codes, np.stack([row for row, _ in batch]))
+            except Exception as e:
+                self._batch = []
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._batch = []
+            self.batches += 1
+            self.rows += len(batch)
+            get_metrics().record_batch(len(batch), time.perf_counter() - start)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class PredictionService:
+    def __init__(self, registry=None, version=None,
+                 max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT_SECONDS):
+        self.registry = registry or get_registry()
+        self.version = version
+        self.metrics = get_metrics()
+        self.drift = get_drift_monitor()
+        self.shadow = get_shadow_scorer()
+        # Registros repetidos (entre peticiones y dentro de un lote) se predicen una vez
+        self.cache = PredictionCache()
+        self.stats = ScoringStats(track_distinct=False)
+        # Un solo hilo: las predicciones, la caché, los contadores y el monitor de
+        # deriva se usan de una en una, como si siguieran en el bucle de eventos
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prediccion')
+        self.batcher = MicroBatcher(self._predict_rows, max_batch_size, max_wait, self.executor)
+        self._translator = None
+
+    def _bundle(self):
+        with self.metrics.stage('artifact_load'):
+            return self.registry.get(self.version)
+
+    def _predict(self, codes):
+        bundle = self._bundle()
+        scored = score_codes(bundle.predictor, codes, bundle.label_encoder, bundle.encoder,
+                             cache=self.cache, stats=self.stats)
+        if self.shadow.enabled:
+            with self.metrics.stage('shadow'):
+                self.shadow.submit(codes, scored.labels)
+        return scored
+
+    def _predict_rows(self, codes):
+        # Para el MicroBatcher: (etiqueta, fracción de venenosas, determinada,
+        # combinación no vista) por fila
+        scored = self._predict(codes)
+        return list(zip(scored.labels, scored.fraction.tolist(), scored.determined.tolist(),
+                        self._observe(codes).tolist()))
+
+    def _predict_records(self, records, offset):
+        # Un bloque de /predict/batch que empieza en el registro 'offset': etiquetas e
+        # índices (en el lote entero) de las combinaciones no vistas y las indeterminadas
+        codes = self._codes(records, offset)
+        scored = self._predict(codes)
+        return ([str(label) for label in scored.labels],
+                (np.flatnonzero(self._observe(codes)) + offset).tolist(),
+                (np.flatnonzero(~scored.determined) + offset).tolist())
+
+    def _codes(self, records, offset=0):
+        encoder = self._bundle().encoder
+        for i, record in enumerate(records):
+            if not isinstance(record, dict):
+                raise RequestError(422, f"El registro {i + offset} no es un objeto JSON")
+            missing = [f for f in encoder.features if f not in record]
+            if missing:
+                raise RequestError(422, f"Faltan características en el registro {i + offset}: "
+                                        f"{', '.join(missing)}")
+        if self._translator is None or self._translator.features != list(encoder.features):
+            self._translator = LabelTranslator(encoder.features)
+        with self.metrics.stage('encoding'):
+            codes = np.empty((len(records), len(encoder.features)), dtype=np.uint8)
+            for j, feature in enumerate(encoder.features):
+                values = [record[feature] for record in records]
+                invalid = [i for i, value in enumerate(values) if value is not None and not isinstance(value, str)]
+                if not invalid:
+                    codes[:, j], mask = self._translator.translate_values(j, values)
+                    invalid = np.flatnonzero(mask)
+                if len(invalid):
+                    i = int(invalid[0])
+                    raise RequestError(422, f"Valor no válido en el registro {i + offset} para '{feature}': "
+                                            f"{json.dumps(values[i], ensure_ascii=False)} (se espera una de las "
+                                            f"letras '{feature_alphabets([feature])[feature]}', su etiqueta o null)")
+            return codes
+
+    def _observe(self, codes):
+        with self.metrics.stage('drift'):
+            return self.drift.observe(codes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        if scope['path'].rstrip('/') == '/metrics' and scope['method'] == 'GET':
+            text = self.metrics.to_prometheus() + (self.drift.to_prometheus() if self.drift.enabled else '') + \
+                (self.shadow.to_prometheus() if self.shadow.enabled else '')
+            await _send_text(send, 200, text, b'text/plain; version=0.0.4; charset=utf-8')
+            return
+
+        start = time.perf_counter()
+        try:
+            status, payload = await self._route(scope, receive)
+        except RequestError as e:
+            status, payload = e.status, {'error': e.detail}
+        except Exception as e:
+            status, payload = 500, {'error': f"Error durante la predicción: {e}"}
+        payload.setdefault('latency_ms', round((time.perf_counter() - start) * 1000, 3))
+        await _send_json(send, status, payload)
+
+    async def _route(self, scope, receive):
+        method, path = scope['method'], scope['path'].rstrip('/')
+        if path == '/health' and method == 'GET':
+            return 200, {
+                'status': 'ok',
+                'version': self.registry.default_version if self.version is None else self.version,
+                'batches': self.batcher.batches,
+                'rows': self.batcher.rows,
+                'model_evaluations': self.stats.evaluated,
+                'cache_entries': len(self.cache),
+                'shadow': self.shadow.snapshot() if self.shadow.enabled else None,
+            }
+        if path == '/predict' and method == 'POST':
+            record = await _read_json(receive)
+            # La traducción de etiquetas y registry.get (que puede reconstruir la tabla
+            # de consulta si cambió un artefacto) van al hilo de predicción, como en
+            # /predict/batch: el bucle de eventos sigue atendiendo a las demás conexiones
+            codes = await asyncio.get_running_loop().run_in_executor(self.executor, self._codes, [record])
+            prediction, fraction, determined, unseen = await self.batcher.submit(codes[0])
+            payload = {'prediction': str(prediction), 'unseen_combination': unseen}
+            if not codes.all():
+                # Sin marginalizar (modelos de sklearn) la fracción es NaN: null en el JSON
+                payload.update(poisonous_fraction=None if np.isnan(fraction) else fraction, determined=determined)
+            return 200, payload
+        if path == '/predict/batch' and method == 'POST':
+            body = await _read_json(receive)
+            records = body.get('records') if isinstance(body, dict) else body
+            if not isinstance(records, list):
+                raise RequestError(422, "Se esperaba {'records': [...]} o una lista de registros")
+            # Un lote ya viene agrupado: se predice directamente, sin pasar por la cola
+            loop = asyncio.get_running_loop()
+            payload = {'predictions': [], 'unseen_combinations': [], 'undetermined': []}
+            for start in range(0, len(records), PREDICT_CHUNK_ROWS):
+                part = await loop.run_in_executor(self.executor, self._predict_records,
+                                                  records[start:start + PREDICT_CHUNK_ROWS], start)
+                for values, key in zip(part, payload):
+                    payload[key].extend(values)
+            return 200, payload
+        if path in ('/health', '/metrics', '/predict', '/predict/batch'):
+            raise RequestError(405, f"Método {method} no permitido en {path}")
+        raise RequestError(404, f"Ruta no encontrada: {path}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    # Cargamos los artefactos antes de aceptar tráfico
+                    self._bundle()
+                    self.batcher.start()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.batcher.stop()
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_json(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        body = message.get('body', b'')
+        size += len(body)
+        if size > MAX_BODY_BYTES:
+            raise RequestError(413, "El cuerpo de la petición es demasiado grande")
+        chunks.append(body)
+        if not message.get('more_body', False):
+            break
+    body = b''.join(chunks) or b'null'
+    try:
+        if size > OFFLOAD_JSON_BYTES:
+            return await asyncio.get_running_loop().run_in_executor(None, json.loads, body)
+        return json.loads(body)
+    except ValueError:
+        raise RequestError(400, "El cuerpo de la petición no es JSON válido")
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False)
+    await _send_text(send, status, body, b'application/json; charset=utf-8')
+
+
+async def _send_text(send, status, text, content_type):
+    body = text.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type),
+                    (b'content-length', str(len(body)).encode('ascii'))],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = PredictionService()
@@ -0,0 +1,269 @@
+import functools
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from feature_encoder import STREAMLIT_FEATURES
+
+
+# Modo sombra: uno o varios modelos retadores predicen las mismas filas ya
+# codificadas que el modelo de la app (el campeón) para comparar sus respuestas con
+# tráfico real, sin que el usuario espere por ellos.
+#
+#   shadow = get_shadow_scorer()
+#   shadow.submit(codes, etiquetas_del_campeón)   # vuelve enseguida
+#
+# submit() se queda con una muestra de las filas completas (sample_rate) y las pasa
+# a un hilo en segundo plano. Si ya hay max_pending lotes en cola o en curso, la
+# muestra se descarta en vez de esperar: bajo carga el modo sombra pierde filas, no
+# añade latencia ni memoria. Cada retador acumula filas, acuerdos con el campeón y
+# segundos de predicción, y cada desacuerdo se añade a un registro binario de solo
+# añadir (LOG_DTYPE, 55 bytes por fila) que se lee con read_disagreements().
+#
+# Variables de entorno que lee get_shadow_scorer():
+#
+#   FUNGISCAN_SHADOW=bagging=bagging.pkl,ada=adaboost.fsm   retadores (en models/)
+#   FUNGISCAN_SHADOW_RATE=0.1                              fracción de filas muestreadas
+#   FUNGISCAN_SHADOW_LOG=ruta.bin                          registro de desacuerdos
+SAMPLE_RATE = 0.1
+MAX_PENDING = 4
+LOG_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'sombra_desacuerdos.bin')
+
+LOG_MAGIC = b'FSSHADOW'
+LOG_VERSION = 1
+LOG_HEADER_SIZE = 16
+# Un registro por fila en la que un retador no coincide con el campeón
+LOG_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('challenger', 'S16'),
+    ('champion', 'S8'),
+    ('prediction', 'S8'),
+    ('codes', 'u1', (len(STREAMLIT_FEATURES),)),
+])
+
+
+class ChallengerStats:
+    __slots__ = ('rows', 'agreements', 'seconds', 'errors', 'disagreements')
+
+    def __init__(self):
+        self.rows = 0
+        self.agreements = 0
+        self.seconds = 0.0
+        self.errors = 0
+        # (etiqueta del campeón, etiqueta del retador) -> filas
+        self.disagreements = Counter()
+
+    @property
+    def agreement_rate(self):
+        return self.agreements / self.rows if self.rows else None
+
+    @property
+    def microseconds_per_row(self):
+        return self.seconds / self.rows * 1e6 if self.rows else None
+
+
+class ShadowScorer:
+    def __init__(self, challengers, sample_rate=SAMPLE_RATE, max_pending=MAX_PENDING, log_path=LOG_FILE, seed=None):
+        # challengers: {nombre: función sin argumentos que devuelve el ModelBundle}, p. ej.
+        # functools.partial(registry.get, nombre): así se recarga si cambia el archivo
+        self.challengers = dict(challengers)
+        self.enabled = bool(self.challengers)
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.log_path = log_path
+        self.stats = {name: ChallengerStats() for name in self.challengers}
+        self.offered = 0
+        self.sampled = 0
+        self.dropped = 0
+        self._rng = np.random.default_rng(seed)
+        self._random = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._log = None
+        # Un solo hilo: los retadores nunca compiten entre ellos por la CPU
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow') if self.enabled else None
+
+    def submit(self, codes, champion_labels):
+        # Devuelve el futuro del lote en sombra, o None si no se muestreó ninguna fila
+        # o se descartó por carga. Solo se comparan filas completas: con desconocidas
+        # el campeón da el peor caso y el retador no marginaliza igual.
+        if not self.enabled:
+            return None
+        codes = np.asarray(codes, dtype=np.uint8)
+        champion_labels = np.asarray(champion_labels)
+        if len(codes) == 1:
+            keep = self._random.random() < self.sample_rate and codes[0].all()
+            selected = codes.copy() if keep else codes[:0]
+            labels = champion_labels if keep else champion_labels[:0]
+        else:
+            mask = codes.all(axis=1)
+            if self.sample_rate < 1:
+                mask &= self._rng.random(len(codes)) < self.sample_rate
+            selected, labels = codes[mask], champion_labels[mask]
+        with self._lock:
+            self.offered += len(codes)
+        if not len(selected):
+            return None
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.dropped += len(selected)
+            return None
+        with self._lock:
+            self.sampled += len(selected)
+        future = self._executor.submit(self._score, selected, labels)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _score(self, codes, champion_labels):
+        from batch_prediction import score_codes
+        champion_labels = champion_labels.astype(str)
+        for name, get_bundle in self.challengers.items():
+            stats = self.stats[name]
+            try:
+                bundle = get_bundle()
+                start = time.perf_counter()
+                labels = score_codes(bundle.predictor, codes, bundle.label_encoder, bundle.encoder).labels
+                seconds = time.perf_counter() - start
+            except Exception:
+                with self._lock:
+                    stats.errors += 1
+                continue
+            labels = np.asarray(labels).astype(str)
+            disagree = labels != champion_labels
+            n_disagree = int(disagree.sum())
+            with self._lock:
+                stats.rows += len(codes)
+                stats.agreements += len(codes) - n_disagree
+                stats.seconds += seconds
+                if n_disagree:
+                    stats.disagreements.update(zip(champion_labels[disagree].tolist(), labels[disagree].tolist()))
+            if n_disagree and self.log_path:
+                self._append(name, codes[disagree], champion_labels[disagree], labels[disagree])
+
+    def _append(self, name, codes, champion_labels, labels):
+        records = np.zeros(len(codes), dtype=LOG_DTYPE)
+        records['time'] = time.time()
+        records['challenger'] = name.encode('utf-8')[:LOG_DTYPE['challenger'].itemsize]
+        records['champion'] = np.char.encode(champion_labels, 'utf-8')
+        records['prediction'] = np.char.encode(labels, 'utf-8')
+        records['codes'] = codes
+        with self._lock:
+            if self._log is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                self._log = open(self.log_path, 'ab')
+                size = self._log.tell()
+                if size == 0:
+                    self._log.write(_log_header())
+                elif (size - LOG_HEADER_SIZE) % LOG_DTYPE.itemsize:
+                    # Un registro a medias de una escritura interrumpida: se descarta para
+                    # que los siguientes sigan alineados
+                    self._log.truncate(size - (size - LOG_HEADER_SIZE) % LOG_DTYPE.itemsize)
+            self._log.write(records.tobytes())
+            self._log.flush()
+
+    def wait(self):
+        # Espera a que terminen los lotes en sombra pendientes (pruebas y benchmarks)
+        for _ in range(self.max_pending):
+            self._slots.acquire()
+        for _ in range(self.max_pending):
+            self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'offered_rows': self.offered,
+                'sampled_rows': self.sampled,
+                'dropped_rows': self.dropped,
+                'challengers': {name: {
+                    'rows': stats.rows,
+                    'agreement_rate': stats.agreement_rate,
+                    'microseconds_per_row': stats.microseconds_per_row,
+                    'errors': stats.errors,
+                    'disagreements': {f'{a}->{b}': n for (a, b), n in sorted(stats.disagreements.items())},
+                } for name, stats in self.stats.items()},
+            }
+
+    def to_prometheus(self, namespace='fungiscan'):
+        snapshot = self.snapshot()
+        lines = []
+        for name, help_text in (('offered_rows', 'Filas predichas por el campeón.'),
+                                ('sampled_rows', 'Filas enviadas a los retadores.'),
+                                ('dropped_rows', 'Filas muestreadas y descartadas por carga.')):
+            lines += [f'# HELP {namespace}_shadow_{name}_total {help_text}',
+                      f'# TYPE {namespace}_shadow_{name}_total counter',
+                      f'{namespace}_shadow_{name}_total {snapshot[name]}']
+        for name, kind, help_text in (('rows', 'counter', 'Filas predichas por el retador.'),
+                                      ('agreement_rate', 'gauge', 'Fracción de filas en las que coincide con el campeón.'),
+                                      ('microseconds_per_row', 'gauge', 'Coste medio del retador por fila.'),
+                                      ('errors', 'counter', 'Lotes en los que el retador falló.')):
+            metric = f'{namespace}_shadow_challenger_{name}'
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+            lines += [f'{metric}{{challenger="{challenger}"}} {float(values[name])!r}'
+                      for challenger, values in snapshot['challengers'].items() if values[name] is not None]
+        return '\n'.join(lines) + '\n'
+
+
+def read_disagreements(path=LOG_FILE):
+    # Array estructurado (LOG_DTYPE) con todos los desacuerdos registrados
+    with open(path, 'rb') as f:
+        header = f.read(LOG_HEADER_SIZE)
+        if header[:len(LOG_MAGIC)] != LOG_MAGIC:
+            raise ValueError(f"{path} no es un registro de desacuerdos del modo sombra")
+        version = int.from_bytes(header[len(LOG_MAGIC):len(LOG_MAGIC) + 4], 'little')
+        if version != LOG_VERSION:
+            raise ValueError(f"Versión de registro no soportada: {version} (se esperaba {LOG_VERSION})")
+        data = f.read()
+    return np.frombuffer(data[:len(data) - len(data) % LOG_DTYPE.itemsize], dtype=LOG_DTYPE)
+
+
+def _log_header():
+    return LOG_MAGIC + LOG_VERSION.to_bytes(4, 'little') + LOG_DTYPE.itemsize.to_bytes(4, 'little')
+
+
+def parse_challengers(value):
+    # 'nombre=archivo,nombre2=archivo2' -> {nombre: archivo}
+    challengers = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, separator, model_file = item.partition('=')
+        if not separator or not name or not model_file:
+            raise ValueError(f"Retador mal escrito: {item!r} (se esperaba nombre=archivo)")
+        challengers[name.strip()] = model_file.strip()
+    return challengers
+
+
+_shadow_scorer = None
+_shadow_scorer_lock = threading.Lock()
+
+
+def get_shadow_scorer():
+    # Instancia compartida por todo el proceso, configurada con las variables de
+    # entorno. Sin FUNGISCAN_SHADOW no hay retadores y enabled es False.
+    global _shadow_scorer
+    with _shadow_scorer_lock:
+        if _shadow_scorer is None:
+            from model_registry import get_registry, register_challenger_version
+            registry = get_registry()
+            challengers = {}
+            for name, model_file in parse_challengers(os.environ.get('FUNGISCAN_SHADOW', '')).items():
+                register_challenger_version(registry, name, model_file)
+                challengers[name] = functools.partial(registry.get, name)
+            _shadow_scorer = ShadowScorer(challengers,
+                                          sample_rate=float(os.environ.get('FUNGISCAN_SHADOW_RATE', SAMPLE_RATE)),
+                                          log_path=os.environ.get('FUNGISCAN_SHADOW_LOG', LOG_FILE))
+        return _shadow_scorer
+
+
+if __name__ == '__main__':
+    # Resumen del registro de desacuerdos:
+    #   python src/shadow_scoring.py [registro.bin]
+    import sys
+    records = read_disagreements(sys.argv[1] if len(sys.argv) > 1 else LOG_FILE)
+    print(f"{len(records):,} desacuerdos")
+    pairs = Counter(zip(records['challenger'].tolist(), records['champion'].tolist(), records['prediction'].tolist()))
+    for (challenger, champion, prediction), n in pairs.most_common():
+        print(f"  {challenger.decode()}: campeón {champion.decode()} -> retador {prediction.decode()}: {n:,}")
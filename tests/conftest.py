@@ -0,0 +1,86 @@
+# Fixtures compartidas por los tests: los modelos de models/ y el dataset de data/.
+# Los módulos de src/ se importan igual que desde la app y los benchmarks.
+import os
+import sys
+import warnings
+
+import joblib
+import pandas as pd
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODELS_FOLDER = os.path.join(ROOT, 'models')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from dataset_loader import COLUMN_NAMES, DATA_FILE  # noqa: E402
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES  # noqa: E402
+
+TREE_MODEL_FILE = os.path.join(MODELS_FOLDER, 'best_decision_tree_model_streamlit.pkl')
+
+
+def _load_pickle(name):
+    # Los .pkl se guardaron con otra versión de sklearn: el aviso no afecta a los tests
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return joblib.load(os.path.join(MODELS_FOLDER, name))
+
+
+@pytest.fixture(scope='session')
+def agaricus():
+    return pd.read_csv(DATA_FILE, header=None, names=COLUMN_NAMES)
+
+
+@pytest.fixture(scope='session')
+def X(agaricus):
+    return agaricus[STREAMLIT_FEATURES]
+
+
+@pytest.fixture(scope='session')
+def encoder():
+    return FeatureEncoder.from_file(os.path.join(MODELS_FOLDER, 'ohe_columns_for_streamlit.pkl'))
+
+
+@pytest.fixture(scope='session')
+def label_encoder():
+    return _load_pickle('label_encoder_y.pkl')
+
+
+@pytest.fixture(scope='session')
+def tree_model():
+    return _load_pickle('best_decision_tree_model_streamlit.pkl')
+
+
+@pytest.fixture(scope='session')
+def codes(encoder, X):
+    return encoder.to_codes(X)
+
+
+@pytest.fixture(scope='session')
+def noisy_codes(X, encoder):
+    # Filas reales con, en cada celda, un 30% de probabilidad de tomar el valor de otra
+    # fila de la misma columna: combinaciones que no están en el dataset
+    import numpy as np
+    rng = np.random.default_rng(0)
+    codes = encoder.to_codes(X)
+    rows = codes[rng.integers(len(codes), size=5000)]
+    donors = codes[rng.integers(len(codes), size=5000)]
+    replaced = rng.random(rows.shape) < 0.3
+    rows[replaced] = donors[replaced]
+    return rows
+
+
+def sklearn_predict(model, encoder, codes, proba=False):
+    # Referencia de los predictores compilados: el modelo de sklearn sobre el one-hot
+    X = encoder.to_frame(encoder.transform_codes(codes))
+    return model.predict_proba(X) if proba else model.predict(X)
+
+
+@pytest.fixture(scope='session', params=['dataset', 'combinaciones nuevas'])
+def sample(request, codes, noisy_codes):
+    return codes if request.param == 'dataset' else noisy_codes
+
+
+@pytest.fixture(scope='session')
+def compiled_tree(tree_model, encoder):
+    from compiled_tree import CompiledTree
+    return CompiledTree.from_sklearn(tree_model, encoder)
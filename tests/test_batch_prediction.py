@@ -0,0 +1,71 @@
+# La predicción por lotes debe dar lo mismo que el modelo fila a fila, también con
+# bloques vacíos (la plantilla CSV de la app solo tiene la cabecera).
+import io
+
+import numpy as np
+import pytest
+
+from batch_prediction import PredictionCache, ScoringStats, iter_predictions, score_codes
+from batch_results import RESULT_FORMATS, ResultSummary, ResultWriter
+from drift_monitor import DriftMonitor
+from explanations import get_explainer
+from ingest import LabelTranslator, ValidationReport
+from mushroom_schema import POISONOUS_LABEL
+
+
+def test_score_codes_matches_row_by_row(compiled_tree, label_encoder, encoder, sample):
+    reference = score_codes(compiled_tree, sample, label_encoder, encoder, dedup=False)
+    cache = PredictionCache()
+    for scored in (score_codes(compiled_tree, sample, label_encoder, encoder, stats=ScoringStats()),
+                   score_codes(compiled_tree, sample[:1000], label_encoder, encoder, cache=cache),
+                   score_codes(compiled_tree, sample, label_encoder, encoder, cache=cache)):
+        n = len(scored.labels)
+        assert np.array_equal(scored.labels, reference.labels[:n])
+        assert np.array_equal(scored.predictions, reference.predictions[:n])
+
+
+def test_score_codes_empty(compiled_tree, label_encoder, encoder):
+    scored = score_codes(compiled_tree, np.zeros((0, len(encoder.features)), dtype=np.uint8), label_encoder,
+                         encoder, cache=PredictionCache(), stats=ScoringStats())
+    assert all(len(column) == 0 for column in scored)
+    assert scored.labels.dtype == label_encoder.classes_.dtype
+    assert scored.determined.dtype == bool
+
+
+@pytest.mark.parametrize('fmt', list(RESULT_FORMATS))
+def test_header_only_upload(compiled_tree, label_encoder, encoder, fmt):
+    # Lo mismo que hace la app con la plantilla CSV descargada sin rellenar
+    source = io.StringIO(','.join(encoder.features) + '\n')
+    report = ValidationReport(encoder.features)
+    writer = ResultWriter(fmt)
+    summary = ResultSummary()
+    stats = ScoringStats()
+    for chunk in iter_predictions(source, compiled_tree, label_encoder, encoder, uncertainty_columns=True,
+                                  cache=PredictionCache(), stats=stats, translator=LabelTranslator(encoder.features),
+                                  report=report, monitor=DriftMonitor(),
+                                  explainer=get_explainer(compiled_tree, label_encoder)):
+        assert len(chunk) == 0
+        writer.write(chunk)
+        summary.add(chunk)
+    writer.close()
+    assert writer.rows == 0 and stats.rows == 0 and len(report) == 0
+    assert writer.size > 0
+    writer.discard()
+
+
+def test_unknowns_without_marginalization(tree_model, compiled_tree, label_encoder, encoder, codes):
+    # Un modelo de sklearn no puede marginalizar: las filas con alguna característica
+    # desconocida no se dan como determinadas y se quedan con el peor caso
+    rows = codes[:200].copy()
+    rows[::3, 5] = 0
+    unknown = (rows == 0).any(axis=1)
+    poisonous = label_encoder.transform([POISONOUS_LABEL])[0]
+    for model in (tree_model, compiled_tree):
+        scored = score_codes(model, rows, label_encoder, encoder)
+        assert np.array_equal(scored.determined[~unknown], np.ones((~unknown).sum(), dtype=bool))
+        assert np.all(scored.predictions[unknown & ~scored.determined] == poisonous)
+    scored = score_codes(tree_model, rows, label_encoder, encoder)
+    assert not scored.determined[unknown].any()
+    assert np.isnan(scored.fraction[unknown]).all()
+    assert np.array_equal(scored.predictions[~unknown],
+                          score_codes(compiled_tree, rows[~unknown], label_encoder, encoder).predictions)
@@ -0,0 +1,47 @@
+# Los conjuntos Bagging/AdaBoost compilados deben predecir como sklearn y exportarse
+# al mismo formato .fsm que el árbol.
+import numpy as np
+import pytest
+
+from compiled_ensemble import CompiledEnsemble
+from model_artifact import export_bundle, load_artifact
+from model_registry import ModelBundle
+
+from .conftest import sklearn_predict
+
+
+@pytest.fixture(scope='module')
+def ensembles(tree_model, encoder, label_encoder, agaricus, X):
+    # Conjuntos pequeños entrenados aquí: los del notebook no se guardan en models/
+    from sklearn.ensemble import AdaBoostClassifier, BaggingClassifier
+    from sklearn.tree import DecisionTreeClassifier
+
+    X_train = encoder.to_frame(encoder.transform(X))
+    y_train = label_encoder.transform(agaricus['class'])
+    models = {
+        'Bagging': BaggingClassifier(estimator=DecisionTreeClassifier(**tree_model.get_params()), n_estimators=10,
+                                     max_samples=0.8, max_features=0.8, random_state=42),
+        'AdaBoost': AdaBoostClassifier(estimator=DecisionTreeClassifier(max_depth=1, random_state=42),
+                                       n_estimators=10, random_state=42),
+    }
+    return {name: model.fit(X_train, y_train) for name, model in models.items()}
+
+
+@pytest.mark.parametrize('name', ['Bagging', 'AdaBoost'])
+def test_compiled_ensemble(ensembles, encoder, label_encoder, sample, name, tmp_path):
+    model = ensembles[name]
+    compiled = CompiledEnsemble.from_sklearn(model, encoder)
+    expected = sklearn_predict(model, encoder, sample)
+    assert np.array_equal(compiled.predict_codes(sample), expected)
+    assert np.array_equal(compiled.predict_proba_codes(sample), sklearn_predict(model, encoder, sample, proba=True))
+
+    path = str(tmp_path / 'conjunto.fsm')
+    export_bundle(path, ModelBundle(label_encoder, encoder, compiled))
+    assert np.array_equal(load_artifact(path, verify=True).bundle.predictor.predict_codes(sample), expected)
+
+
+def test_compiled_ensemble_unsupported(encoder, codes):
+    from sklearn.neighbors import KNeighborsClassifier
+    model = KNeighborsClassifier(n_neighbors=1).fit(encoder.transform_codes(codes[:10]), np.arange(10) % 2)
+    with pytest.raises(ValueError):
+        CompiledEnsemble.from_sklearn(model, encoder)
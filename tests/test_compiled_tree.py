@@ -0,0 +1,28 @@
+# El árbol compilado debe predecir exactamente lo mismo que el modelo de sklearn del
+# que sale, con las filas del dataset y con combinaciones nuevas.
+import numpy as np
+
+from compiled_tree import CompiledTree
+
+from .conftest import sklearn_predict
+
+
+def test_compiled_tree(compiled_tree, tree_model, encoder, sample):
+    assert np.array_equal(compiled_tree.predict_codes(sample), sklearn_predict(tree_model, encoder, sample))
+    assert np.array_equal(compiled_tree.predict_proba_codes(sample),
+                          sklearn_predict(tree_model, encoder, sample, proba=True))
+    assert np.array_equal(compiled_tree.apply_codes(sample),
+                          tree_model.apply(encoder.to_frame(encoder.transform_codes(sample))))
+
+
+def test_compiled_tree_record(compiled_tree, tree_model, encoder, X):
+    expected = tree_model.predict(encoder.to_frame(encoder.transform(X.iloc[:20])))
+    for record, label in zip(X.iloc[:20].to_dict('records'), expected):
+        assert compiled_tree.predict_record(record) == label
+
+
+def test_compiled_tree_save_load(compiled_tree, sample, tmp_path):
+    path = str(tmp_path / 'tree.npz')
+    compiled_tree.save(path)
+    loaded = CompiledTree.load(path)
+    assert np.array_equal(loaded.predict_codes(sample), compiled_tree.predict_codes(sample))
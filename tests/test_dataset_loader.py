@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_loader
+from dataset_loader import (COLUMN_NAMES, DATA_FILE, EXPANDED_FILE, HEADER_FILE, decompress_lzw,
+                            iter_expanded_codes, load_dataset, read_alphabets)
+
+
+def compress_lzw(data, max_bits=16, block_mode=True):
+    # Compresor LZW mínimo con el formato de compress(1): códigos de 9 a max_bits
+    # bits en grupos de 8; al cambiar de ancho el resto del grupo es relleno
+    output = bytearray(b'\x1f\x9d' + bytes([max_bits | (0x80 if block_mode else 0)]))
+    table = {bytes([i]): i for i in range(256)}
+    free_entry = 257 if block_mode else 256
+    n_bits = 9
+    group = []
+
+    def flush(pad):
+        value = sum(code << (k * n_bits) for k, code in enumerate(group))
+        output.extend(value.to_bytes(n_bits if pad else -(-len(group) * n_bits // 8), 'little'))
+        group.clear()
+
+    def emit(code):
+        nonlocal n_bits
+        group.append(code)
+        if free_entry > (1 << n_bits) - 1 and n_bits < max_bits:
+            flush(pad=True)
+            n_bits += 1
+        elif len(group) == 8:
+            flush(pad=True)
+
+    current = b''
+    for byte in data:
+        candidate = current + bytes([byte])
+        if candidate in table:
+            current = candidate
+            continue
+        emit(table[current])
+        if free_entry < 1 << max_bits:
+            table[candidate] = free_entry
+            free_entry += 1
+        current = bytes([byte])
+    if current:
+        emit(table[current])
+    if group:
+        flush(pad=False)
+    return bytes(output)
+
+
+@pytest.mark.parametrize('max_bits,block_mode', [(10, True), (12, True), (16, True), (12, False), (16, False)])
+def test_decompress_round_trip(tmp_path, max_bits, block_mode):
+    # Texto repetitivo (cambia varias veces de ancho de código y llena la tabla con
+    # max_bits pequeño) seguido de bytes al azar
+    rng = np.random.default_rng(max_bits)
+    data = (b'p,x,s,n,t,p,f,c,n,k,e,e,s,s,w,w,p,w,o,p,k,s,u\n' * 500
+            + rng.choice(list(b'abcde,\n'), size=50_000).astype(np.uint8).tobytes()
+            + rng.integers(0, 256, size=5_000).astype(np.uint8).tobytes())
+    path = tmp_path / 'datos.Z'
+    path.write_bytes(compress_lzw(data, max_bits, block_mode))
+    assert b''.join(decompress_lzw(str(path), block_size=4096)) == data
+
+
+def test_decompress_empty(tmp_path):
+    path = tmp_path / 'vacio.Z'
+    path.write_bytes(compress_lzw(b''))
+    assert b''.join(decompress_lzw(str(path))) == b''
+
+
+@pytest.mark.skipif(shutil.which('gzip') is None, reason="gzip no está instalado")
+def test_decompress_matches_gzip():
+    # gzip también descomprime el formato .Z: es una referencia independiente
+    expected = subprocess.run(['gzip', '-dc', EXPANDED_FILE], check=True, capture_output=True).stdout
+    assert b''.join(decompress_lzw(EXPANDED_FILE)) == expected
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'PK\x03\x04 no es un .Z',
+    b'\x1f\x9d\x88',                  # max_bits = 8
+    b'\x1f\x9d\x90\x2c\x01',          # primer código 300: no es un byte literal
+    b'\x1f\x9d\x90\x61\xfe\x03',      # 'a' y después el código 511, fuera de la tabla
+])
+def test_decompress_invalid(tmp_path, content):
+    path = tmp_path / 'malo.Z'
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        b''.join(decompress_lzw(str(path)))
+
+
+def test_expanded_codes():
+    # Cada bloque trae (n_columnas, filas) con los códigos del alfabeto de cada
+    # columna; las filas del expanded tienen todas las columnas con valor
+    alphabets = read_alphabets()
+    chunks = list(iter_expanded_codes(EXPANDED_FILE, alphabets, chunk_rows=1000))
+    assert all(chunk.shape[0] == len(COLUMN_NAMES) for chunk in chunks)
+    codes = np.concatenate(chunks, axis=1)
+    sizes = np.array([len(alphabets[column]) for column in COLUMN_NAMES])
+    assert codes.shape[1] > 8124
+    assert ((codes < sizes[:, None]) | (codes == 255)).all()
+
+
+def test_load_dataset_matches_read_csv(tmp_path):
+    expected = pd.read_csv(DATA_FILE, header=None, names=COLUMN_NAMES).replace('?', np.nan)
+    dataset = load_dataset(DATA_FILE, str(tmp_path))
+    assert len(dataset) == len(expected)
+    frame = dataset.to_frame(categorical=False)
+    for column in COLUMN_NAMES:
+        assert frame[column].fillna('?').tolist() == expected[column].fillna('?').tolist()
+    # Segunda carga desde la caché
+    assert np.array_equal(load_dataset(DATA_FILE, str(tmp_path)).codes, dataset.codes)
+
+
+def test_touched_source_is_hashed_once(tmp_path, monkeypatch):
+    # Si solo cambia la fecha del archivo, la caché sigue valiendo y guarda la nueva
+    # fecha: las cargas siguientes no vuelven a calcular el sha256
+    source = str(tmp_path / os.path.basename(DATA_FILE))
+    shutil.copy(DATA_FILE, source)
+    cache = str(tmp_path / 'cache')
+    load_dataset(source, cache)
+    folder = os.path.join(cache, os.path.basename(source))
+    assert sorted(os.listdir(folder)) == sorted([HEADER_FILE, dataset_loader.CODES_FILE])
+
+    hashes = []
+    file_sha256 = dataset_loader._file_sha256
+    monkeypatch.setattr(dataset_loader, '_file_sha256', lambda path: hashes.append(path) or file_sha256(path))
+    monkeypatch.setattr(dataset_loader, 'build_cache', lambda *args: pytest.fail("No debía reconstruirse"))
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    for _ in range(3):
+        load_dataset(source, cache)
+    assert hashes == [source]
+    with open(os.path.join(folder, HEADER_FILE), encoding='utf-8') as f:
+        assert json.load(f)['source_stat'][0] == stat.st_mtime_ns + 10**9
+    assert sorted(os.listdir(folder)) == sorted([HEADER_FILE, dataset_loader.CODES_FILE])
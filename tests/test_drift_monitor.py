@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from drift_monitor import CountMinSketch, DriftMonitor, PSI_WARNING, TrainingReference
+
+
+@pytest.fixture(scope='module')
+def reference(codes):
+    return TrainingReference(codes)
+
+
+def _monitor(reference):
+    # Sin informes automáticos: los tests los piden con report()
+    return DriftMonitor(reference, check_interval=float('inf'))
+
+
+def _rows_with_unknowns_and_new_letters(reference, codes):
+    # Filas del dataset, filas con desconocidas y filas con una letra que el
+    # entrenamiento no tiene
+    rng = np.random.default_rng(0)
+    rows = codes[rng.integers(len(codes), size=600)].copy()
+    rows[:100][rng.random((100, rows.shape[1])) < 0.2] = 0
+    j, letter = _new_letter(reference)
+    rows[100:150, j] = letter
+    return rows
+
+
+def _new_letter(reference):
+    # (columna, código ASCII) de una letra del alfabeto que no aparece en el entrenamiento
+    for j, feature in enumerate(reference.features):
+        for letter in reference.alphabets[feature].encode('ascii'):
+            if not reference.counts[j, letter]:
+                return j, letter
+    pytest.skip("El entrenamiento usa todas las letras de todos los alfabetos")
+
+
+def test_batch_and_single_row_paths_agree(reference, codes):
+    rows = _rows_with_unknowns_and_new_letters(reference, codes)
+    batch, single = _monitor(reference), _monitor(reference)
+    unseen = batch.observe(rows)
+    single_unseen = np.array([single._observe_one(row) for row in rows])
+    np.testing.assert_array_equal(unseen, single_unseen)
+    assert unseen.any() and not unseen.all()
+    np.testing.assert_array_equal(batch._counts, single._counts)
+    np.testing.assert_array_equal(batch.sketch.table, single.sketch.table)
+    assert (batch.rows, batch.incomplete, batch.unseen) == (single.rows, single.incomplete, single.unseen)
+    assert list(batch.recent_unseen) == list(single.recent_unseen)
+
+
+def test_count_min_sketch_never_underestimates():
+    rng = np.random.default_rng(0)
+    # Más claves distintas que contadores por fila, para que haya colisiones
+    keys = rng.integers(0, 1 << 40, size=2000, dtype=np.int64)
+    stream = keys[rng.zipf(1.5, size=20000) % len(keys)]
+    sketch = CountMinSketch(width=1 << 10)
+    sketch.add(stream[:10000])
+    for key in stream[10000:]:
+        sketch.add_one(int(key))
+    true_counts = np.array([np.count_nonzero(stream == key) for key in keys])
+    estimates = sketch.estimate(keys)
+    assert (estimates >= true_counts).all()
+    assert (estimates > true_counts).any()
+    assert sketch.total == len(stream)
+
+
+def test_psi_near_zero_on_training_rows(reference, codes):
+    monitor = _monitor(reference)
+    monitor.observe(codes)
+    report = monitor.report()
+    assert report.rows == len(codes) and report.unseen == 0
+    for drift in report.features:
+        assert drift.psi == pytest.approx(0, abs=1e-3)
+        assert drift.new_values == ''
+    assert max(drift.psi for drift in report.features) < PSI_WARNING
+    # Cada combinación del dataset se ha visto al menos tantas veces como aparece
+    keys, _ = reference.combination_keys(codes)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    assert (monitor.frequency(codes) >= counts[inverse]).all()
+
+
+def test_letter_not_in_training_is_reported(reference, codes):
+    j, letter = _new_letter(reference)
+    rows = codes[:200].copy()
+    rows[:, j] = letter
+    monitor = _monitor(reference)
+    unseen = monitor.observe(rows)
+    # Son filas completas con una combinación que el entrenamiento no tiene
+    assert unseen.all()
+    report = monitor.report()
+    assert report.features[j].new_values == chr(letter)
+    assert all(drift.new_values == '' for k, drift in enumerate(report.features) if k != j)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from explanations import DecisionPathExplainer
+from lookup_table import LookupTable
+from mushroom_schema import POISONOUS_LABEL, feature_alphabets
+
+
+@pytest.fixture(scope='module')
+def poisonous_class(label_encoder):
+    return label_encoder.transform([POISONOUS_LABEL])[0]
+
+
+@pytest.fixture(scope='module', params=['árbol compilado', 'tabla de consulta'])
+def explainer(request, compiled_tree, poisonous_class):
+    predictor = compiled_tree if request.param == 'árbol compilado' else LookupTable.build(compiled_tree)
+    return DecisionPathExplainer(predictor, poisonous_class)
+
+
+@pytest.fixture(scope='module')
+def random_codes(encoder):
+    # Combinaciones al azar de letras válidas: la mayoría no están en el dataset
+    rng = np.random.default_rng(0)
+    alphabets = feature_alphabets(encoder.features)
+    return np.stack([rng.choice(np.frombuffer(alphabets[f].encode('ascii'), dtype=np.uint8), size=20000)
+                     for f in encoder.features], axis=1)
+
+
+def test_path_and_node_match_sklearn(explainer, tree_model, encoder, random_codes):
+    explanation = explainer.explain(random_codes, path=True)
+    X = encoder.to_frame(encoder.transform_codes(random_codes))
+    np.testing.assert_array_equal(explanation.node, tree_model.apply(X))
+    assert (explanation.path != tree_model.decision_path(X)).nnz == 0
+
+
+def test_unknown_tested_feature_stops_at_its_split(explainer, codes):
+    tree = explainer.tree
+    root_feature = tree.feature[0]
+    rows = codes[:50].copy()
+    rows[:, root_feature] = 0
+    explanation = explainer.explain(rows, path=True)
+    # La raíz evalúa esa característica: todas las filas se quedan en ella
+    assert (explanation.node == 0).all()
+    assert (explanation.path.sum(axis=1) == 1).all()
+    note = f"{tree.features[root_feature]} desconocida: se consideran todas las ramas"
+    assert all(text.endswith(note) for text in explanation.text)
+    assert explainer.unknown_feature(0) == tree.features[root_feature]
+
+    # Más abajo: el camino llega hasta la primera división sobre la desconocida
+    row = codes[:1].copy()
+    complete_path = explainer.explain(row, path=True).path.indices
+    stop = complete_path[len(complete_path) // 2]
+    row[0, tree.feature[stop]] = 0
+    explanation = explainer.explain(row, path=True)
+    assert explanation.node[0] == stop
+    np.testing.assert_array_equal(explanation.path.indices, complete_path[:len(complete_path) // 2 + 1])
+    assert explanation.text[0].endswith("desconocida: se consideran todas las ramas")
+
+
+def test_steps_mark_the_decisive_conditions(explainer, codes, poisonous_class):
+    explanation = explainer.explain(codes[:200])
+    for node, conditions in zip(explanation.node, explanation.conditions):
+        steps = explainer.steps(node)
+        assert len(steps) == explainer.depth[node]
+        decisive = {condition for condition, _, is_decisive in steps if is_decisive}
+        assert decisive == {explainer.condition[e] for e in conditions if e >= 0}
+        # Con la otra clase se marcan las condiciones que empujan hacia ella
+        other = 1 - poisonous_class if explainer.poisonous_fraction[node] >= 0.5 else poisonous_class
+        toward_poisonous = int(other == poisonous_class)
+        decisive = [is_decisive for _, _, is_decisive in explainer.steps(node, other)]
+        expected = set(explainer.top_nodes[toward_poisonous, node].tolist()) - {-1}
+        assert sum(decisive) == len(expected)
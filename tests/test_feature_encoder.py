@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder, STREAMLIT_FEATURES
+
+
+def reference_ohe(X, encoder):
+    # Lo que hacía la app antes de FeatureEncoder
+    return (pd.get_dummies(X, columns=STREAMLIT_FEATURES, drop_first=True)
+            .reindex(columns=encoder.ohe_columns, fill_value=0).to_numpy(np.uint8))
+
+
+def test_transform_matches_get_dummies(X, encoder):
+    expected = reference_ohe(X, encoder)
+    assert np.array_equal(encoder.transform(X), expected)
+    assert np.array_equal(encoder.transform(X, sparse=True).toarray(), expected)
+
+
+def test_transform_codes_matches_transform(X, encoder, codes):
+    assert np.array_equal(encoder.transform_codes(codes), encoder.transform(X))
+
+
+def test_transform_record(X, encoder):
+    # La referencia se calcula con el dataset completo: get_dummies sobre pocas filas
+    # eliminaría otras categorías con drop_first
+    expected = reference_ohe(X, encoder)
+    for i, record in enumerate(X.iloc[:50].itertuples(index=False)):
+        assert np.array_equal(np.asarray(encoder.transform_record(tuple(record))).ravel(), expected[i])
+
+
+def test_single_row_batch(X, encoder):
+    # Una sola fila: get_dummies con drop_first no sirve aquí (quita la única
+    # categoría), pero el codificador debe dar la fila que da el lote completo
+    full = encoder.transform(X)
+    for i in (0, 1, 1000):
+        assert np.array_equal(encoder.transform(X.iloc[i:i + 1])[0], full[i])
+
+
+def test_fit_recovers_trained_columns(X, encoder):
+    assert list(FeatureEncoder.fit(X).ohe_columns) == list(encoder.ohe_columns)
+
+
+def test_to_frame_columns(X, encoder):
+    frame = encoder.to_frame(encoder.transform(X.iloc[:3]))
+    assert list(frame.columns) == list(encoder.ohe_columns)
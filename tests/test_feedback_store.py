@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import pytest
+
+from feedback_store import FeedbackStore
+
+# Formato de data/comentarios.txt: cada comentario termina en una línea '---'
+LEGACY_TEXT = """Muy útil la app
+---
+No reconoce bien las setas de mi zona
+---
+Una lista:
+- uno --- dos
+---- no es un separador
+---
+"""
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeedbackStore(str(tmp_path / 'comentarios.db'))
+
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    path = tmp_path / 'comentarios.txt'
+    path.write_text(LEGACY_TEXT, encoding='utf-8')
+    return str(path)
+
+
+def test_import_text_file(store, legacy_file):
+    assert store.import_text_file(legacy_file) == 3
+    assert store.last_id() == 3
+    texts = [text for _, _, text in store.latest()]
+    assert texts == ["Una lista:\n- uno --- dos\n---- no es un separador",
+                     "No reconoce bien las setas de mi zona",
+                     "Muy útil la app"]
+    # Todos con la fecha de modificación del archivo
+    assert {created for _, created, _ in store.latest()} == {os.path.getmtime(legacy_file)}
+
+
+def test_import_only_once(store, legacy_file, tmp_path):
+    assert store.import_text_file(legacy_file) == 3
+    assert store.import_text_file(legacy_file) == 0
+    # El mismo contenido en otra ruta tampoco se vuelve a importar
+    copy = str(tmp_path / 'otra' / 'comentarios.txt')
+    os.makedirs(os.path.dirname(copy))
+    shutil.copy(legacy_file, copy)
+    assert store.import_text_file(copy) == 0
+    assert store.last_id() == 3
+
+    # Si se añade un comentario al archivo, solo se importa el nuevo
+    with open(legacy_file, 'a', encoding='utf-8') as f:
+        f.write("Uno nuevo\n---\n")
+    assert store.import_text_file(legacy_file) == 1
+    assert store.last_id() == 4
+    assert store.latest(limit=1)[0][2] == "Uno nuevo"
+    # Los comentarios añadidos desde la app no cuentan como importados
+    store.add("Uno nuevo")
+    with open(legacy_file, 'a', encoding='utf-8') as f:
+        f.write("Uno nuevo\n---\n")
+    assert store.import_text_file(legacy_file) == 1
+    assert store.last_id() == 6
+
+
+def test_import_missing_file(store, tmp_path):
+    assert store.import_text_file(str(tmp_path / 'no_existe.txt')) == 0
+    assert store.last_id() == 0
+
+
+def test_add_and_paginate(store, legacy_file):
+    store.import_text_file(legacy_file)
+    ids = [store.add(f"comentario {i}") for i in range(5)]
+    assert ids == list(range(4, 9))
+    first = store.latest(limit=4)
+    assert [row[0] for row in first] == [8, 7, 6, 5]
+    assert [row[0] for row in store.latest(limit=4, before_id=first[-1][0])] == [4, 3, 2, 1]
+    with pytest.raises(ValueError):
+        store.add("   ")
@@ -0,0 +1,78 @@
+# fungiscan-score: salida en orden, la columna 'predicción' se sustituye al volver a
+# puntuar un archivo y un Parquet sin filas se escribe con su esquema. Los bloques
+# se reparten en hilos del mismo proceso en lugar de procesos.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import fungiscan_score
+from fungiscan_score import PREDICTION_COLUMN, score_file
+
+from .conftest import MODELS_FOLDER
+
+
+@pytest.fixture(scope='module')
+def executor():
+    fungiscan_score._init_worker(MODELS_FOLDER, None)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+@pytest.fixture(scope='module')
+def records(agaricus, X):
+    return X.iloc[:300].assign(id=[f'r{i:03d}' for i in range(300)])
+
+
+@pytest.fixture(scope='module')
+def expected(records, tree_model, encoder, label_encoder):
+    X = encoder.to_frame(encoder.transform(records[encoder.features]))
+    return label_encoder.inverse_transform(tree_model.predict(X))
+
+
+def read(path):
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path, dtype=str)
+
+
+def write(df, path):
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False, row_group_size=100)
+    else:
+        df.to_csv(path, index=False)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_score_and_rescore(executor, records, expected, tmp_path, extension):
+    path = str(tmp_path / f'setas{extension}')
+    write(records, path)
+    output, rows, _ = score_file(path, executor, chunk_bytes=4096, quiet=True)
+    assert rows == len(records)
+    scored = read(output)
+    assert list(scored.columns) == list(records.columns) + [PREDICTION_COLUMN]
+    assert list(scored['id']) == list(records['id'])
+    assert list(scored[PREDICTION_COLUMN]) == list(expected)
+
+    # Volver a puntuar la salida sustituye la columna, no añade otra
+    write(scored.assign(**{PREDICTION_COLUMN: 'x'}), output)
+    rescored_path, _, _ = score_file(output, executor, chunk_bytes=4096, quiet=True)
+    rescored = read(rescored_path)
+    assert list(rescored.columns) == list(scored.columns)
+    assert list(rescored[PREDICTION_COLUMN]) == list(expected)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet'])
+def test_score_empty_file(executor, records, tmp_path, extension):
+    path = str(tmp_path / f'vacio{extension}')
+    if extension == '.parquet':
+        # Sin ningún row group, como los que deja un ParquetWriter cerrado sin escribir
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.ParquetWriter(path, pa.Schema.from_pandas(records, preserve_index=False)).close()
+    else:
+        write(records.iloc[:0], path)
+    output, rows, _ = score_file(path, executor, quiet=True)
+    assert rows == 0 and os.path.exists(output)
+    scored = read(output)
+    assert len(scored) == 0
+    assert list(scored.columns) == list(records.columns) + [PREDICTION_COLUMN]
@@ -0,0 +1,54 @@
+# El KNN de Hamming da las mismas distancias que KNeighborsClassifier, y la búsqueda
+# de n_neighbors con un solo ajuste por fold puntúa igual que ajustar cada k.
+import numpy as np
+import pytest
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+
+from data_processing import optimize_model_with_gridsearch
+from hamming_knn import HammingKNNClassifier
+
+KS = list(range(1, 11))
+
+
+@pytest.fixture(scope='module')
+def data(X, agaricus, encoder, label_encoder):
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(X), size=1500, replace=False)
+    X_encoded = encoder.to_frame(encoder.transform(X.iloc[rows]))
+    return X_encoded, label_encoder.transform(agaricus['class'].iloc[rows])
+
+
+def test_distances_match_sklearn(data):
+    X, y = data
+    hamming = HammingKNNClassifier(n_neighbors=10).fit(X[:1000], y[:1000])
+    sklearn_knn = KNeighborsClassifier(n_neighbors=10).fit(X[:1000], y[:1000])
+    assert np.allclose(hamming.kneighbors(X[1000:])[0], sklearn_knn.kneighbors(X[1000:])[0])
+
+
+def test_predict_for_ks_matches_predict(data):
+    X, y = data
+    model = HammingKNNClassifier().fit(X[:1000], y[:1000])
+    by_k = model.predict_for_ks(X[1000:], KS)
+    for k in KS:
+        assert np.array_equal(by_k[k], HammingKNNClassifier(n_neighbors=k).fit(X[:1000], y[:1000]).predict(X[1000:]))
+
+
+def test_search_fits_once_per_fold(data, monkeypatch):
+    X, y = data
+    cv = StratifiedKFold(n_splits=3)
+    scorer = check_scoring(HammingKNNClassifier(), scoring='f1_macro')
+    expected = {k: [scorer(HammingKNNClassifier(n_neighbors=k).fit(X.iloc[train], y[train]), X.iloc[test], y[test])
+                    for train, test in cv.split(X, y)] for k in KS}
+
+    fits = []
+    original_fit = HammingKNNClassifier.fit
+    monkeypatch.setattr(HammingKNNClassifier, 'fit', lambda self, *a: fits.append(1) or original_fit(self, *a))
+    _, best_params, report = optimize_model_with_gridsearch(HammingKNNClassifier(), {'n_neighbors': KS}, X, y,
+                                                            cv=cv, n_jobs=1, verbose=0, return_report=True)
+    assert len(fits) == cv.get_n_splits() + 1  # un ajuste por fold y el modelo final
+    for k in KS:
+        scores = report[report['parametros'] == str({'n_neighbors': k})].sort_values('fold')['puntuacion']
+        assert np.allclose(scores, expected[k])
+    assert best_params['n_neighbors'] == max(KS, key=lambda k: (np.mean(expected[k]), -k))
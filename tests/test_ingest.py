@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from feature_encoder import STREAMLIT_FEATURES
+from ingest import LabelTranslator, ValidationReport
+from mushroom_schema import FEATURE_MAPS
+
+
+def test_labels_and_codes(X, codes):
+    # Etiquetas en español (con mayúsculas y espacios) dan los mismos códigos que las letras
+    labels = X.iloc[:500].copy()
+    for feature in STREAMLIT_FEATURES:
+        code_to_label = {code: label for label, code in FEATURE_MAPS[feature].items()}
+        labels[feature] = [f' {code_to_label[v].upper()}' for v in labels[feature]]
+    translator = LabelTranslator()
+    assert np.array_equal(translator.translate_frame(X.iloc[:500]), codes[:500])
+    assert np.array_equal(translator.translate_frame(labels), codes[:500])
+
+
+def test_report_counts_and_examples(X):
+    # Una columna entera inválida y algunos valores sueltos en otra, en dos bloques:
+    # se cuentan todos y solo se guardan unos pocos ejemplos por columna
+    df = X.iloc[:1000].astype(object).copy()
+    df['habitat'] = 'Zzz'
+    df.iloc[[3, 700], STREAMLIT_FEATURES.index('cap-color')] = 'Morado'
+    df.iloc[[5], STREAMLIT_FEATURES.index('cap-shape')] = ''  # desconocida, no es un error
+    report = ValidationReport(max_examples=5)
+    translator = LabelTranslator()
+    codes = np.concatenate([translator.translate_frame(df.iloc[:600], report),
+                            translator.translate_frame(df.iloc[600:], report, row_offset=600)])
+
+    assert (codes[:, STREAMLIT_FEATURES.index('habitat')] == 0).all()
+    assert len(report) == 1002
+    assert report.counts() == {'cap-color': 2, 'habitat': 1000}
+    assert report.rows_with_errors() == 1000
+    examples = report.to_frame()
+    assert len(examples) == 7
+    assert list(examples[examples['columna'] == 'habitat']['fila']) == [0, 1, 2, 3, 4]
+    assert list(examples[examples['columna'] == 'cap-color']['fila']) == [3, 700]
+    assert set(examples['valor']) == {'Zzz', 'Morado'}
+
+
+def test_empty_report():
+    report = ValidationReport()
+    assert len(report) == 0 and report.rows_with_errors() == 0
+    assert report.to_frame().empty and list(report.to_frame().columns) == ['fila', 'columna', 'valor']
+    assert isinstance(report.to_frame(), pd.DataFrame)
@@ -0,0 +1,72 @@
+# La tabla precalculada debe predecir como el árbol de sklearn en todo el espacio de
+# entradas, no solo en las filas del dataset.
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from lookup_table import LookupTable, generate_lookup_table
+from model_registry import ModelRegistry, register_tree_version
+
+from .conftest import MODELS_FOLDER, TREE_MODEL_FILE, sklearn_predict
+
+TREE_MODEL_FILE_NAME = os.path.basename(TREE_MODEL_FILE)
+
+
+def test_lookup_table(compiled_tree, tree_model, encoder, sample):
+    table = LookupTable.build(compiled_tree)
+    assert np.array_equal(table.predict_codes(sample), sklearn_predict(tree_model, encoder, sample))
+    assert np.array_equal(table.predict_proba_codes(sample), sklearn_predict(tree_model, encoder, sample, proba=True))
+
+
+@pytest.fixture
+def models_folder(tmp_path):
+    # Copia de los .pkl de models/, sin la tabla de consulta
+    folder = tmp_path / 'models'
+    folder.mkdir()
+    for name in ('best_decision_tree_model_streamlit.pkl', 'label_encoder_y.pkl', 'ohe_columns_for_streamlit.pkl'):
+        shutil.copy(os.path.join(MODELS_FOLDER, name), folder / name)
+    return str(folder)
+
+
+# Los .pkl se guardaron con otra versión de sklearn: el aviso no afecta a los tests
+@pytest.mark.filterwarnings('ignore::UserWarning')
+def test_registry_generates_lookup_table(models_folder, tree_model, encoder, label_encoder, sample):
+    # Sin tabla (no está en el repositorio), el registro la genera a partir del .pkl y
+    # la guarda con encoding.json: el siguiente arranque ya no necesita ningún pickle
+    registry = ModelRegistry()
+    register_tree_version(registry, models_folder=models_folder, default=True)
+    bundle = registry.get()
+    assert isinstance(bundle.predictor, LookupTable)
+    assert np.array_equal(bundle.predictor.predict_codes(sample), sklearn_predict(tree_model, encoder, sample))
+
+    folder = os.path.join(models_folder, 'lookup_table')
+    assert LookupTable.load(folder).is_built_from(os.path.join(models_folder, TREE_MODEL_FILE_NAME))
+    restarted = ModelRegistry()
+    register_tree_version(restarted, models_folder=models_folder, default=True)
+    predictor = restarted.get().predictor
+    assert restarted.last_load.reloaded == ['lookup_table', 'encoding']
+    assert np.array_equal(predictor.predict_codes(sample), sklearn_predict(tree_model, encoder, sample))
+
+
+@pytest.mark.filterwarnings('ignore::UserWarning')
+def test_stale_lookup_table_is_regenerated(models_folder, sample, tree_model, encoder):
+    folder = generate_lookup_table(models_folder)
+    header_path = os.path.join(folder, 'header.json')
+    with open(header_path, encoding='utf-8') as f:
+        header = json.load(f)
+    header['model_sha256'] = 'otro modelo'
+    with open(header_path, 'w', encoding='utf-8') as f:
+        json.dump(header, f)
+    assert not LookupTable.load(folder).is_built_from(os.path.join(models_folder, TREE_MODEL_FILE_NAME))
+
+    registry = ModelRegistry()
+    register_tree_version(registry, models_folder=models_folder, default=True)
+    assert np.array_equal(registry.get().predictor.predict_codes(sample), sklearn_predict(tree_model, encoder, sample))
+    assert LookupTable.load(folder).is_built_from(os.path.join(models_folder, TREE_MODEL_FILE_NAME))
+    # Ninguna carpeta temporal se queda junto a la tabla
+    assert sorted(os.listdir(models_folder)) == sorted(
+        ['best_decision_tree_model_streamlit.pkl', 'label_encoder_y.pkl', 'lookup_table',
+         'ohe_columns_for_streamlit.pkl'])
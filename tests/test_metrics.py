@@ -0,0 +1,53 @@
+import threading
+
+from metrics import Metrics
+
+
+def test_export_while_stages_are_added():
+    # Exportar mientras otros hilos crean etapas nuevas o reinician las métricas no
+    # debe fallar con "dictionary changed size during iteration"
+    metrics = Metrics()
+    stop = threading.Event()
+    errors = []
+
+    def add_stages():
+        i = 0
+        while not stop.is_set():
+            with metrics.stage(f'etapa_{i % 500}'):
+                pass
+            i += 1
+            if i % 2000 == 0:
+                metrics.reset()
+
+    def export():
+        try:
+            for _ in range(100):
+                metrics.snapshot()
+                metrics.to_prometheus()
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=add_stages) for _ in range(2)]
+    for thread in writers:
+        thread.start()
+    try:
+        export()
+    finally:
+        stop.set()
+        for thread in writers:
+            thread.join()
+    assert not errors
+
+
+def test_prometheus_histogram():
+    metrics = Metrics()
+    metrics.observe('predict', 0.003)
+    metrics.observe('predict', 0.2)
+    metrics.record_batch(100, 0.5)
+    text = metrics.to_prometheus()
+    assert 'fungiscan_stage_seconds_bucket{stage="predict",le="0.005"} 1' in text
+    assert 'fungiscan_stage_seconds_count{stage="predict"} 2' in text
+    assert 'fungiscan_rows_total 100' in text
+    assert 'fungiscan_last_batch_rows_per_second 200.0' in text
+    snapshot = metrics.snapshot()
+    assert snapshot['stages']['predict']['count'] == 2 and snapshot['rows_total'] == 100
@@ -0,0 +1,42 @@
+# Los artefactos .fsm se cargan sin sklearn y deben predecir como el modelo original;
+# un archivo dañado o truncado se detecta al cargarlo.
+import numpy as np
+import pytest
+
+from lookup_table import LookupTable, file_sha256
+from model_artifact import export_bundle, load_artifact
+from model_registry import ModelBundle
+
+from .conftest import TREE_MODEL_FILE, sklearn_predict
+
+
+def test_artifact(compiled_tree, tree_model, encoder, label_encoder, sample, tmp_path):
+    source = {'model': file_sha256(TREE_MODEL_FILE)}
+    for name, predictor in (('tabla', LookupTable.build(compiled_tree)), ('arbol', compiled_tree)):
+        path = str(tmp_path / f'{name}.fsm')
+        export_bundle(path, ModelBundle(label_encoder, encoder, predictor), source)
+        artifact = load_artifact(path, verify=True)
+        assert artifact.manifest['source'] == source
+        assert list(artifact.bundle.encoder.ohe_columns) == list(encoder.ohe_columns)
+        assert list(artifact.bundle.label_encoder.classes_) == list(label_encoder.classes_)
+        assert np.array_equal(artifact.bundle.predictor.predict_codes(sample),
+                              sklearn_predict(tree_model, encoder, sample))
+
+
+def test_artifact_corrupted(compiled_tree, encoder, label_encoder, tmp_path):
+    path = str(tmp_path / 'arbol.fsm')
+    manifest = export_bundle(path, ModelBundle(label_encoder, encoder, compiled_tree))
+    position = manifest['data_offset'] + manifest['arrays']['tree.value']['offset']
+    with open(path, 'r+b') as f:
+        f.seek(position)
+        byte = f.read(1)[0]
+        f.seek(position)
+        f.write(bytes([byte ^ 0xff]))
+    load_artifact(path)
+    with pytest.raises(ValueError, match='dañado'):
+        load_artifact(path, verify=True)
+
+    with open(path, 'r+b') as f:
+        f.truncate(manifest['size'] - 1)
+    with pytest.raises(ValueError, match='truncado'):
+        load_artifact(path)
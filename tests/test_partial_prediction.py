@@ -0,0 +1,97 @@
+# La predicción con características desconocidas marginaliza el árbol: debe dar lo
+# mismo que enumerar todas las combinaciones de valores de las desconocidas.
+import itertools
+
+import numpy as np
+import pytest
+
+from lookup_table import LookupTable
+from mushroom_schema import POISONOUS_LABEL, feature_alphabets
+
+
+def enumerate_completions(tree, row, unknown, alphabets):
+    combos = list(itertools.product(*[alphabets[tree.features[j]] for j in unknown]))
+    full = np.repeat(row[None], len(combos), axis=0)
+    for k, j in enumerate(unknown):
+        full[:, j] = [ord(combo[k]) for combo in combos]
+    return tree.predict_codes(full)
+
+
+@pytest.fixture(scope='module')
+def table(compiled_tree):
+    return LookupTable.build(compiled_tree)
+
+
+@pytest.fixture(scope='module')
+def alphabets(table):
+    return feature_alphabets(table.tree.features)
+
+
+@pytest.fixture(scope='module')
+def poisonous(label_encoder):
+    return label_encoder.transform([POISONOUS_LABEL])[0]
+
+
+@pytest.fixture(scope='module')
+def partial_rows(codes, table):
+    # Filas del dataset con 1-4 características desconocidas (código 0)
+    rng = np.random.default_rng(0)
+    rows, unknowns = [], []
+    for _ in range(200):
+        row = codes[rng.integers(len(codes))].copy()
+        unknown = rng.choice(len(table.tree.features), size=rng.integers(1, 5), replace=False)
+        row[unknown] = 0
+        rows.append(row)
+        unknowns.append(unknown)
+    return np.array(rows), unknowns
+
+
+def test_matches_enumeration(table, alphabets, poisonous, partial_rows):
+    rows, unknowns = partial_rows
+    result = table.predict_partial_codes(rows, alphabets, poisonous)
+    for i, (row, unknown) in enumerate(zip(rows, unknowns)):
+        predictions = enumerate_completions(table.tree, row, unknown, alphabets)
+        assert result.poisonous_fraction[i] == pytest.approx((predictions == poisonous).mean())
+        assert result.determined[i] == (len(set(predictions)) == 1)
+        assert result.worst_case[i] == (poisonous if (predictions == poisonous).any() else predictions[0])
+        assert result.proba[i].sum() == pytest.approx(1)
+
+
+def test_record_matches_batch(table, alphabets, poisonous, partial_rows):
+    rows, _ = partial_rows
+    result = table.predict_partial_codes(rows, alphabets, poisonous)
+    for i, row in enumerate(rows[:50]):
+        record = {f: chr(c) if c else None for f, c in zip(table.tree.features, row.tolist())}
+        single = table.predict_partial_record(record, alphabets, poisonous)
+        assert single.poisonous_fraction == pytest.approx(result.poisonous_fraction[i])
+        assert (single.determined, single.worst_case) == (result.determined[i], result.worst_case[i])
+        assert np.allclose(single.proba, result.proba[i])
+
+
+def test_complete_rows(table, alphabets, poisonous, codes):
+    # Sin desconocidas es la predicción normal, siempre determinada
+    result = table.predict_partial_codes(codes, alphabets, poisonous)
+    assert np.array_equal(result.worst_case, table.predict_codes(codes))
+    assert result.determined.all()
+    assert np.array_equal(result.poisonous_fraction, (result.worst_case == poisonous).astype(float))
+
+
+def test_all_unknown(table, alphabets, poisonous):
+    # Todas desconocidas: las 1.700 millones de combinaciones no se pueden enumerar, pero
+    # las letras que el árbol no evalúa en una característica van por las mismas ramas.
+    # Se enumera una letra por grupo, con peso el número de letras del grupo.
+    tree = table.tree
+    letters, weights = [], []
+    for j, feature in enumerate(tree.features):
+        tested = set(chr(c) for c in tree.code[~tree.is_leaf & (tree.feature == j)].tolist())
+        others = [c for c in alphabets[feature] if c not in tested]
+        letters.append(sorted(tested) + others[:1])
+        weights.append([1] * len(tested) + [len(others)] * bool(others))
+    combos = np.array(list(itertools.product(*[[ord(c) for c in group] for group in letters])), dtype=np.uint8)
+    weight = np.prod(np.array(list(itertools.product(*weights))), axis=1)
+    predictions = tree.predict_codes(combos)
+
+    result = table.predict_partial_record({}, alphabets, poisonous)
+    assert result.poisonous_fraction == pytest.approx(weight[predictions == poisonous].sum() / weight.sum())
+    assert not result.determined
+    assert result.worst_case == poisonous
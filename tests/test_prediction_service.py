@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import prediction_service
+from mushroom_schema import FEATURE_MAPS
+from prediction_service import MicroBatcher, PredictionService, RequestError
+
+from .conftest import sklearn_predict
+
+
+def test_micro_batcher_groups_requests():
+    batches = []
+
+    def predict(codes):
+        batches.append(len(codes))
+        return codes[:, 0].tolist()
+
+    async def run():
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait=0.01)
+        results = await asyncio.gather(*[batcher.submit(np.array([i, 0], dtype=np.uint8)) for i in range(20)])
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == list(range(20))
+    assert sum(batches) == 20 and max(batches) <= 8 and len(batches) < 20
+
+
+@pytest.mark.parametrize('phase', ['ventana', 'prediciendo'])
+def test_micro_batcher_stop_answers_pending(phase):
+    # Al detener el servicio, las peticiones del lote en curso y las que quedaban en
+    # la cola reciben un 503 en vez de quedarse esperando
+    release = threading.Event()
+
+    def predict(codes):
+        release.wait(5)
+        return [0] * len(codes)
+
+    async def run():
+        batcher = MicroBatcher(predict, max_batch_size=2, max_wait=10 if phase == 'ventana' else 0)
+        tasks = [asyncio.ensure_future(batcher.submit(np.zeros(2, dtype=np.uint8))) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert len(results) == 5
+    assert all(isinstance(result, RequestError) and result.status == 503 for result in results)
+
+
+# El servicio como aplicación ASGI: se le pasan receive/send falsos en lugar de
+# arrancar un servidor
+@pytest.fixture(scope='module')
+def service():
+    return PredictionService()
+
+
+async def _request(service, method, path, body=None):
+    scope = {'type': 'http', 'method': method, 'path': path}
+    messages = [{'type': 'http.request', 'body': b'' if body is None else json.dumps(body).encode('utf-8')}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await service(scope, receive, send)
+    assert sent[0]['type'] == 'http.response.start'
+    payload = json.loads(sent[1]['body'])
+    payload.pop('latency_ms')
+    return sent[0]['status'], payload
+
+
+def call(service, method, path, body=None):
+    async def run():
+        try:
+            return await _request(service, method, path, body)
+        finally:
+            await service.batcher.stop()
+    return asyncio.run(run())
+
+
+def _records(codes, features):
+    return [{feature: chr(code) for feature, code in zip(features, row)} for row in codes]
+
+
+def _labels(tree_model, encoder, label_encoder, codes):
+    return label_encoder.inverse_transform(sklearn_predict(tree_model, encoder, codes)).tolist()
+
+
+def test_predict(service, encoder, codes, tree_model, label_encoder):
+    record = _records(codes[:1], encoder.features)[0]
+    expected = _labels(tree_model, encoder, label_encoder, codes[:1])[0]
+    status, payload = call(service, 'POST', '/predict', record)
+    assert status == 200
+    assert payload == {'prediction': expected, 'unseen_combination': False}
+
+    # La etiqueta en español del formulario vale lo mismo que la letra
+    label = next(label for label, letter in FEATURE_MAPS['cap-shape'].items() if letter == record['cap-shape'])
+    assert call(service, 'POST', '/predict', dict(record, **{'cap-shape': label})) == (status, payload)
+
+    # Con una desconocida se devuelve el peor caso, su fracción y si está determinada
+    status, payload = call(service, 'POST', '/predict', dict(record, **{'gill-color': None}))
+    assert status == 200
+    assert set(payload) == {'prediction', 'unseen_combination', 'poisonous_fraction', 'determined'}
+    assert 0 <= payload['poisonous_fraction'] <= 1
+    assert payload['determined'] == (payload['poisonous_fraction'] in (0, 1))
+
+
+@pytest.mark.parametrize('value, detail', [('z', "'gill-color'"), (3, "'gill-color'"),
+                                           ('falta', "Faltan características")])
+def test_predict_invalid_record(service, encoder, codes, value, detail):
+    record = _records(codes[:1], encoder.features)[0]
+    if value == 'falta':
+        del record['gill-color']
+    else:
+        record['gill-color'] = value
+    status, payload = call(service, 'POST', '/predict', record)
+    assert status == 422
+    assert detail in payload['error']
+
+
+def test_predict_batch_empty(service):
+    assert call(service, 'POST', '/predict/batch', {'records': []}) == \
+        (200, {'predictions': [], 'unseen_combinations': [], 'undetermined': []})
+
+
+def test_predict_batch_in_chunks(service, encoder, noisy_codes, tree_model, label_encoder, monkeypatch):
+    rows = noisy_codes[:250]
+    records = _records(rows, encoder.features)
+    for i in (3, 120, 249):
+        records[i]['gill-color'] = None
+    status, whole = call(service, 'POST', '/predict/batch', {'records': records})
+    assert status == 200
+    # En bloques de 100 registros los índices siguen siendo los del lote entero
+    monkeypatch.setattr(prediction_service, 'PREDICT_CHUNK_ROWS', 100)
+    assert call(service, 'POST', '/predict/batch', records) == (status, whole)
+
+    complete = [i for i in range(len(rows)) if i not in (3, 120, 249)]
+    assert [whole['predictions'][i] for i in complete] == _labels(tree_model, encoder, label_encoder, rows[complete])
+    assert whole['unseen_combinations'] and set(whole['unseen_combinations']) <= set(complete)
+    assert set(whole['undetermined']) <= {3, 120, 249}
+
+
+def test_not_found_and_method_not_allowed(service):
+    status, payload = call(service, 'GET', '/no-existe')
+    assert status == 404 and '/no-existe' in payload['error']
+    status, payload = call(service, 'GET', '/predict')
+    assert status == 405 and 'GET' in payload['error']
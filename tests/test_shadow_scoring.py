@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+import pytest
+
+from batch_prediction import score_codes
+from model_registry import ModelBundle
+from shadow_scoring import LOG_DTYPE, LOG_HEADER_SIZE, ShadowScorer, read_disagreements
+
+
+@pytest.fixture(scope='module')
+def bundle(label_encoder, encoder, compiled_tree):
+    return ModelBundle(label_encoder, encoder, compiled_tree)
+
+
+@pytest.fixture(scope='module')
+def rows(codes):
+    return codes[:500]
+
+
+@pytest.fixture(scope='module')
+def champion_labels(bundle, rows):
+    return score_codes(bundle.predictor, rows, bundle.label_encoder, bundle.encoder).labels
+
+
+def _flip(labels, rows_to_flip):
+    # Etiquetas de un campeón que no coincide con el retador en 'rows_to_flip'
+    labels = labels.copy()
+    labels[rows_to_flip] = np.where(labels[rows_to_flip] == 'e', 'p', 'e')
+    return labels
+
+
+def test_sampling_and_dropped_rows(bundle, rows, champion_labels):
+    release = threading.Event()
+
+    def slow_bundle():
+        release.wait()
+        return bundle
+
+    shadow = ShadowScorer({'lento': slow_bundle}, sample_rate=1, max_pending=2, log_path=None)
+    # Solo se muestrean filas completas
+    incomplete = rows[:10].copy()
+    incomplete[:, 0] = 0
+    assert shadow.submit(incomplete, champion_labels[:10]) is None
+    futures = [shadow.submit(rows, champion_labels), shadow.submit(rows[:1], champion_labels[:1])]
+    assert all(future is not None for future in futures)
+    # Con los max_pending huecos ocupados, el lote se descarta sin esperar
+    assert shadow.submit(rows[:100], champion_labels[:100]) is None
+    release.set()
+    shadow.wait()
+    snapshot = shadow.snapshot()
+    assert snapshot['offered_rows'] == 10 + len(rows) + 1 + 100
+    assert snapshot['sampled_rows'] == len(rows) + 1
+    assert snapshot['dropped_rows'] == 100
+    assert snapshot['challengers']['lento']['rows'] == len(rows) + 1
+    assert snapshot['challengers']['lento']['agreement_rate'] == 1
+    # Con los huecos libres se vuelve a aceptar
+    assert shadow.submit(rows[:100], champion_labels[:100]) is not None
+    shadow.wait()
+
+
+def test_disagreement_log_round_trip(bundle, rows, champion_labels, tmp_path):
+    log_path = str(tmp_path / 'desacuerdos.bin')
+    flipped = np.arange(0, len(rows), 7)
+    shadow = ShadowScorer({'arbol': lambda: bundle}, sample_rate=1, log_path=log_path)
+    shadow.submit(rows, _flip(champion_labels, flipped)).result()
+    records = read_disagreements(log_path)
+    assert len(records) == len(flipped)
+    np.testing.assert_array_equal(records['codes'], rows[flipped])
+    assert set(records['challenger'].tolist()) == {b'arbol'}
+    np.testing.assert_array_equal(records['prediction'].astype(str), champion_labels[flipped])
+    assert (records['champion'] != records['prediction']).all()
+    stats = shadow.snapshot()['challengers']['arbol']
+    assert stats['agreement_rate'] == pytest.approx(1 - len(flipped) / len(rows))
+
+
+def test_partial_trailing_record_is_discarded(bundle, rows, champion_labels, tmp_path):
+    log_path = str(tmp_path / 'desacuerdos.bin')
+    shadow = ShadowScorer({'arbol': lambda: bundle}, sample_rate=1, log_path=log_path)
+    shadow.submit(rows[:50], _flip(champion_labels[:50], [0, 1])).result()
+    shadow._log.close()
+    # Una escritura interrumpida deja medio registro al final
+    with open(log_path, 'ab') as f:
+        f.write(b'\xff' * (LOG_DTYPE.itemsize // 2))
+
+    shadow = ShadowScorer({'arbol': lambda: bundle}, sample_rate=1, log_path=log_path)
+    shadow.submit(rows[:50], _flip(champion_labels[:50], [2])).result()
+    shadow._log.close()
+    with open(log_path, 'rb') as f:
+        assert (len(f.read()) - LOG_HEADER_SIZE) % LOG_DTYPE.itemsize == 0
+    records = read_disagreements(log_path)
+    # Los registros escritos después siguen alineados
+    np.testing.assert_array_equal(records['codes'], rows[[0, 1, 2]])
+    assert set(records['challenger'].tolist()) == {b'arbol'}
+
+
+def test_failing_challenger_counts_errors(bundle, rows, champion_labels):
+    def broken_bundle():
+        raise OSError("No se encuentra el modelo")
+
+    shadow = ShadowScorer({'roto': broken_bundle, 'arbol': lambda: bundle}, sample_rate=1, log_path=None)
+    for _ in range(2):
+        shadow.submit(rows, champion_labels).result()
+    snapshot = shadow.snapshot()['challengers']
+    assert snapshot['roto']['errors'] == 2 and snapshot['roto']['rows'] == 0
+    assert snapshot['arbol']['errors'] == 0 and snapshot['arbol']['rows'] == 2 * len(rows)